@@ -32,6 +32,7 @@ class CustomUserAdmin(BaseUserAdmin):
     list_display_links = ('avatar_tag', 'username')
     list_filter  = ('is_staff', 'is_superuser', 'is_active')
     search_fields = ('username', 'email', 'first_name', 'last_name')
+    list_select_related = ('profile',)
     list_per_page = 25
     ordering      = ('-date_joined',)
 
@@ -71,6 +72,7 @@ class StudentProfileAdmin(admin.ModelAdmin):
     search_fields      = ('user__username', 'user__email',
                           'user__first_name', 'user__last_name', 'phone')
     readonly_fields    = ('joined_date', 'photo_preview')
+    list_select_related = ('user',)
     list_per_page      = 25
     ordering           = ('-joined_date',)
     fieldsets = (
@@ -44,11 +44,13 @@ def register(request):
     return render(request, 'accounts/register.html', {'form': form})
 
 
+def _borrow_history(student):
+    return BorrowRecord.objects.filter(student=student).select_related('book').order_by('-borrow_date')
+
+
 @login_required
 def profile(request):
-    borrow_records = BorrowRecord.objects.filter(
-        student=request.user
-    ).select_related('book').order_by('-borrow_date')
+    borrow_records = _borrow_history(request.user)
 
     stats = {
         'currently_borrowed': borrow_records.filter(status='borrowed').count(),
@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.utils.html import format_html
-from django.db.models import Count
+from .forms import partial_update_fields
 from .models import Author, Category, Book
 
 # ── Site-wide branding ────────────────────────────────────────────────────────
@@ -9,10 +9,23 @@ admin.site.site_title  = 'E-Library Admin'
 admin.site.index_title = 'Library Management Dashboard'
 
 
+class PartialSaveAdminMixin:
+    """
+    Saves change-form edits with ``update_fields`` limited to the fields the
+    form changed, so counters maintained with F() updates elsewhere are not
+    written back from the copy the change view loaded.
+    """
+
+    def save_model(self, request, obj, form, change):
+        if not change:
+            return super().save_model(request, obj, form, change)
+        obj.save(update_fields=partial_update_fields(obj, form.changed_data))
+
+
 # ── Author ────────────────────────────────────────────────────────────────────
 @admin.register(Author)
-class AuthorAdmin(admin.ModelAdmin):
-    list_display       = ('photo_tag', 'name', 'book_count', 'bio_preview')
+class AuthorAdmin(PartialSaveAdminMixin, admin.ModelAdmin):
+    list_display       = ('photo_tag', 'name', 'book_count', 'available_book_count', 'bio_preview')
     list_display_links = ('photo_tag', 'name')
     search_fields      = ('name', 'bio')
     readonly_fields    = ('photo_preview',)
@@ -26,9 +39,6 @@ class AuthorAdmin(admin.ModelAdmin):
         }),
     )
 
-    def get_queryset(self, request):
-        return super().get_queryset(request).annotate(_book_count=Count('books'))
-
     @admin.display(description='Photo')
     def photo_tag(self, obj):
         if obj.photo:
@@ -53,10 +63,6 @@ class AuthorAdmin(admin.ModelAdmin):
             )
         return '—'
 
-    @admin.display(description='Books', ordering='_book_count')
-    def book_count(self, obj):
-        return obj._book_count
-
     @admin.display(description='Biography')
     def bio_preview(self, obj):
         if obj.bio:
@@ -66,8 +72,8 @@ class AuthorAdmin(admin.ModelAdmin):
 
 # ── Category ──────────────────────────────────────────────────────────────────
 @admin.register(Category)
-class CategoryAdmin(admin.ModelAdmin):
-    list_display  = ('name', 'book_count', 'description_preview')
+class CategoryAdmin(PartialSaveAdminMixin, admin.ModelAdmin):
+    list_display  = ('name', 'book_count', 'available_book_count', 'description_preview')
     search_fields = ('name', 'description')
     list_per_page = 20
     fieldsets = (
@@ -76,13 +82,6 @@ class CategoryAdmin(admin.ModelAdmin):
         }),
     )
 
-    def get_queryset(self, request):
-        return super().get_queryset(request).annotate(_book_count=Count('books'))
-
-    @admin.display(description='Books', ordering='_book_count')
-    def book_count(self, obj):
-        return obj._book_count
-
     @admin.display(description='Description')
     def description_preview(self, obj):
         if obj.description:
@@ -92,7 +91,7 @@ class CategoryAdmin(admin.ModelAdmin):
 
 # ── Book ──────────────────────────────────────────────────────────────────────
 @admin.register(Book)
-class BookAdmin(admin.ModelAdmin):
+class BookAdmin(PartialSaveAdminMixin, admin.ModelAdmin):
     list_display       = ('cover_tag', 'title', 'author', 'category',
                           'isbn', 'copies_display', 'avg_rating_display', 'published_date')
     list_display_links = ('cover_tag', 'title')
@@ -100,6 +99,7 @@ class BookAdmin(admin.ModelAdmin):
     search_fields      = ('title', 'isbn', 'author__name', 'description')
     autocomplete_fields = ('author', 'category')
     readonly_fields    = ('cover_preview', 'avg_rating_display', 'created_at')
+    list_select_related = ('author', 'category')
     list_per_page      = 20
     date_hierarchy     = 'published_date'
     fieldsets = (
@@ -151,15 +151,16 @@ class BookAdmin(admin.ModelAdmin):
             color, obj.available_copies, obj.total_copies,
         )
 
-    @admin.display(description='Avg Rating')
+    @admin.display(description='Avg Rating', ordering='avg_rating')
     def avg_rating_display(self, obj):
         avg = obj.average_rating
         if avg is None:
             return '—'
         filled  = round(avg)
         stars   = '★' * filled + '☆' * (5 - filled)
+        avg = f'{avg:.1f}'
         return format_html(
-            '<span style="color:#f59e0b;font-size:1rem;" title="{:.1f} / 5">{}</span>'
-            '&nbsp;<small style="color:#888;">{:.1f}</small>',
+            '<span style="color:#f59e0b;font-size:1rem;" title="{} / 5">{}</span>'
+            '&nbsp;<small style="color:#888;">{}</small>',
             avg, stars, avg,
         )
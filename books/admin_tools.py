@@ -0,0 +1,101 @@
+"""
+Large-table mode for admin changelists.
+
+The stock changelist runs an exact ``COUNT(*)`` for the filtered list and
+another for the whole table, and its date hierarchy scans the table for
+``MIN``/``MAX`` and ``DISTINCT`` dates. ``LargeTableAdminMixin`` replaces
+all three:
+
+* the page count comes from the planner's row estimate for an unfiltered
+  list (``sqlite_stat1`` after ``ANALYZE``, ``pg_class.reltuples`` on
+  PostgreSQL) while the highest primary key stays within it, or else from
+  an exact count cached for ``ADMIN_COUNT_CACHE_SECONDS`` per distinct
+  query;
+* ``show_full_result_count`` is off;
+* the date drill-down is built from a sorted list of dates that have rows,
+  returned by the admin's ``bucket_dates()``. By default that is one
+  ``DISTINCT`` date query cached for ``ADMIN_COUNT_CACHE_SECONDS`` (see
+  ``cached_bucket_dates``); admins with a rollup table can read it instead.
+
+Drill-down choices are per table, not per active filter, so a chosen day
+can turn out to be empty under other filters.
+"""
+
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.db.models import Max
+from django.db.models.functions import TruncDate
+from django.utils.functional import cached_property
+
+
+def table_row_estimate(model, using='default'):
+    """The planner's row estimate for ``model``'s table, or None if it has none."""
+    connection = connections[using]
+    table = model._meta.db_table
+    if connection.vendor == 'sqlite':
+        sql = 'SELECT MAX(CAST(stat AS INTEGER)) FROM sqlite_stat1 WHERE tbl = %s'
+    elif connection.vendor == 'postgresql':
+        sql = 'SELECT reltuples::bigint FROM pg_class WHERE relname = %s'
+    else:
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [table])
+            row = cursor.fetchone()
+    except DatabaseError:  # sqlite_stat1 only exists once ANALYZE has run
+        return None
+    if not row or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+def cached_count(queryset):
+    sql, params = queryset.query.sql_with_params()
+    digest = hashlib.md5(f'{sql}:{params}'.encode()).hexdigest()
+    return cache.get_or_set(
+        f'admin:count:{queryset.model._meta.label_lower}:{digest}',
+        queryset.count, settings.ADMIN_COUNT_CACHE_SECONDS,
+    )
+
+
+class EstimatedCountPaginator(Paginator):
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = table_row_estimate(queryset.model, queryset.db)
+            if estimate is not None:
+                # An integer pk bounds the row count from above with one index
+                # seek. Past the estimate, rows were added since ANALYZE (or
+                # deleted ids left gaps): count exactly so no page is cut off.
+                highest = queryset.order_by().aggregate(highest=Max('pk'))['highest']
+                if highest is None:
+                    return 0
+                if isinstance(highest, int) and highest <= estimate:
+                    return highest
+        return cached_count(queryset)
+
+
+def cached_bucket_dates(queryset, field_name):
+    """Distinct (local) dates of ``field_name``, computed once per cache period."""
+    def build():
+        return list(
+            queryset.annotate(bucket=TruncDate(field_name)).order_by('bucket')
+            .values_list('bucket', flat=True).distinct()
+        )
+    key = f'admin:buckets:{queryset.model._meta.label_lower}:{field_name}'
+    return cache.get_or_set(key, build, settings.ADMIN_COUNT_CACHE_SECONDS)
+
+
+class LargeTableAdminMixin:
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    change_list_template = 'admin/large_table_change_list.html'
+
+    def bucket_dates(self):
+        """Sorted dates on which ``date_hierarchy`` has at least one row."""
+        return cached_bucket_dates(self.model._default_manager.all(), self.date_hierarchy)
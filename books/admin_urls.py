@@ -5,7 +5,9 @@ from . import dashboard_views
 
 urlpatterns = [
     path('dashboard/', dashboard_views.dashboard, name='dashboard'),
+    path('dashboard/circulation.json', dashboard_views.circulation_series, name='circulation_series'),
     path('borrowings/', borrowing_views.all_borrowings, name='all_borrowings'),
+    path('borrowings/export.<str:fmt>', borrowing_views.export_borrowings, name='export_borrowings'),
     path('authors/', views.author_list, name='author_list'),
     path('authors/add/', views.author_create, name='author_create'),
     path('authors/<int:pk>/edit/', views.author_edit, name='author_edit'),
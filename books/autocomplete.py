@@ -0,0 +1,130 @@
+"""
+In-process prefix index for search-box suggestions.
+
+Normalized book titles and author names are kept in one sorted list; every
+word start of a name gets its own key, so "pot" finds "Harry Potter". A
+lookup is two ``bisect`` calls plus a scan of at most ``MAX_SCAN`` keys:
+very short prefixes, and any longer prefix shared by more keys than that,
+are answered from lists ranked when the index is built. The index loads on
+first use and is rebuilt in the background when a title or author name
+changes, or at least every ``POPULARITY_MAX_AGE`` seconds so rankings
+follow borrows and reviews (see ``books.catalog.NamesIndex``).
+"""
+
+import heapq
+import itertools
+import re
+import unicodedata
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.db.models import Count
+from django.urls import reverse
+
+from elms.routers import primary_reads
+
+from .catalog import NamesIndex
+
+MAX_SCAN = 5000
+SHORT_PREFIX = 2
+DEFAULT_LIMIT = 8
+POPULARITY_MAX_AGE = 3600
+
+NON_WORD_RE = re.compile(r'[^0-9a-z]+')
+
+
+def normalize(text):
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return NON_WORD_RE.sub(' ', text.lower()).strip()
+
+
+class PrefixIndex:
+    def __init__(self, entries):
+        """``entries`` is an iterable of (label, kind, url, popularity)."""
+        self.entries = []
+        keyed = []
+        for entry_id, (label, kind, url, popularity) in enumerate(entries):
+            self.entries.append({'label': label, 'kind': kind, 'url': url, 'popularity': popularity})
+            words = normalize(label).split()
+            for start in range(len(words)):
+                keyed.append((' '.join(words[start:]), entry_id))
+        keyed.sort()
+        self.keys = [key for key, _ in keyed]
+        self.ids = [entry_id for _, entry_id in keyed]
+
+        short = defaultdict(set)
+        for key, entry_id in keyed:
+            for size in range(1, SHORT_PREFIX + 1):
+                if len(key) >= size:
+                    short[key[:size]].add(entry_id)
+        self.short = {
+            prefix: self._ranked(entry_ids, DEFAULT_LIMIT * 4)
+            for prefix, entry_ids in short.items()
+        }
+        self.short.update(self._wide_prefixes())
+
+    def _wide_prefixes(self):
+        """Ranked lists for the prefixes longer than ``SHORT_PREFIX`` that cover more than ``MAX_SCAN`` keys."""
+        ranked = {}
+        wide = [(0, len(self.keys))]
+        size = SHORT_PREFIX
+        while wide:
+            size += 1
+            ranges = wide
+            wide = []
+            for lo, hi in ranges:
+                position = lo
+                for prefix, group in itertools.groupby(self.keys[lo:hi], key=lambda key: key[:size]):
+                    count = sum(1 for _ in group)
+                    if len(prefix) == size and count > MAX_SCAN:
+                        ranked[prefix] = self._ranked(set(self.ids[position:position + count]), DEFAULT_LIMIT * 4)
+                        wide.append((position, position + count))
+                    position += count
+        return ranked
+
+    def _ranked(self, entry_ids, limit):
+        return heapq.nlargest(
+            limit, entry_ids, key=lambda entry_id: (self.entries[entry_id]['popularity'], -entry_id),
+        )
+
+    def search(self, query, limit=DEFAULT_LIMIT):
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        if prefix in self.short:
+            entry_ids = self.short[prefix]
+        else:
+            lo = bisect_left(self.keys, prefix)
+            hi = bisect_left(self.keys, prefix + '\x7f')
+            entry_ids = set(self.ids[lo:hi])
+        return [self.entries[entry_id] for entry_id in self._ranked(entry_ids, limit)]
+
+
+@primary_reads()
+def build_index():
+    from borrowing.models import BorrowRecord
+    from .models import Author, Book
+
+    borrows = dict(
+        BorrowRecord.objects.values('book_id').annotate(n=Count('pk'))
+        .values_list('book_id', 'n').order_by()
+    )
+    author_popularity = defaultdict(int)
+    entries = []
+    for pk, title, author_id, rating_count in Book.objects.values_list(
+        'pk', 'title', 'author_id', 'rating_count',
+    ).iterator(chunk_size=5000):
+        popularity = borrows.get(pk, 0) + rating_count
+        author_popularity[author_id] += popularity
+        entries.append((title, 'book', reverse('book_detail', args=[pk]), popularity))
+    for pk, name in Author.objects.values_list('pk', 'name').iterator(chunk_size=5000):
+        entries.append((name, 'author', reverse('author_detail_public', args=[pk]), author_popularity[pk]))
+    return PrefixIndex(entries)
+
+
+index = NamesIndex(build_index, max_age=POPULARITY_MAX_AGE)
+
+
+def suggest(query, limit=DEFAULT_LIMIT):
+    return index.get().search(query, limit)
@@ -0,0 +1,153 @@
+"""
+Global catalog version.
+
+A counter row in the database (CatalogVersion), bumped in the same
+transaction as every catalog write (see ``books.signals``). In-process
+indexes and cached results remember the version they were built from and
+rebuild once it moves on; since the counter lives with the data, a write
+handled by one worker invalidates them in every other worker too.
+
+Within a request the version is read at most once per database. Bumps never
+go below the current time in microseconds, so a version is never reused
+after a rolled-back transaction or a restored backup, and it doubles as the
+time of the last catalog write (see ``version_timestamp``).
+
+The in-process autocomplete and fuzzy indexes only read book titles and
+author names, so they follow a second counter, the names version, that
+other writes (reviews, stock, descriptions) leave alone. ``NamesIndex``
+checks it in the background rather than on every request.
+"""
+
+import threading
+import time
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, router
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+
+SINGLETON_ID = 1
+
+_versions = ContextVar('catalog_versions', default=None)
+
+
+def start_request():
+    _versions.set({})
+
+
+def finish_request():
+    _versions.set(None)
+
+
+def catalog_version(using=None):
+    """The version as seen by ``using`` (by default, wherever catalog reads go)."""
+    from .models import CatalogVersion
+
+    if using is None:
+        using = router.db_for_read(CatalogVersion)
+    versions = _versions.get()
+    if versions is not None and using in versions:
+        return versions[using]
+    version = CatalogVersion.objects.using(using).filter(pk=SINGLETON_ID).values_list('version', flat=True).first()
+    if versions is not None:
+        versions[using] = version or 0
+    return version or 0
+
+
+def version_timestamp(version):
+    """When the catalog last changed, as of ``version``; None if it never has."""
+    if not version:
+        return None
+    return datetime.fromtimestamp(version / 1_000_000, tz=timezone.utc)
+
+
+def _bump(field):
+    from .models import CatalogVersion
+
+    floor = time.time_ns() // 1000
+    bumped = CatalogVersion.objects.filter(pk=SINGLETON_ID).update(
+        **{field: Greatest(F(field) + 1, Value(floor))},
+    )
+    if not bumped:
+        CatalogVersion.objects.get_or_create(pk=SINGLETON_ID, defaults={field: floor})
+
+
+def bump_catalog_version():
+    _bump('version')
+    versions = _versions.get()
+    if versions is not None:
+        versions.clear()
+
+
+def names_version():
+    """The names version on the primary, where the name indexes are built from."""
+    from .models import CatalogVersion
+
+    return CatalogVersion.objects.using(DEFAULT_DB_ALIAS).filter(pk=SINGLETON_ID).values_list(
+        'names_version', flat=True,
+    ).first() or 0
+
+
+def bump_names_version():
+    _bump('names_version')
+
+
+class NamesIndex:
+    """
+    An in-process index built by ``build()`` from book titles and author names.
+
+    The first ``get()`` builds it; after that, requests never touch the
+    database. Once ``SEARCH_INDEX_CHECK_SECONDS`` have passed since the last
+    check, ``get()`` starts a background ``refresh()`` and keeps serving the
+    current index until the new one is ready. ``max_age`` forces a rebuild
+    after that many seconds even if no name changed, for indexes that also
+    hold slower-moving data such as popularity.
+    """
+
+    def __init__(self, build, max_age=None):
+        self.build = build
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.index = None
+        self.version = None
+        self.built_at = self.checked_at = 0.0
+        self.refreshing = False
+
+    def get(self):
+        with self.lock:
+            if self.index is None:
+                self._load(names_version())
+            elif not self.refreshing and time.monotonic() - self.checked_at >= settings.SEARCH_INDEX_CHECK_SECONDS:
+                self.refreshing = True
+                threading.Thread(target=self._refresh_in_background, daemon=True).start()
+            return self.index
+
+    def refresh(self):
+        """Rebuild if the names version moved, or the index is older than ``max_age``."""
+        try:
+            version = names_version()
+            expired = self.max_age is not None and time.monotonic() - self.built_at >= self.max_age
+            if version != self.version or expired:
+                index = self.build()
+                with self.lock:
+                    self.index, self.version, self.built_at = index, version, time.monotonic()
+        finally:
+            with self.lock:
+                self.checked_at = time.monotonic()
+                self.refreshing = False
+
+    def clear(self):
+        with self.lock:
+            self.index, self.refreshing = None, False
+
+    def _load(self, version):
+        self.index, self.version = self.build(), version
+        self.built_at = self.checked_at = time.monotonic()
+
+    def _refresh_in_background(self):
+        try:
+            self.refresh()
+        finally:
+            connections.close_all()
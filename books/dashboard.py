@@ -0,0 +1,86 @@
+"""
+Cached pieces of the staff dashboard.
+
+The borrow leaderboards scan the whole loan table, so they are cached and
+only rebuilt when something changed and the cached copy is older than
+``DASHBOARD_STALENESS_SECONDS``. Circulation and catalog writes flag them
+as stale; ``DASHBOARD_CACHE_SECONDS`` bounds their age regardless.
+"""
+
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from elms.routers import primary_reads
+
+LEADERBOARDS_KEY = 'dashboard:leaderboards'
+STALE_KEY = 'dashboard:stale'
+
+
+def counters():
+    """Headline numbers, one conditional aggregate per table."""
+    from borrowing.models import BorrowRecord
+    from .models import Author, Book, Category
+
+    today = timezone.now().date()
+    loans = BorrowRecord.objects.aggregate(
+        active_borrowings=Count('pk', filter=Q(status='borrowed')),
+        overdue_borrowings=Count('pk', filter=Q(status='borrowed', due_date__lt=today)),
+    )
+    return {
+        'total_books': Book.objects.count(),
+        'total_authors': Author.objects.count(),
+        'total_categories': Category.objects.count(),
+        'total_students': User.objects.filter(is_staff=False, is_superuser=False).count(),
+        **loans,
+    }
+
+
+def top_books():
+    from .models import Book
+
+    return Book.objects.annotate(borrow_count=Count('borrow_records')).order_by('-borrow_count')[:5]
+
+
+def top_students():
+    return (
+        User.objects.annotate(borrow_count=Count('borrow_records'))
+        .filter(is_staff=False)
+        .order_by('-borrow_count')[:5]
+    )
+
+
+def recent_borrowings():
+    from borrowing.models import BorrowRecord
+
+    return BorrowRecord.objects.select_related('student', 'book').order_by('-borrow_date', '-id')[:10]
+
+
+@primary_reads()
+def build_leaderboards():
+    cache.delete(STALE_KEY)
+    leaderboards = {
+        'built_at': time.time(),
+        'top_books': list(top_books()),
+        'top_students': list(top_students()),
+    }
+    cache.set(LEADERBOARDS_KEY, leaderboards, settings.DASHBOARD_CACHE_SECONDS)
+    return leaderboards
+
+
+def get_leaderboards(refresh=False):
+    """Return ``(leaderboards, cache_hit)``."""
+    leaderboards = None if refresh else cache.get(LEADERBOARDS_KEY)
+    if leaderboards is not None:
+        age = time.time() - leaderboards['built_at']
+        if age < settings.DASHBOARD_STALENESS_SECONDS or not cache.get(STALE_KEY):
+            return leaderboards, True
+    return build_leaderboards(), False
+
+
+def mark_stale():
+    cache.set(STALE_KEY, True, settings.DASHBOARD_CACHE_SECONDS)
@@ -1,49 +1,89 @@
+import time
+from datetime import timedelta
+
 from django.shortcuts import render
 from django.contrib.auth.decorators import user_passes_test
-from django.contrib.auth.models import User
+from django.http import Http404, JsonResponse
 from django.utils import timezone
-from django.db.models import Count
-from books.models import Book, Author, Category
-from borrowing.models import BorrowRecord
+from borrowing.models import DailyCirculation
+from . import dashboard as dashboard_cache, result_cache
 
 
 def is_admin(user):
     return user.is_staff
 
 
+def _elapsed_ms(start):
+    return round((time.perf_counter() - start) * 1000, 1)
+
+
 @user_passes_test(is_admin)
 def dashboard(request):
+    started = time.perf_counter()
     today = timezone.now().date()
+    timings = {}
 
-    total_books = Book.objects.count()
-    total_authors = Author.objects.count()
-    total_categories = Category.objects.count()
-    total_students = User.objects.filter(is_staff=False, is_superuser=False).count()
-    active_borrowings = BorrowRecord.objects.filter(status='borrowed').count()
-    overdue_borrowings = BorrowRecord.objects.filter(
-        status='borrowed', due_date__lt=today
-    ).count()
-
-    top_books = (
-        Book.objects.annotate(borrow_count=Count('borrow_records'))
-        .order_by('-borrow_count')[:5]
-    )
-    top_students = (
-        User.objects.annotate(borrow_count=Count('borrow_records'))
-        .filter(is_staff=False)
-        .order_by('-borrow_count')[:5]
+    step = time.perf_counter()
+    counters = dashboard_cache.counters()
+    timings['counters'] = _elapsed_ms(step)
+
+    step = time.perf_counter()
+    leaderboards, leaderboards_hit = dashboard_cache.get_leaderboards(
+        refresh=request.GET.get('refresh') == '1'
     )
-    recent_borrowings = BorrowRecord.objects.select_related('student', 'book').order_by('-borrow_date')[:10]
+    timings['leaderboards'] = _elapsed_ms(step)
+
+    step = time.perf_counter()
+    recent_borrowings = list(dashboard_cache.recent_borrowings())
+    timings['recent'] = _elapsed_ms(step)
 
     return render(request, 'admin_dashboard/dashboard.html', {
-        'total_books': total_books,
-        'total_authors': total_authors,
-        'total_categories': total_categories,
-        'total_students': total_students,
-        'active_borrowings': active_borrowings,
-        'overdue_borrowings': overdue_borrowings,
-        'top_books': top_books,
-        'top_students': top_students,
+        **counters,
+        'top_books': leaderboards['top_books'],
+        'top_students': leaderboards['top_students'],
         'recent_borrowings': recent_borrowings,
         'today': today,
+        'leaderboards_hit': leaderboards_hit,
+        'leaderboards_age': int(time.time() - leaderboards['built_at']),
+        'timings': timings,
+        'result_cache': result_cache.results.stats(),
+        'total_ms': _elapsed_ms(started),
     })
+
+
+MAX_SERIES_DAYS = 3 * 365
+
+
+def series_rows(scope, object_id, start, end):
+    return DailyCirculation.objects.filter(
+        scope=scope, object_id=object_id, date__range=(start, end),
+    ).values('date', 'borrowed', 'returned', 'overdue')
+
+
+@user_passes_test(is_admin)
+def circulation_series(request):
+    """Daily borrowed/returned/overdue counts, read only from the rollup table."""
+    scope = request.GET.get('scope', DailyCirculation.SCOPE_LIBRARY)
+    if scope not in dict(DailyCirculation.SCOPE_CHOICES):
+        raise Http404('Unknown scope.')
+    try:
+        object_id = int(request.GET.get('id', 0)) if scope != DailyCirculation.SCOPE_LIBRARY else 0
+        days = min(max(int(request.GET.get('days', 90)), 1), MAX_SERIES_DAYS)
+    except ValueError:
+        raise Http404('Invalid id or days.')
+
+    end = timezone.now().date()
+    start = end - timedelta(days=days - 1)
+    rows = {row['date']: row for row in series_rows(scope, object_id, start, end)}
+    empty = {'borrowed': 0, 'returned': 0, 'overdue': 0}
+    series = []
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        row = rows.get(day, empty)
+        series.append({
+            'date': day.isoformat(),
+            'borrowed': row['borrowed'],
+            'returned': row['returned'],
+            'overdue': row['overdue'],
+        })
+    return JsonResponse({'scope': scope, 'id': object_id, 'series': series})
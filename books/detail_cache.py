@@ -0,0 +1,150 @@
+"""
+Cached rendering of the book detail page.
+
+The page is split into shared fragments (hero and body, identical for every
+visitor) and small personal slots (borrow/return actions, review button and
+prompt). Shared fragments are rendered once per book and cached; personal
+slots are filled in per request from one query (see ``personal_state``).
+Anonymous visitors get a fully rendered page from the cache without any SQL.
+
+Only the first ``REVIEWS_PER_PAGE`` reviews are inlined and the rating
+histogram comes from the stored per-star counts on Book, so building the
+shared fragments costs the same for any number of reviews; older reviews
+load through the keyset-paginated ``book_reviews`` endpoint.
+
+Book, author, category and review writes and every loan or return drop the
+affected books' entries. ``BOOK_DETAIL_CACHE_SECONDS`` bounds the age of the
+recommendation lists, which are rebuilt offline.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef, Subquery
+from django.shortcuts import get_object_or_404
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.safestring import mark_safe
+
+from elms.routers import primary_reads
+
+from .pagination import KeysetPaginator
+
+SLOTS = ('actions', 'review_button', 'review_prompt')
+REVIEWS_PER_PAGE = 10
+REVIEW_ORDERING = ('-created_at', '-id')
+
+
+def shared_key(book_id):
+    return f'book_detail:shared:{book_id}'
+
+
+def anonymous_key(book_id):
+    return f'book_detail:anonymous:{book_id}'
+
+
+def review_paginator(book_id):
+    """Keyset paginator over a book's reviews, newest first."""
+    from reviews.models import Review
+
+    reviews = Review.objects.filter(book_id=book_id).select_related('student')
+    return KeysetPaginator(reviews, REVIEW_ORDERING, REVIEWS_PER_PAGE)
+
+
+def review_page(book_id, cursor=None):
+    """One keyset page of a book's reviews, newest first."""
+    return review_paginator(book_id).page(cursor)
+
+
+def shared_book(book_id):
+    """The book the shared fragments are rendered from, as a queryset."""
+    from .models import Book
+
+    return Book.objects.select_related('author', 'category').filter(pk=book_id)
+
+
+# Always built from the primary. Loans and returns change the copies shown
+# here without bumping the catalog version (they drop the book's entries
+# instead), so there is no version to key a replica's fill on, and checking
+# one on every hit would cost the anonymous page its zero-SQL path.
+@primary_reads()
+def build_shared(book_id):
+    from . import recommendations
+
+    book = get_object_or_404(shared_book(book_id))
+    context = {
+        'book': book,
+        'reviews': review_page(book_id),
+        'also_borrowed': recommendations.readers_also_borrowed(book),
+        'similar_books': recommendations.similar_books(book),
+    }
+    return {
+        'title': book.title,
+        'hero': render_to_string('books/detail/hero.html', context),
+        'body': render_to_string('books/detail/body.html', context),
+    }
+
+
+def get_shared(book_id):
+    shared = cache.get(shared_key(book_id))
+    if shared is None:
+        shared = build_shared(book_id)
+        cache.set(shared_key(book_id), shared, settings.BOOK_DETAIL_CACHE_SECONDS)
+    return shared
+
+
+def personal_state_row(user, book_id):
+    """The single-row queryset behind :func:`personal_state`."""
+    from borrowing.models import BorrowRecord
+    from reviews.models import Review
+    from .models import Book
+
+    loans = BorrowRecord.objects.filter(student=user, book_id=OuterRef('pk'))
+    active = loans.filter(status='borrowed')
+    return Book.objects.filter(pk=book_id).annotate(
+        borrow_id=Subquery(active.values('pk')[:1]),
+        borrow_due=Subquery(active.values('due_date')[:1]),
+        has_returned=Exists(loans.filter(status='returned')),
+        has_review=Exists(Review.objects.filter(student=user, book_id=OuterRef('pk'))),
+    ).values('available_copies', 'borrow_id', 'borrow_due', 'has_returned', 'has_review')
+
+
+def personal_state(user, book_id):
+    """Everything the personal slots need for ``user``, in at most one query."""
+    state = {'book_id': book_id, 'borrow': None, 'available': None,
+             'has_returned': False, 'has_review': False, 'can_review': False}
+    if not user.is_authenticated or user.is_staff:
+        return state
+
+    row = personal_state_row(user, book_id).first()
+    if row is None:
+        return state
+
+    if row['borrow_id']:
+        state['borrow'] = {
+            'id': row['borrow_id'],
+            'due_date': row['borrow_due'],
+            'overdue': row['borrow_due'] < timezone.now().date(),
+        }
+    state.update(
+        available=row['available_copies'] > 0,
+        has_returned=row['has_returned'],
+        has_review=row['has_review'],
+        can_review=row['has_returned'] and not row['has_review'],
+    )
+    return state
+
+
+def fill_slots(shared, request, state):
+    """Return (hero, body) with the personal slots rendered for this request."""
+    fragments = {'hero': shared['hero'], 'body': shared['body']}
+    for slot in SLOTS:
+        html = render_to_string(f'books/detail/{slot}.html', state, request=request)
+        for name in fragments:
+            fragments[name] = fragments[name].replace(f'<!-- personal:{slot} -->', html)
+    return mark_safe(fragments['hero']), mark_safe(fragments['body'])
+
+
+def invalidate(*book_ids):
+    keys = [key for book_id in book_ids for key in (shared_key(book_id), anonymous_key(book_id))]
+    if keys:
+        cache.delete_many(keys)
@@ -0,0 +1,66 @@
+"""
+Category and language facet counts for the catalog search.
+
+One grouped query over the books matching the search text returns the
+(category, language) -> count grid. Both facets are derived from it in
+Python: category counts honour the selected language and language counts
+honour the selected category, so each facet still shows its alternatives.
+The grid is cached per normalized query and per catalog version of the
+database it was read from, so it can be filled from a lagging replica
+without ever being served to a request that has seen a newer catalog.
+"""
+
+import hashlib
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import router
+from django.db.models import Count
+
+from .catalog import catalog_version
+
+CACHE_TIMEOUT = 300
+
+
+def normalize_query(query):
+    return ' '.join(query.lower().split())
+
+
+def _cache_key(query, mode, using):
+    digest = hashlib.md5(f'{mode}:{normalize_query(query)}'.encode()).hexdigest()
+    return f'book_list:facets:{catalog_version(using)}:{digest}'
+
+
+def facet_rows(books):
+    """The grouped (category, language) counts over ``books``."""
+    return books.order_by().values('category_id', 'language').annotate(n=Count('pk'))
+
+
+def facet_grid(query, mode, matching, using=None):
+    """
+    Return ``[(category_id, language, count), ...]`` for the books matching
+    ``query``. ``matching`` returns that queryset and is only called on a
+    cache miss; it is read from ``using`` (by default, wherever catalog
+    reads go).
+    """
+    from .models import Book
+
+    if using is None:
+        using = router.db_for_read(Book)
+
+    def build():
+        rows = facet_rows(matching().using(using))
+        return [(row['category_id'], row['language'], row['n']) for row in rows]
+    return cache.get_or_set(_cache_key(query, mode, using), build, CACHE_TIMEOUT)
+
+
+def facet_counts(grid, category_id='', language=''):
+    """Split a grid into (category_counts, language_counts) dicts."""
+    categories = Counter()
+    languages = Counter()
+    for row_category, row_language, count in grid:
+        if not language or row_language == language:
+            categories[row_category] += count
+        if not category_id or str(row_category) == category_id:
+            languages[row_language] += count
+    return categories, languages
@@ -2,7 +2,32 @@ from django import forms
 from .models import Book, Author, Category
 
 
-class BookForm(forms.ModelForm):
+def partial_update_fields(instance, field_names):
+    """The concrete fields among ``field_names``, plus ``auto_now`` timestamps, for ``save(update_fields=...)``."""
+    fields = instance._meta.concrete_fields
+    names = {field.name for field in fields}
+    timestamps = [field.name for field in fields if getattr(field, 'auto_now', False)]
+    return [name for name in field_names if name in names] + timestamps
+
+
+class PartialSaveModelForm(forms.ModelForm):
+    """
+    Saves an existing row with ``update_fields`` limited to the form's own
+    fields (plus ``auto_now`` timestamps), so counters that are maintained
+    with F() updates elsewhere are never written back from the copy this
+    request loaded.
+    """
+
+    def save(self, commit=True):
+        if not commit or self.instance._state.adding:
+            return super().save(commit)
+        instance = super().save(commit=False)
+        instance.save(update_fields=partial_update_fields(instance, self._meta.fields))
+        self._save_m2m()
+        return instance
+
+
+class BookForm(PartialSaveModelForm):
     class Meta:
         model = Book
         fields = ('title', 'author', 'category', 'description', 'cover_image',
@@ -13,7 +38,7 @@ class BookForm(forms.ModelForm):
         }
 
 
-class AuthorForm(forms.ModelForm):
+class AuthorForm(PartialSaveModelForm):
     class Meta:
         model = Author
         fields = ('name', 'bio', 'photo')
@@ -22,7 +47,7 @@ class AuthorForm(forms.ModelForm):
         }
 
 
-class CategoryForm(forms.ModelForm):
+class CategoryForm(PartialSaveModelForm):
     class Meta:
         model = Category
         fields = ('name', 'description')
@@ -0,0 +1,111 @@
+"""
+Typo-tolerant search over titles and author names.
+
+Every distinct word of the catalog's titles and author names is split into
+padded trigrams (``"  d", " do", "dos", ...``) and kept in an in-memory
+inverted index of trigram -> word postings. A query word is matched
+against the vocabulary by trigram Jaccard similarity, so only words that
+share trigrams with it are ever looked at; matched words then map to the
+books that contain them. A book's score is the mean, over the query words,
+of its best word similarity.
+
+The vocabulary is much smaller than the catalog and a lookup only touches
+the postings of the query's own trigrams, so there is no per-book edit
+distance scan. The index loads on first use and is rebuilt in the
+background when a title or author name changes (see
+``books.catalog.NamesIndex``).
+"""
+
+import heapq
+from array import array
+from collections import Counter, defaultdict
+
+from elms.routers import primary_reads
+
+from .autocomplete import normalize
+from .catalog import NamesIndex
+
+WORD_THRESHOLD = 0.3
+MAX_WORD_MATCHES = 25
+MIN_SCORE = 0.45
+DEFAULT_LIMIT = 1000
+
+
+def trigrams(word):
+    padded = f'  {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    def __init__(self, rows):
+        """``rows`` is an iterable of (book_id, title, author_name)."""
+        word_ids = {}
+        word_books = defaultdict(set)
+        for book_id, title, author_name in rows:
+            for word in normalize(f'{title} {author_name or ""}').split():
+                word_books[word_ids.setdefault(word, len(word_ids))].add(book_id)
+
+        self.words = list(word_ids)
+        self.word_books = [array('l', sorted(word_books[i])) for i in range(len(self.words))]
+        self.word_sizes = array('H')
+        postings = defaultdict(list)
+        for word_id, word in enumerate(self.words):
+            grams = trigrams(word)
+            self.word_sizes.append(min(len(grams), 65535))
+            for gram in grams:
+                postings[gram].append(word_id)
+        self.postings = {gram: array('l', ids) for gram, ids in postings.items()}
+
+    def candidates(self, grams):
+        """Count the trigrams each word shares with ``grams``, reading only their postings."""
+        overlap = Counter()
+        for gram in grams:
+            overlap.update(self.postings.get(gram, ()))
+        return overlap
+
+    def match_words(self, word):
+        """Return up to ``MAX_WORD_MATCHES`` (similarity, word_id) pairs for one query word."""
+        grams = trigrams(word)
+        size = len(grams)
+        scored = []
+        for word_id, shared in self.candidates(grams).items():
+            similarity = shared / (size + self.word_sizes[word_id] - shared)
+            if similarity >= WORD_THRESHOLD:
+                scored.append((similarity, word_id))
+        return heapq.nlargest(MAX_WORD_MATCHES, scored)
+
+    def search(self, query, limit=DEFAULT_LIMIT):
+        """Return ``[(score, book_id), ...]``, best first."""
+        words = normalize(query).split()
+        if not words:
+            return []
+        totals = defaultdict(float)
+        for word in words:
+            best = {}
+            for similarity, word_id in self.match_words(word):
+                for book_id in self.word_books[word_id]:
+                    if similarity > best.get(book_id, 0):
+                        best[book_id] = similarity
+            for book_id, similarity in best.items():
+                totals[book_id] += similarity
+        scored = (
+            (total / len(words), -book_id) for book_id, total in totals.items()
+            if total / len(words) >= MIN_SCORE
+        )
+        return [(score, -negated) for score, negated in heapq.nlargest(limit, scored)]
+
+
+@primary_reads()
+def build_index():
+    from .models import Book
+
+    rows = Book.objects.values_list('pk', 'title', 'author__name').order_by()
+    return TrigramIndex(rows.iterator(chunk_size=5000))
+
+
+index = NamesIndex(build_index)
+
+
+def search(query, limit=DEFAULT_LIMIT):
+    """Book ids matching ``query`` approximately, best first."""
+    return [book_id for _, book_id in index.get().search(query, limit)]
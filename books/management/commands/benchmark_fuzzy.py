@@ -0,0 +1,85 @@
+"""
+Management command: python manage.py benchmark_fuzzy
+
+Times typo-tolerant lookups on a synthetic catalog: the trigram index
+against the naive alternative of computing an edit distance to every word
+of every book. Nothing is read from or written to the database.
+
+The scan is timed over a slice of the catalog and extrapolated, since
+running it in full takes minutes on the default catalog size.
+"""
+
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from books.fuzzy import TrigramIndex
+
+SYLLABLES = ['ka', 'lo', 'mir', 'ten', 'dra', 'vos', 'pel', 'an', 'gor', 'shi', 'ru', 'bel', 'tov', 'ska', 'ne']
+SCAN_SAMPLE = 1000
+
+
+def make_word(rng):
+    return ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+
+
+def levenshtein(a, b):
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, start=1):
+        current = [i]
+        for j, cb in enumerate(b, start=1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+
+class Command(BaseCommand):
+    help = 'Compare trigram-index fuzzy lookups with an edit-distance scan on a synthetic catalog.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=50000,
+                            help='Books in the synthetic catalog (default: 50000).')
+        parser.add_argument('--queries', type=int, default=20,
+                            help='Misspelled surnames to look up (default: 20).')
+        parser.add_argument('--seed', type=int, default=13,
+                            help='Random seed for the catalog and queries (default: 13).')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        rows = [
+            (pk, ' '.join(make_word(rng) for _ in range(3)), f'{make_word(rng)} {make_word(rng)}')
+            for pk in range(1, options['books'] + 1)
+        ]
+        queries = []
+        while len(queries) < options['queries']:
+            pk, _, author_name = rng.choice(rows)
+            word = author_name.split()[1]
+            if len(word) >= 8:
+                pos = rng.randrange(len(word))
+                queries.append((word[:pos] + word[pos + 1:], pk))
+
+        started = time.perf_counter()
+        index = TrigramIndex(rows)
+        build = time.perf_counter() - started
+
+        lookups, found = [], 0
+        for query, pk in queries:
+            started = time.perf_counter()
+            results = index.search(query)
+            lookups.append(time.perf_counter() - started)
+            found += pk in {book_id for _, book_id in results}
+
+        sample = rows[:SCAN_SAMPLE]
+        started = time.perf_counter()
+        for _, title, author_name in sample:
+            min(levenshtein(queries[0][0], word) for word in f'{title} {author_name}'.split())
+        scan = (time.perf_counter() - started) * len(rows) / len(sample)
+
+        lookup = statistics.median(lookups)
+        self.stdout.write(f'Index build:      {build:.2f}s for {len(rows)} books, {len(index.words)} distinct words')
+        self.stdout.write(f'Index lookup:     {lookup * 1000:.1f}ms median, {max(lookups) * 1000:.1f}ms worst')
+        self.stdout.write(f'Levenshtein scan: {scan * 1000:.0f}ms per query (extrapolated)')
+        self.stdout.write(f'Misspelled surnames found: {found}/{len(queries)}')
+        self.stdout.write(self.style.SUCCESS(f'Index lookups are {scan / lookup:.0f}x faster than a scan.'))
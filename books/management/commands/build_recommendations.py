@@ -0,0 +1,28 @@
+"""
+Management command: python manage.py build_recommendations
+
+Rebuilds the "readers also borrowed" neighbour table. With --since, only
+the books whose co-borrowing counts changed since that date are refreshed.
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from books import recommendations
+
+
+class Command(BaseCommand):
+    help = 'Compute "readers also borrowed" recommendations from loan history.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='Only refresh books affected by loans on or after YYYY-MM-DD.')
+
+    def handle(self, *args, **options):
+        if options['since']:
+            since = parse_date(options['since'])
+            if since is None:
+                raise CommandError('--since must be a date in YYYY-MM-DD format.')
+            refreshed = recommendations.refresh_books(recommendations.books_affected_since(since))
+        else:
+            refreshed = recommendations.build_all()
+        self.stdout.write(self.style.SUCCESS(f'Recommendations computed for {refreshed} books.'))
@@ -0,0 +1,27 @@
+"""
+Management command: python manage.py build_similar_books
+
+Vectorizes the catalog with TF-IDF and stores the top cosine neighbours of
+every book. With --incremental, only books changed since the last run are
+re-vectorized; they and the books whose lists they enter or leave get
+fresh neighbours. Run a full build periodically as well, since incremental
+runs leave other lists scored with an older idf.
+"""
+
+from django.core.management.base import BaseCommand
+
+from books import similarity
+
+
+class Command(BaseCommand):
+    help = 'Compute content-based "similar books" from titles, authors, categories and descriptions.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--incremental', action='store_true',
+                            help='Only process books changed since the previous run.')
+
+    def handle(self, *args, **options):
+        vectorized, computed = similarity.build(incremental=options['incremental'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Vectorized {vectorized} books, stored similar books for {computed}.'
+        ))
@@ -0,0 +1,289 @@
+"""
+Management command: python manage.py queryplan_audit
+
+Runs EXPLAIN on the querysets behind the views in books, borrowing, reviews,
+accounts and elms, and fails if a plan reads a large table with a full scan
+or sorts it in a temporary B-tree.
+
+A table is large from --min-rows rows (the planner's estimate when there is
+one, an exact count otherwise); use --min-rows 0 on a small development
+database to audit every table. An index-ordered walk of a LIMITed query is
+not a full scan as long as it filters no rows out on the way; a temporary
+sort counts against every table of its own (sub)query that can return more
+than one row per lookup. Probes with ``allow`` are deliberate whole-table
+reads whose result is cached, or scans no index can avoid. Bare
+COUNT/aggregate calls cannot be EXPLAINed through the ORM and are not
+probed.
+"""
+
+import re
+from collections import defaultdict, namedtuple
+from datetime import timedelta
+
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models.expressions import Col
+from django.test import RequestFactory
+from django.utils import timezone
+
+from accounts import views as account_views
+from books import dashboard, dashboard_views, detail_cache, facets, recommendations, views
+from books.admin_tools import table_row_estimate
+from books.models import Author, Book, BookNeighbor, Category
+from books.pagination import KeysetPaginator
+from books.views import KEYSET_ORDERINGS
+from borrowing import views as borrowing_views
+from borrowing.models import BorrowRecord, DailyCirculation
+from elms import homepage
+from reviews import views as review_views
+from reviews.models import Review
+from reviews.views import FEED_ORDERING, FEED_PAGE_SIZE
+
+FULL_SCAN = 'full scan'
+TEMP_SORT = 'temp B-tree sort'
+
+SQLITE_ROW = re.compile(r'^(?P<id>\d+) (?P<parent>\d+) \d+ (?P<detail>.*)$')
+SQLITE_ACCESS = re.compile(
+    r'\b(?:(?P<scan>SCAN)|SEARCH) (?P<table>\w+)(?: AS \w+)?'
+    r'(?P<index> USING (?:COVERING )?INDEX)?(?P<rowid> USING INTEGER PRIMARY KEY)?'
+)
+SQLITE_SORT = re.compile(r'\bUSE TEMP B-TREE\b')
+POSTGRES_NODE = re.compile(r'^(?P<indent>\s*)(?P<arrow>->\s+)?(?P<detail>\S.*)$')
+POSTGRES_ACCESS = re.compile(
+    r'^(?P<kind>Seq Scan|Index Scan(?: Backward)?|Index Only Scan(?: Backward)?|Bitmap Heap Scan)'
+    r'(?: using \w+)? on (?P<table>\w+)'
+)
+POSTGRES_SORT = re.compile(r'^(?:Incremental )?Sort\b')
+TABLE_ALIAS = re.compile(r'"(\w+)" (\w+)')
+
+SAMPLE_ID = 1
+
+Probe = namedtuple('Probe', 'label queryset allow', defaults=((),))
+
+
+def probes():
+    """
+    The querysets each view builds, from the helpers the views call, with a
+    sample id for every parameter. Only bare exists() checks and logins are
+    spelled out here.
+    """
+    today = timezone.now().date()
+    book = Book(pk=SAMPLE_ID)
+    author = Author(pk=SAMPLE_ID)
+    student = User(pk=SAMPLE_ID)
+    get = RequestFactory().get
+
+    def book_list(query='', category_id='', sort='newest'):
+        matching = views._matching_books(query, False, connection.alias)
+        return views._sorted_books(*matching, category_id, '', sort)
+
+    def borrowings(**params):
+        return borrowing_views._borrowings_paginator(
+            borrowing_views._filtered_records(get('/', params), today)[0], today,
+        ).page_query()
+
+    def review_feed(**params):
+        reviews = review_views._feed_queryset(get('/', params))
+        return KeysetPaginator(review_views._feed_rows(reviews), FEED_ORDERING, FEED_PAGE_SIZE).page_query()
+
+    catalog = [
+        Probe(f'book_list sort={sort}{label}', KeysetPaginator(
+            book_list(category_id=category_id, sort=sort), keys, views.BOOK_LIST_PER_PAGE,
+        ).page_query())
+        for sort, keys in KEYSET_ORDERINGS.items()
+        for label, category_id in (('', ''), (' category', SAMPLE_ID))
+    ]
+    return catalog + [
+        # books
+        Probe('book_list sort=newest page', book_list()[views.BOOK_LIST_PER_PAGE:2 * views.BOOK_LIST_PER_PAGE]),
+        # Only the full-text matches are ranked and sorted.
+        Probe('book_list sort=relevance', book_list('sample', sort='relevance')[:views.BOOK_LIST_PER_PAGE],
+              allow=(TEMP_SORT,)),
+        Probe('book_list sort=relevance category', book_list('sample', SAMPLE_ID, 'relevance')
+              [:views.BOOK_LIST_PER_PAGE], allow=(TEMP_SORT,)),
+        # Cached per catalog version.
+        Probe('book_list facets', facets.facet_rows(Book.objects.all()), allow=(FULL_SCAN, TEMP_SORT)),
+        Probe('book_detail book', detail_cache.shared_book(SAMPLE_ID)),
+        Probe('book_detail reviews', detail_cache.review_paginator(SAMPLE_ID).page_query()),
+        Probe('book_detail neighbours', recommendations.neighbor_rows(book, BookNeighbor.KIND_SIMILAR)),
+        Probe('book_detail personal state', detail_cache.personal_state_row(student, SAMPLE_ID)),
+        Probe('author_detail_public books', views._author_books(author)),
+        Probe('author_detail_public similar', recommendations.author_neighbor_rows(author), allow=(TEMP_SORT,)),
+        # The public directories render every row; categories stay small.
+        Probe('public_author_list', Author.objects.order_by('name'), allow=(FULL_SCAN,)),
+        Probe('public_category_list', Category.objects.order_by('name'), allow=(FULL_SCAN,)),
+        # A substring search cannot use an index: the name-ordered walk tests
+        # rows until a page is filled, or to the end if too few match.
+        Probe('author_list', views._panel_paginator(Author.objects.all(), 'a').page_query(), allow=(FULL_SCAN,)),
+        Probe('category_list', views._panel_paginator(Category.objects.all(), 'a').page_query(),
+              allow=(FULL_SCAN,)),
+        Probe('dashboard recent borrowings', dashboard.recent_borrowings()),
+        # Leaderboards are rebuilt from a cached snapshot, not per request.
+        Probe('dashboard top books', dashboard.top_books(), allow=(FULL_SCAN, TEMP_SORT)),
+        Probe('dashboard top students', dashboard.top_students(), allow=(FULL_SCAN, TEMP_SORT)),
+        Probe('circulation_series', dashboard_views.series_rows(
+            DailyCirculation.SCOPE_BOOK, SAMPLE_ID, today - timedelta(days=90), today,
+        )),
+
+        # borrowing
+        Probe('borrow_book eligibility', BorrowRecord.objects.filter(
+            student_id=SAMPLE_ID, status='borrowed',
+        ).filter(book_id=SAMPLE_ID)),
+        Probe('my_borrowings', borrowing_views._student_records(student)),
+        Probe('my_borrowings status', borrowing_views._student_records(student, 'returned')),
+        Probe('my_books', borrowing_views._active_loans(student)),
+        Probe('all_borrowings', borrowings()),
+        Probe('all_borrowings status', borrowings(status='borrowed')),
+        # Only the overdue loans are sorted.
+        Probe('all_borrowings overdue', borrowings(overdue='1'), allow=(TEMP_SORT,)),
+        Probe('all_borrowings dates', borrowings(**{'from': today - timedelta(days=30), 'to': today})),
+        # Streams the whole filtered table by design.
+        Probe('export_borrowings', borrowing_views._export_rows(BorrowRecord.objects.all()), allow=(FULL_SCAN,)),
+
+        # reviews
+        Probe('public_reviews', review_views._public_reviews()[:review_views.PUBLIC_REVIEWS_PER_PAGE]),
+        Probe('review_feed', review_feed()),
+        Probe('review_feed book', review_feed(book=SAMPLE_ID)),
+        Probe('review_feed rating', review_feed(rating=5)),
+        # One author's reviews are merged across their books, then sorted.
+        Probe('review_feed author', review_feed(author=SAMPLE_ID), allow=(TEMP_SORT,)),
+        Probe('add_review checks', Review.objects.filter(student_id=SAMPLE_ID, book_id=SAMPLE_ID)),
+
+        # accounts
+        Probe('profile', account_views._borrow_history(student)),
+        Probe('profile active', account_views._borrow_history(student).filter(status='borrowed')),
+        Probe('user_login', User.objects.filter(username='reader')),
+
+        # elms
+        Probe('home recent books', homepage.recent_books(Book.objects.all())),
+        Probe('home top rated', homepage.top_rated(Book.objects.all())),
+    ]
+
+
+def filtered_tables(queryset, aliases):
+    """Tables the WHERE clause puts a condition on."""
+    return {
+        aliases.get(expression.alias, expression.alias)
+        for condition in queryset.query.where.leaves() if hasattr(condition, 'flatten')
+        for expression in condition.flatten() if isinstance(expression, Col)
+    }
+
+
+def sqlite_issues(plan, limited, filtered, aliases):
+    # Each line is "id parent notused detail"; lines with the same parent
+    # belong to the same (sub)query.
+    issues = []
+    tables = defaultdict(list)
+    sorted_blocks = set()
+    for line in plan.splitlines():
+        row = SQLITE_ROW.match(line)
+        if not row:
+            continue
+        access = SQLITE_ACCESS.search(row['detail'])
+        if access:
+            table = aliases.get(access['table'], access['table'])
+            if not access['rowid']:
+                tables[row['parent']].append(table)
+            # An index-ordered walk of a LIMITed query stops after a page,
+            # unless rows are filtered out on the way.
+            if access['scan'] and not (limited and access['index'] and table not in filtered):
+                issues.append((FULL_SCAN, table))
+        if SQLITE_SORT.search(row['detail']):
+            sorted_blocks.add(row['parent'])
+    # A sort holds the rows of its own (sub)query: every table in it that can
+    # produce more than one row per lookup.
+    issues.extend((TEMP_SORT, table) for block in sorted_blocks for table in tables[block])
+    return issues
+
+
+def postgres_issues(plan, limited, aliases):
+    issues = []
+    nodes = []  # [depth, kind, table, index condition, filter]
+    for line in plan.splitlines():
+        node = POSTGRES_NODE.match(line)
+        if node and (node['arrow'] or not nodes):
+            scan = POSTGRES_ACCESS.match(node['detail'])
+            kind = 'Sort' if POSTGRES_SORT.match(node['detail']) else scan and scan['kind']
+            table = scan and aliases.get(scan['table'], scan['table'])
+            nodes.append([len(node['indent']), kind, table, False, False])
+        elif nodes:
+            nodes[-1][3] |= 'Index Cond:' in line
+            nodes[-1][4] |= 'Filter:' in line
+    for i, (depth, kind, table, index_cond, has_filter) in enumerate(nodes):
+        if kind == 'Sort':
+            # A sort holds the rows of every scan beneath it.
+            for child_depth, _, child_table, _, _ in nodes[i + 1:]:
+                if child_depth <= depth:
+                    break
+                if child_table:
+                    issues.append((TEMP_SORT, child_table))
+        elif kind == 'Seq Scan':
+            issues.append((FULL_SCAN, table))
+        elif kind and kind.startswith('Index') and not index_cond and not (limited and not has_filter):
+            issues.append((FULL_SCAN, table))
+    return issues
+
+
+def plan_issues(plan, queryset, vendor):
+    """``(check, table)`` for every full scan or temporary sort in ``plan``."""
+    # Plans name joined and subquery tables by their alias (T4, U0, ...).
+    aliases = {alias: name for name, alias in TABLE_ALIAS.findall(queryset.query.sql_with_params()[0])}
+    if vendor == 'sqlite':
+        return sqlite_issues(plan, queryset.query.is_sliced, filtered_tables(queryset, aliases), aliases)
+    return postgres_issues(plan, queryset.query.is_sliced, aliases)
+
+
+class TableSizes(dict):
+    """Row counts per table, looked up on first use."""
+
+    def __init__(self):
+        super().__init__()
+        self.models = {model._meta.db_table: model for model in apps.get_models(include_auto_created=True)}
+
+    def __missing__(self, table):
+        model = self.models.get(table)
+        if model is None:
+            size = None
+        else:
+            size = table_row_estimate(model)
+            if size is None:
+                size = model._base_manager.count()
+        self[table] = size
+        return size
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN the queries behind every view and fail on full scans or temp sorts of large tables.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-rows', type=int, default=1000,
+                            help='Tables with at least this many rows count as large (default: 1000).')
+
+    def handle(self, *args, **options):
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            raise CommandError(f'queryplan_audit does not understand {connection.vendor} plans.')
+        verbosity = options['verbosity']
+        sizes = TableSizes()
+        checked = probes()
+        failed = 0
+        for probe in checked:
+            plan = probe.queryset.explain()
+            issues = sorted({
+                (check, table) for check, table in plan_issues(plan, probe.queryset, connection.vendor)
+                if check not in probe.allow
+                and sizes[table] is not None and sizes[table] >= options['min_rows']
+            })
+            if issues:
+                failed += 1
+                found = ', '.join(f'{check} on {table}' for check, table in issues)
+                self.stdout.write(self.style.ERROR(f'FAIL  {probe.label}: {found}'))
+            elif verbosity >= 1:
+                self.stdout.write(f'ok    {probe.label}')
+            if verbosity >= 2 or (issues and verbosity >= 1):
+                self.stdout.write('\n'.join(f'        {line}' for line in plan.splitlines()))
+
+        if failed:
+            raise CommandError(f'{failed} of {len(checked)} query plans scan or sort a large table.')
+        self.stdout.write(self.style.SUCCESS(f'All {len(checked)} query plans use indexes.'))
@@ -0,0 +1,76 @@
+"""
+Management command: python manage.py recompute_ratings
+
+Recomputes the stored rating_count / rating_sum / avg_rating columns and the
+per-star rating_1 .. rating_5 histogram on every Book from its reviews and
+repairs any row that has drifted.
+"""
+
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from books.models import Book
+from reviews.models import Review
+
+AGGREGATE_FIELDS = [
+    'rating_count', 'rating_sum', 'avg_rating',
+    'rating_1', 'rating_2', 'rating_3', 'rating_4', 'rating_5',
+]
+
+
+def aggregates(stars):
+    """Expected aggregate values for a ``{rating: count}`` mapping."""
+    count = sum(stars.values())
+    total = sum(rating * n for rating, n in stars.items())
+    values = {
+        'rating_count': count,
+        'rating_sum': total,
+        'avg_rating': total / count if count else 0.0,
+    }
+    values.update({f'rating_{rating}': stars.get(rating, 0) for rating in range(1, 6)})
+    return values
+
+
+class Command(BaseCommand):
+    help = 'Backfill or repair the denormalized rating aggregates on books.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of books checked per transaction (default: 1000).')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        books = Book.objects.only('pk', *AGGREGATE_FIELDS).order_by('pk')
+        last_pk = 0
+        checked = repaired = 0
+        while True:
+            batch = list(books.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            checked += len(batch)
+
+            stars = defaultdict(dict)
+            for row in (
+                Review.objects.filter(book_id__in=[b.pk for b in batch])
+                .values('book_id', 'rating').annotate(n=Count('pk'))
+            ):
+                stars[row['book_id']][row['rating']] = row['n']
+            stale = []
+            for book in batch:
+                expected = aggregates(stars.get(book.pk, {}))
+                if any(getattr(book, field) != value for field, value in expected.items()):
+                    for field, value in expected.items():
+                        setattr(book, field, value)
+                    stale.append(book)
+            if stale:
+                with transaction.atomic():
+                    Book.objects.bulk_update(stale, AGGREGATE_FIELDS)
+                repaired += len(stale)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Checked {checked} books, repaired {repaired} rating aggregate(s).'
+        ))
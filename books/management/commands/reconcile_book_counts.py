@@ -0,0 +1,66 @@
+"""
+Management command: python manage.py reconcile_book_counts
+
+Recounts the stored book_count / available_book_count columns on every
+Author and Category from the Book table and repairs any row that has drifted
+(e.g. after a raw fixture load or a bulk QuerySet.update on books).
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Q
+
+from books.models import Author, Book, Category
+
+COUNTER_FIELDS = ['book_count', 'available_book_count']
+
+
+class Command(BaseCommand):
+    help = 'Backfill or repair the denormalized book counters on authors and categories.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of rows checked per transaction (default: 1000).')
+
+    def handle(self, *args, **options):
+        for model, field in ((Author, 'author_id'), (Category, 'category_id')):
+            checked, repaired = self.reconcile(model, field, options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(
+                f'Checked {checked} {str(model._meta.verbose_name_plural).lower()}, repaired {repaired} counter(s).'
+            ))
+
+    def reconcile(self, model, field, batch_size):
+        rows = model.objects.only('pk', *COUNTER_FIELDS).order_by('pk')
+        last_pk = 0
+        checked = repaired = 0
+        while True:
+            batch = list(rows.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            checked += len(batch)
+
+            counts = {
+                row[field]: row
+                for row in (
+                    Book.objects.filter(**{f'{field}__in': [obj.pk for obj in batch]})
+                    .order_by().values(field)
+                    .annotate(
+                        book_count=Count('pk'),
+                        available_book_count=Count('pk', filter=Q(available_copies__gt=0)),
+                    )
+                )
+            }
+            stale = []
+            for obj in batch:
+                expected = counts.get(obj.pk, {})
+                values = {name: expected.get(name, 0) for name in COUNTER_FIELDS}
+                if any(getattr(obj, name) != value for name, value in values.items()):
+                    for name, value in values.items():
+                        setattr(obj, name, value)
+                    stale.append(obj)
+            if stale:
+                with transaction.atomic():
+                    model.objects.bulk_update(stale, COUNTER_FIELDS)
+                repaired += len(stale)
+        return checked, repaired
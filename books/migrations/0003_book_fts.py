@@ -0,0 +1,33 @@
+from django.db import migrations
+
+from books import search
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(search.CREATE_SQL)
+    schema_editor.execute(
+        f'INSERT INTO {search.FTS_TABLE} (rowid, title, description, author, category) '
+        "SELECT b.id, b.title, b.description, COALESCE(a.name, ''), COALESCE(c.name, '') "
+        'FROM books_book b '
+        'LEFT JOIN books_author a ON a.id = b.author_id '
+        'LEFT JOIN books_category c ON c.id = b.category_id'
+    )
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(search.DROP_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0002_book_language_book_pages'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
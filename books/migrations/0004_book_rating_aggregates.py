@@ -0,0 +1,43 @@
+# Generated by Django 5.2.8 on 2026-10-18 02:21
+
+from django.db import migrations, models
+from django.db.models import Avg, Count, Sum
+
+
+def backfill_ratings(apps, schema_editor):
+    Book = apps.get_model('books', 'Book')
+    Review = apps.get_model('reviews', 'Review')
+    stats = Review.objects.values('book_id').annotate(
+        count=Count('pk'), total=Sum('rating'), avg=Avg('rating'),
+    )
+    for row in stats.iterator():
+        Book.objects.filter(pk=row['book_id']).update(
+            rating_count=row['count'], rating_sum=row['total'], avg_rating=row['avg'],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0003_book_fts'),
+        ('reviews', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='avg_rating',
+            field=models.FloatField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_ratings, migrations.RunPython.noop),
+    ]
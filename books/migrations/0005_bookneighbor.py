@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-18 02:32
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0004_book_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookNeighbor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('borrowed', 'Readers also borrowed')], max_length=10)),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('score', models.FloatField()),
+                ('computed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='neighbors', to='books.book')),
+                ('neighbor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='books.book')),
+            ],
+            options={
+                'ordering': ['book', 'kind', 'rank'],
+                'constraints': [models.UniqueConstraint(fields=('book', 'kind', 'rank'), name='book_neighbor_rank_unique')],
+            },
+        ),
+    ]
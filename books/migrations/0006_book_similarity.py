@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-18 02:34
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0005_bookneighbor'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookVector',
+            fields=[
+                ('book', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='vector', serialize=False, to='books.book')),
+                ('terms', models.JSONField(default=dict)),
+                ('computed_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AlterField(
+            model_name='bookneighbor',
+            name='kind',
+            field=models.CharField(choices=[('borrowed', 'Readers also borrowed'), ('similar', 'Similar content')], max_length=10),
+        ),
+    ]
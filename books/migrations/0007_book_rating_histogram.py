@@ -0,0 +1,53 @@
+# Generated by Django 5.2.8 on 2026-10-18 02:46
+
+from collections import defaultdict
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_histogram(apps, schema_editor):
+    Book = apps.get_model('books', 'Book')
+    Review = apps.get_model('reviews', 'Review')
+    histograms = defaultdict(dict)
+    for row in Review.objects.values('book_id', 'rating').annotate(n=Count('pk')).iterator():
+        histograms[row['book_id']][f'rating_{row["rating"]}'] = row['n']
+    for book_id, counts in histograms.items():
+        Book.objects.filter(pk=book_id).update(**counts)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0006_book_similarity'),
+        ('reviews', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='rating_1',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rating_2',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rating_3',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rating_4',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rating_5',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_histogram, migrations.RunPython.noop),
+    ]
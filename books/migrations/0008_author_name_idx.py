@@ -0,0 +1,17 @@
+# Generated by Django 5.2.8 on 2026-10-18 02:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0007_book_rating_histogram'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='author',
+            index=models.Index(fields=['name', 'id'], name='author_name_idx'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.8 on 2026-10-18 02:57
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def backfill_counters(apps, schema_editor):
+    Book = apps.get_model('books', 'Book')
+    for model_name, field in (('Author', 'author_id'), ('Category', 'category_id')):
+        model = apps.get_model('books', model_name)
+        rows = (
+            Book.objects.filter(**{f'{field}__isnull': False}).order_by().values(field)
+            .annotate(books=Count('pk'), available=Count('pk', filter=Q(available_copies__gt=0)))
+        )
+        for row in rows.iterator():
+            model.objects.filter(pk=row[field]).update(
+                book_count=row['books'], available_book_count=row['available'],
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0008_author_name_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='author',
+            name='available_book_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='available books'),
+        ),
+        migrations.AddField(
+            model_name='author',
+            name='book_count',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False, verbose_name='books'),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='available_book_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='available books'),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='book_count',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False, verbose_name='books'),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.8 on 2026-10-18 03:46
+
+from django.db import migrations, models
+
+
+def create_version_row(apps, schema_editor):
+    apps.get_model('books', 'CatalogVersion').objects.get_or_create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0010_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(create_version_row, migrations.RunPython.noop),
+    ]
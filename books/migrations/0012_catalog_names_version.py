@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 04:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0011_catalog_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='catalogversion',
+            name='names_version',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
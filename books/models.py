@@ -1,22 +1,33 @@
+from collections import Counter
+
 from django.db import models
-from django.db.models import Avg
+from django.utils import timezone
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import Cast, Coalesce, NullIf
 
 
 class Author(models.Model):
     name = models.CharField(max_length=200)
     bio = models.TextField(blank=True)
     photo = models.ImageField(upload_to='authors/', blank=True, null=True)
+    # Listing counters, maintained by the Book signals and circulation services.
+    book_count = models.PositiveIntegerField('books', default=0, db_index=True, editable=False)
+    available_book_count = models.PositiveIntegerField('available books', default=0, editable=False)
 
     def __str__(self):
         return self.name
 
     class Meta:
         ordering = ['name']
+        indexes = [models.Index(fields=['name', 'id'], name='author_name_idx')]
 
 
 class Category(models.Model):
     name = models.CharField(max_length=100, unique=True)
     description = models.TextField(blank=True)
+    # Listing counters, maintained by the Book signals and circulation services.
+    book_count = models.PositiveIntegerField('books', default=0, db_index=True, editable=False)
+    available_book_count = models.PositiveIntegerField('available books', default=0, editable=False)
 
     def __str__(self):
         return self.name
@@ -39,14 +50,75 @@ class Book(models.Model):
     available_copies = models.PositiveIntegerField(default=1)
     published_date = models.DateField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Review aggregates, maintained by the reviews.Review signals.
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    avg_rating = models.FloatField(default=0, db_index=True, editable=False)
+    rating_1 = models.PositiveIntegerField(default=0, editable=False)
+    rating_2 = models.PositiveIntegerField(default=0, editable=False)
+    rating_3 = models.PositiveIntegerField(default=0, editable=False)
+    rating_4 = models.PositiveIntegerField(default=0, editable=False)
+    rating_5 = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
         return self.title
 
     @property
     def average_rating(self):
-        result = self.reviews.aggregate(avg=Avg('rating'))
-        return result['avg']
+        return self.avg_rating if self.rating_count else None
+
+    @property
+    def rating_histogram(self):
+        """``[(stars, count, percent), ...]`` from 5 stars down to 1."""
+        total = self.rating_count
+        return [
+            (stars, getattr(self, f'rating_{stars}'),
+             round(100 * getattr(self, f'rating_{stars}') / total) if total else 0)
+            for stars in range(5, 0, -1)
+        ]
+
+    @classmethod
+    def adjust_rating(cls, book_id, added=None, removed=None):
+        """
+        Atomically add the rating ``added`` to a book's aggregates and/or take
+        ``removed`` out of them (either may be None).
+        """
+        stars = Counter()
+        if added is not None:
+            stars[added] += 1
+        if removed is not None:
+            stars[removed] -= 1
+        count_delta = sum(stars.values())
+        new_count = F('rating_count') + count_delta
+        new_sum = F('rating_sum') + (added or 0) - (removed or 0)
+        cls.objects.filter(pk=book_id).update(
+            rating_count=new_count,
+            rating_sum=new_sum,
+            avg_rating=Coalesce(
+                Cast(new_sum, FloatField()) / NullIf(new_count, Value(0)),
+                Value(0.0),
+            ),
+            **{f'rating_{star}': F(f'rating_{star}') + delta for star, delta in stars.items() if delta},
+        )
+
+    @staticmethod
+    def adjust_book_counts(author_id=None, category_id=None, books=0, available=0):
+        """
+        Atomically add ``books`` / ``available`` to the listing counters of an
+        author and a category (either id may be None).
+        """
+        changes = {}
+        if books:
+            changes['book_count'] = F('book_count') + books
+        if available:
+            changes['available_book_count'] = F('available_book_count') + available
+        if not changes:
+            return
+        if author_id:
+            Author.objects.filter(pk=author_id).update(**changes)
+        if category_id:
+            Category.objects.filter(pk=category_id).update(**changes)
 
     @property
     def is_available(self):
@@ -54,3 +126,63 @@ class Book(models.Model):
 
     class Meta:
         ordering = ['title']
+        indexes = [
+            models.Index(fields=['created_at'], name='book_created_idx'),
+            models.Index(fields=['category', 'created_at'], name='book_category_created_idx'),
+            models.Index(fields=['author', 'created_at'], name='book_author_created_idx'),
+            models.Index(fields=['category', 'avg_rating'], name='book_category_rating_idx'),
+        ]
+
+
+class BookNeighbor(models.Model):
+    """Precomputed top-K related books, served with one indexed lookup."""
+
+    KIND_BORROWED = 'borrowed'
+    KIND_SIMILAR = 'similar'
+    KIND_CHOICES = [
+        (KIND_BORROWED, 'Readers also borrowed'),
+        (KIND_SIMILAR, 'Similar content'),
+    ]
+
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='neighbors')
+    neighbor = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='+')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+    computed_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f'{self.book_id} -> {self.neighbor_id} ({self.kind} #{self.rank})'
+
+    class Meta:
+        ordering = ['book', 'kind', 'rank']
+        constraints = [
+            models.UniqueConstraint(fields=['book', 'kind', 'rank'], name='book_neighbor_rank_unique'),
+        ]
+
+
+class BookVector(models.Model):
+    """Term frequencies of a book's text, kept so unchanged books need no re-tokenizing."""
+
+    book = models.OneToOneField(Book, on_delete=models.CASCADE, primary_key=True, related_name='vector')
+    terms = models.JSONField(default=dict)
+    computed_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f'Vector for book {self.book_id}'
+
+
+class CatalogVersion(models.Model):
+    """
+    Single-row counters bumped in the same transaction as catalog writes
+    (see ``books.catalog``): ``version`` on every write, ``names_version``
+    only when book titles or author names change. Being a table, it is
+    shared by every worker and copied to read replicas together with the
+    data it describes.
+    """
+
+    version = models.PositiveBigIntegerField(default=0)
+    names_version = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f'Catalog version {self.version}'
@@ -0,0 +1,161 @@
+"""
+Keyset (cursor) pagination.
+
+Instead of ``OFFSET`` + ``COUNT(*)``, each page is fetched with a ``WHERE``
+clause that continues from the sort key of the last row seen, so every page
+costs the same as the first one. Cursors are opaque url-safe tokens.
+"""
+
+import base64
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def encode_cursor(values, direction):
+    payload = json.dumps({'v': values, 'd': direction}, default=str, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        values, direction = payload['v'], payload['d']
+    except (ValueError, KeyError, TypeError) as exc:
+        raise InvalidCursor(token) from exc
+    if direction not in ('next', 'prev') or not isinstance(values, list):
+        raise InvalidCursor(token)
+    return values, direction
+
+
+def count_cache_key(prefix, **params):
+    digest = hashlib.md5(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+    return f'{prefix}:count:{digest}'
+
+
+class KeysetPage:
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.has_next_page = has_next
+        self.has_previous_page = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.has_next_page
+
+    def has_previous(self):
+        return self.has_previous_page
+
+    def has_other_pages(self):
+        return self.has_next_page or self.has_previous_page
+
+    @property
+    def next_cursor(self):
+        if not self.has_next_page:
+            return None
+        return encode_cursor(self.paginator.key_values(self.object_list[-1]), 'next')
+
+    @property
+    def previous_cursor(self):
+        if not self.has_previous_page:
+            return None
+        return encode_cursor(self.paginator.key_values(self.object_list[0]), 'prev')
+
+
+class KeysetPaginator:
+    """
+    Paginate ``queryset`` on ``keys``, a tuple of field/annotation names in
+    ``order_by`` syntax whose last entry must be unique (normally the pk).
+
+    The exact total is only computed when ``count`` is accessed and, if
+    ``count_key`` is given, cached for ``count_timeout`` seconds.
+    """
+
+    def __init__(self, queryset, keys, per_page, count_key=None, count_timeout=300):
+        self.queryset = queryset
+        self.keys = tuple(keys)
+        self.per_page = per_page
+        self.count_key = count_key
+        self.count_timeout = count_timeout
+        self._count = None
+
+    @property
+    def count(self):
+        if self._count is None:
+            if self.count_key:
+                self._count = cache.get_or_set(self.count_key, self.queryset.count, self.count_timeout)
+            else:
+                self._count = self.queryset.count()
+        return self._count
+
+    def key_values(self, obj):
+        if isinstance(obj, dict):  # rows from .values()
+            return [obj[key.lstrip('-')] for key in self.keys]
+        return [getattr(obj, key.lstrip('-')) for key in self.keys]
+
+    def _after(self, values, reverse=False):
+        """Q object selecting rows strictly after ``values`` in key order."""
+        condition = Q()
+        for index in reversed(range(len(self.keys))):
+            key = self.keys[index]
+            name = key.lstrip('-')
+            descending = key.startswith('-') != reverse
+            step = Q(**{f'{name}__{"lt" if descending else "gt"}': values[index]})
+            if index < len(self.keys) - 1:
+                step |= Q(**{name: values[index]}) & condition
+            condition = step
+        return condition
+
+    def _decode(self, cursor):
+        if len(self.keys) < 1:
+            raise ValueError('KeysetPaginator needs at least one key.')
+        values, direction = decode_cursor(cursor) if cursor else (None, 'next')
+        if values is not None and len(values) != len(self.keys):
+            raise InvalidCursor(cursor)
+        return values, direction
+
+    def page_query(self, cursor=None):
+        """The query ``page(cursor)`` runs: up to one row more than a page, in walk order."""
+        values, direction = self._decode(cursor)
+        qs = self.queryset
+        if values is not None:
+            try:
+                qs = qs.filter(self._after(values, reverse=direction == 'prev'))
+            except (TypeError, ValueError, ValidationError) as exc:  # tampered key values
+                raise InvalidCursor(cursor) from exc
+        ordering = self.keys
+        if direction == 'prev':
+            ordering = [key[1:] if key.startswith('-') else f'-{key}' for key in self.keys]
+        return qs.order_by(*ordering)[:self.per_page + 1]
+
+    def page(self, cursor=None):
+        values, direction = self._decode(cursor)
+        rows = list(self.page_query(cursor))
+        if direction == 'prev':
+            has_previous = len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+            return KeysetPage(rows, self, has_next=True, has_previous=has_previous)
+
+        has_next = len(rows) > self.per_page
+        return KeysetPage(rows[:self.per_page], self, has_next=has_next, has_previous=values is not None)
+
+    def get_page(self, cursor=None):
+        """Like ``page`` but falls back to the first page on a bad cursor."""
+        try:
+            return self.page(cursor)
+        except InvalidCursor:
+            return self.page(None)
@@ -0,0 +1,151 @@
+"""
+"Readers also borrowed" recommendations.
+
+The student x book loan matrix A is kept sparse as posting lists
+(student -> books and book -> students). Row ``b`` of the co-occurrence
+matrix AᵀA is the sum of the baskets of the students who borrowed ``b``.
+Scores are normalised by reader counts, ``co(a, b) / sqrt(n_a * n_b)``, so
+popular titles don't show up everywhere. Only the top ``TOP_K`` neighbours
+per book are stored, in BookNeighbor.
+
+A full build reads every (student, book) pair once. An incremental refresh
+recomputes the rows for a set of books from the baskets of their readers
+only; reader counts of neighbours outside that set may drift until the
+next full build.
+"""
+
+import heapq
+import math
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from borrowing.models import BorrowRecord
+from .models import BookNeighbor
+
+TOP_K = 6
+WRITE_BATCH_SIZE = 500
+
+
+def posting_lists(pairs):
+    """Build (book -> students, student -> books) from (student_id, book_id) pairs."""
+    book_students = defaultdict(set)
+    student_books = defaultdict(set)
+    for student_id, book_id in pairs:
+        book_students[book_id].add(student_id)
+        student_books[student_id].add(book_id)
+    return book_students, student_books
+
+
+def top_neighbors(book_id, book_students, student_books, readers, k=TOP_K):
+    """Return the ``k`` best ``(score, neighbor_id)`` pairs for one book."""
+    co = Counter()
+    for student_id in book_students.get(book_id, ()):
+        co.update(student_books[student_id])
+    co.pop(book_id, None)
+    own = readers.get(book_id, 0)
+    scored = ((count / math.sqrt(own * readers[other]), -other) for other, count in co.items())
+    return [(score, -negated) for score, negated in heapq.nlargest(k, scored)]
+
+
+def store_neighbors(kind, rows_by_book, computed_at=None):
+    """Replace the stored ``kind`` neighbours for every book in ``rows_by_book``."""
+    now = computed_at or timezone.now()
+    book_ids = list(rows_by_book)
+    for start in range(0, len(book_ids), WRITE_BATCH_SIZE):
+        batch = book_ids[start:start + WRITE_BATCH_SIZE]
+        with transaction.atomic():
+            BookNeighbor.objects.filter(kind=kind, book_id__in=batch).delete()
+            BookNeighbor.objects.bulk_create(
+                BookNeighbor(
+                    book_id=book_id, neighbor_id=neighbor_id, kind=kind,
+                    rank=rank, score=score, computed_at=now,
+                )
+                for book_id in batch
+                for rank, (score, neighbor_id) in enumerate(rows_by_book[book_id], start=1)
+            )
+
+
+def _loan_pairs(queryset):
+    return queryset.values_list('student_id', 'book_id').distinct().order_by().iterator(chunk_size=5000)
+
+
+def build_all():
+    """Recompute neighbours for every borrowed book. Returns the number of books."""
+    book_students, student_books = posting_lists(_loan_pairs(BorrowRecord.objects.all()))
+    readers = {book_id: len(students) for book_id, students in book_students.items()}
+    rows = {
+        book_id: top_neighbors(book_id, book_students, student_books, readers)
+        for book_id in book_students
+    }
+    BookNeighbor.objects.filter(kind=BookNeighbor.KIND_BORROWED).exclude(
+        book_id__in=BorrowRecord.objects.values('book_id')
+    ).delete()
+    store_neighbors(BookNeighbor.KIND_BORROWED, rows)
+    return len(rows)
+
+
+def refresh_books(book_ids):
+    """Recompute neighbours for ``book_ids`` only. Returns the number of books."""
+    book_ids = set(book_ids)
+    if not book_ids:
+        return 0
+    students = BorrowRecord.objects.filter(book_id__in=book_ids).values('student_id')
+    book_students, student_books = posting_lists(
+        _loan_pairs(BorrowRecord.objects.filter(student_id__in=students))
+    )
+    candidates = set().union(*student_books.values()) if student_books else set()
+    readers = dict(
+        BorrowRecord.objects.filter(book_id__in=candidates).values('book_id')
+        .annotate(n=Count('student_id', distinct=True)).values_list('book_id', 'n').order_by()
+    )
+    store_neighbors(BookNeighbor.KIND_BORROWED, {
+        book_id: top_neighbors(book_id, book_students, student_books, readers)
+        for book_id in book_ids
+    })
+    return len(book_ids)
+
+
+def books_affected_since(since):
+    """Books whose co-occurrence row changed because of loans made on or after ``since``."""
+    students = BorrowRecord.objects.filter(borrow_date__gte=since).values('student_id')
+    return set(
+        BorrowRecord.objects.filter(student_id__in=students)
+        .values_list('book_id', flat=True).distinct().order_by()
+    )
+
+
+def neighbor_rows(book, kind, k=TOP_K):
+    return BookNeighbor.objects.filter(book=book, kind=kind, rank__lte=k).select_related('neighbor__author')
+
+
+def neighbors(book, kind, k=TOP_K):
+    return [row.neighbor for row in neighbor_rows(book, kind, k)]
+
+
+def readers_also_borrowed(book, k=TOP_K):
+    return neighbors(book, BookNeighbor.KIND_BORROWED, k)
+
+
+def similar_books(book, k=TOP_K):
+    return neighbors(book, BookNeighbor.KIND_SIMILAR, k)
+
+
+def author_neighbor_rows(author, k=TOP_K):
+    """The best-scored similar-book rows for :func:`similar_to_author`, with room for duplicates."""
+    return (
+        BookNeighbor.objects.filter(book__author=author, kind=BookNeighbor.KIND_SIMILAR)
+        .exclude(neighbor__author=author)
+        .select_related('neighbor__author', 'neighbor__category')
+        .order_by('-score')[:k * 4]
+    )
+
+
+def similar_to_author(author, k=TOP_K):
+    """Books by other authors that are most similar to any of ``author``'s books."""
+    books = {}
+    for row in author_neighbor_rows(author, k):
+        books.setdefault(row.neighbor_id, row.neighbor)
+    return list(books.values())[:k]
@@ -0,0 +1,97 @@
+"""
+Per-process LRU cache of book_list result pages.
+
+An entry holds only the ordered ids of one page plus the paging numbers,
+keyed on the catalog version and the normalized request parameters; the
+page itself is hydrated with a single ``in_bulk``. Book, Author, Category
+and Review writes in any process bump the shared catalog version (see
+``books.catalog``), so entries of older versions are never hit again and
+age out of the LRU. Keeping them keyed rather than clearing on a version
+change means requests that read the version from different databases (a
+lagging replica and the primary) do not empty each other's entries. Size
+is bounded by ``BOOK_LIST_RESULT_CACHE_SIZE`` entries.
+"""
+
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+from .catalog import catalog_version
+from .facets import normalize_query
+
+
+class ResultCache:
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, key, version):
+        with self.lock:
+            entry = self.entries.get((version, key))
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end((version, key))
+            self.hits += 1
+            return entry
+
+    def set(self, key, version, entry):
+        with self.lock:
+            self.entries[version, key] = entry
+            self.entries.move_to_end((version, key))
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else None,
+        }
+
+
+results = ResultCache(settings.BOOK_LIST_RESULT_CACHE_SIZE)
+
+
+def result_key(query, **params):
+    return (normalize_query(query),) + tuple(sorted(params.items()))
+
+
+def lookup(key, using=None):
+    """
+    Return ``(entry, version)`` for the catalog as ``using`` sees it; ``entry``
+    is None on a miss, and the page to store must then be read from ``using``.
+    """
+    version = catalog_version(using)
+    return results.get(key, version), version
+
+
+def store(key, version, entry):
+    results.set(key, version, entry)
+
+
+def hydrate(queryset, ids):
+    """
+    Objects for ``ids`` in that order, fetched with one query. Ids the
+    (possibly lagging) read replica does not have yet come from the primary.
+    """
+    objects = queryset.in_bulk(ids)
+    missing = [pk for pk in ids if pk not in objects]
+    if missing and queryset.db != DEFAULT_DB_ALIAS:
+        objects |= queryset.using(DEFAULT_DB_ALIAS).in_bulk(missing)
+    return [objects[pk] for pk in ids if pk in objects]
@@ -0,0 +1,111 @@
+"""
+Full-text search index for the book catalog.
+
+Book title, description, author name and category name are mirrored into an
+SQLite FTS5 table (``books_book_fts``) keyed by the book's primary key. Rows
+are kept in sync from the Book/Author/Category signals in ``books.signals``
+and can be rebuilt from scratch with ``manage.py rebuild_search_index``.
+
+On databases without FTS5 the index is disabled and callers fall back to the
+plain ``icontains`` filter.
+"""
+
+import re
+
+from django.db import connection
+
+FTS_TABLE = 'books_book_fts'
+
+# bm25() weights, in column order: title, description, author, category
+BM25_WEIGHTS = (10.0, 1.0, 5.0, 2.0)
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+CREATE_SQL = (
+    f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5('
+    'title, description, author, category, '
+    "tokenize = 'unicode61 remove_diacritics 2')"
+)
+DROP_SQL = f'DROP TABLE IF EXISTS {FTS_TABLE}'
+
+
+def is_enabled():
+    return connection.vendor == 'sqlite'
+
+
+def build_match_query(query):
+    """Turn free text into an FTS5 MATCH expression (all terms, prefix match)."""
+    tokens = TOKEN_RE.findall(query.lower())
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def _row(book):
+    return (
+        book.pk,
+        book.title,
+        book.description,
+        book.author.name if book.author else '',
+        book.category.name if book.category else '',
+    )
+
+
+def index_books(books):
+    """Insert or refresh the index rows for an iterable of books."""
+    if not is_enabled():
+        return
+    rows = [_row(book) for book in books]
+    if not rows:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [(row[0],) for row in rows])
+        cursor.executemany(
+            f'INSERT INTO {FTS_TABLE} (rowid, title, description, author, category) '
+            'VALUES (%s, %s, %s, %s, %s)',
+            rows,
+        )
+
+
+def index_book_ids(book_ids):
+    from .models import Book
+
+    book_ids = list(book_ids)
+    if not book_ids or not is_enabled():
+        return
+    index_books(Book.objects.filter(pk__in=book_ids).select_related('author', 'category'))
+
+
+def remove_book(book_id):
+    if not is_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [book_id])
+
+
+def clear():
+    """Empty the index, creating the table first if it is missing."""
+    if not is_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(CREATE_SQL)
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+
+
+def filter_books(books, query):
+    """
+    Restrict a Book queryset to the books matching ``query``.
+
+    The index is joined in SQL rather than turned into a list of ids, so
+    later filters, counts and sorts see every match. Each book gets a
+    ``search_rank`` (bm25, lower is better) to order by.
+    """
+    match = build_match_query(query)
+    if not match:
+        return books.none()
+    table = books.model._meta.db_table
+    weights = ', '.join(str(w) for w in BM25_WEIGHTS)
+    return books.extra(
+        select={'search_rank': f'bm25({FTS_TABLE}, {weights})'},
+        tables=[FTS_TABLE],
+        where=[f'{FTS_TABLE}.rowid = {table}.id', f'{FTS_TABLE} MATCH %s'],
+        params=[match],
+    )
@@ -0,0 +1,182 @@
+from django.contrib.auth.models import User
+from django.core.signals import request_finished, request_started
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from borrowing.models import BorrowRecord
+from . import catalog, dashboard, detail_cache, search
+from .models import Author, Book, Category
+
+
+# ── Full-text index sync ──────────────────────────────────────────────────────
+
+@receiver(post_save, sender=Book)
+def index_book(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_books([instance])
+
+
+@receiver(post_delete, sender=Book)
+def unindex_book(sender, instance, **kwargs):
+    search.remove_book(instance.pk)
+
+
+@receiver(post_save, sender=Author)
+@receiver(post_save, sender=Category)
+def reindex_related_books(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_book_ids(instance.books.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Author)
+@receiver(post_save, sender=Category)
+def touch_related_books(sender, instance, created, raw=False, **kwargs):
+    # Book text vectors include author and category names.
+    if not created and not raw:
+        instance.books.update(updated_at=timezone.now())
+
+
+@receiver(pre_delete, sender=Author)
+@receiver(pre_delete, sender=Category)
+def remember_related_books(sender, instance, **kwargs):
+    instance._indexed_book_ids = list(instance.books.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Author)
+@receiver(post_delete, sender=Category)
+def reindex_orphaned_books(sender, instance, **kwargs):
+    search.index_book_ids(getattr(instance, '_indexed_book_ids', ()))
+
+
+# ── Catalog version ───────────────────────────────────────────────────────────
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+@receiver(post_save, sender=Author)
+@receiver(post_delete, sender=Author)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender='reviews.Review')
+@receiver(post_delete, sender='reviews.Review')
+def catalog_changed(sender, raw=False, **kwargs):
+    if not raw:
+        catalog.bump_catalog_version()
+
+
+# Book titles and author names feed the in-process autocomplete and fuzzy indexes.
+NAME_FIELDS = {Book: ('title', 'author_id'), Author: ('name',)}
+
+
+@receiver(pre_save, sender=Book)
+@receiver(pre_save, sender=Author)
+def remember_names(sender, instance, raw=False, **kwargs):
+    instance._previous_names = None
+    if instance.pk and not raw:
+        instance._previous_names = sender.objects.filter(pk=instance.pk).values_list(*NAME_FIELDS[sender]).first()
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_save, sender=Author)
+def names_saved(sender, instance, raw=False, **kwargs):
+    current = tuple(getattr(instance, field) for field in NAME_FIELDS[sender])
+    if not raw and current != getattr(instance, '_previous_names', None):
+        catalog.bump_names_version()
+
+
+@receiver(post_delete, sender=Book)
+@receiver(post_delete, sender=Author)
+def names_deleted(sender, **kwargs):
+    catalog.bump_names_version()
+
+
+@receiver(request_started)
+def start_catalog_request(sender, **kwargs):
+    catalog.start_request()
+
+
+@receiver(request_finished)
+def finish_catalog_request(sender, **kwargs):
+    catalog.finish_request()
+
+
+# ── Book detail cache ─────────────────────────────────────────────────────────
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def drop_book_detail(sender, instance, **kwargs):
+    detail_cache.invalidate(instance.pk)
+
+
+@receiver(post_save, sender=Author)
+@receiver(post_save, sender=Category)
+def drop_related_book_details(sender, instance, raw=False, **kwargs):
+    if not raw:
+        detail_cache.invalidate(*instance.books.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Author)
+@receiver(post_delete, sender=Category)
+def drop_orphaned_book_details(sender, instance, **kwargs):
+    detail_cache.invalidate(*getattr(instance, '_indexed_book_ids', ()))
+
+
+@receiver(post_save, sender='reviews.Review')
+@receiver(post_delete, sender='reviews.Review')
+def drop_reviewed_book_detail(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_rating', None)
+    detail_cache.invalidate(instance.book_id, *(previous[:1] if previous else ()))
+
+
+# ── Author and category counters ──────────────────────────────────────────────
+
+@receiver(pre_save, sender=Book)
+def remember_listing(sender, instance, raw=False, **kwargs):
+    instance._previous_listing = None
+    if instance.pk and not raw:
+        instance._previous_listing = (
+            Book.objects.filter(pk=instance.pk)
+            .values_list('author_id', 'category_id', 'available_copies').first()
+        )
+
+
+@receiver(post_save, sender=Book)
+def count_book(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    available = int(instance.available_copies > 0)
+    previous = getattr(instance, '_previous_listing', None)
+    if previous is None:
+        Book.adjust_book_counts(instance.author_id, instance.category_id, books=1, available=available)
+        return
+    old_author_id, old_category_id, old_copies = previous
+    old_available = int(old_copies > 0)
+    for old_id, new_id, key in (
+        (old_author_id, instance.author_id, 'author_id'),
+        (old_category_id, instance.category_id, 'category_id'),
+    ):
+        if old_id != new_id:
+            Book.adjust_book_counts(**{key: old_id}, books=-1, available=-old_available)
+            Book.adjust_book_counts(**{key: new_id}, books=1, available=available)
+        elif old_available != available:
+            Book.adjust_book_counts(**{key: new_id}, available=available - old_available)
+
+
+@receiver(post_delete, sender=Book)
+def uncount_book(sender, instance, **kwargs):
+    Book.adjust_book_counts(
+        instance.author_id, instance.category_id,
+        books=-1, available=-int(instance.available_copies > 0),
+    )
+
+
+# ── Dashboard leaderboards ────────────────────────────────────────────────────
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+@receiver(post_save, sender=BorrowRecord)
+@receiver(post_delete, sender=BorrowRecord)
+def invalidate_leaderboards(sender, **kwargs):
+    dashboard.mark_stale()
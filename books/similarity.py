@@ -0,0 +1,204 @@
+"""
+Content-based "similar books" from TF-IDF vectors.
+
+Each book's title (weighted double), author, category and description are
+tokenized into term frequencies, stored in BookVector. At build time the
+stored frequencies are turned into L2-normalised TF-IDF vectors
+(``(1 + log tf) * idf``). BookVector is read once per run; the weighted
+vectors and an inverted index over them (term -> book, weight) stay in
+memory, and each book's cosine neighbours are scored from the postings of
+its own terms. Results are stored ``BLOCK_SIZE`` books at a time.
+
+Terms that appear in more than ``MAX_DF_RATIO`` of the catalog carry almost
+no signal and would make every posting list huge, so they are dropped; a
+term is always kept while it appears in at most ``MIN_DF_CUTOFF`` books, so
+small catalogs keep their shared terms.
+
+Incremental mode re-tokenizes only books whose ``updated_at`` is newer than
+the start of the last run, then recomputes neighbours for those books and
+for their reverse neighbours (see ``reverse_neighbors``). Other books keep
+lists scored with the idf of an earlier run, which drifts as the catalog
+grows; schedule a full build (no ``--incremental``) periodically, e.g.
+nightly, to re-score everything.
+"""
+
+import heapq
+import math
+import re
+from collections import Counter, defaultdict
+
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import Book, BookNeighbor, BookVector
+from .recommendations import TOP_K, store_neighbors
+
+BLOCK_SIZE = 256
+READ_CHUNK_SIZE = 2000
+MAX_DF_RATIO = 0.5
+MIN_DF_CUTOFF = 10
+MIN_SCORE = 0.05
+
+TOKEN_RE = re.compile(r'[^\W\d_]{2,}', re.UNICODE)
+STOP_WORDS = frozenset('''
+    a an and are as at be been but by for from has have he her his in into is it its
+    of on or our she so than that the their them then there these they this to was we
+    were what when which who will with you your about after all also more most not one
+    only other over such up out how its can
+'''.split())
+
+
+def tokenize(text):
+    return [token for token in TOKEN_RE.findall(text.lower()) if token not in STOP_WORDS]
+
+
+def term_frequencies(title, description, author_name, category_name):
+    terms = Counter(tokenize(title))
+    for token in list(terms):
+        terms[token] *= 2
+    terms.update(tokenize(author_name or ''))
+    terms.update(tokenize(category_name or ''))
+    terms.update(tokenize(description or ''))
+    return dict(terms)
+
+
+def vectorize_books(books):
+    """Store fresh term frequencies for ``books`` (a Book queryset)."""
+    now = timezone.now()
+    count = 0
+    rows = books.values_list('pk', 'title', 'description', 'author__name', 'category__name')
+    batch = []
+    for pk, title, description, author_name, category_name in rows.iterator(chunk_size=READ_CHUNK_SIZE):
+        batch.append(BookVector(
+            book_id=pk,
+            terms=term_frequencies(title, description, author_name, category_name),
+            computed_at=now,
+        ))
+        if len(batch) >= READ_CHUNK_SIZE:
+            count += _save_vectors(batch)
+            batch = []
+    return count + _save_vectors(batch)
+
+
+def _save_vectors(batch):
+    if batch:
+        BookVector.objects.bulk_create(
+            batch, update_conflicts=True, unique_fields=['book'], update_fields=['terms', 'computed_at'],
+        )
+    return len(batch)
+
+
+def load_catalog():
+    """Weighted vectors for every stored book, plus postings (term -> [(book_id, weight)])."""
+    stored = dict(
+        BookVector.objects.values_list('book_id', 'terms').order_by().iterator(chunk_size=READ_CHUNK_SIZE)
+    )
+    idf = idf_table(stored.values())
+    vectors = {book_id: weigh(terms, idf) for book_id, terms in stored.items()}
+    postings = defaultdict(list)
+    for book_id, vector in vectors.items():
+        for term, weight in vector.items():
+            postings[term].append((book_id, weight))
+    return vectors, postings
+
+
+def idf_table(stored_terms):
+    """Inverse document frequencies of the terms worth keeping."""
+    total = 0
+    df = Counter()
+    for terms in stored_terms:
+        total += 1
+        df.update(terms.keys())
+    max_df = max(MIN_DF_CUTOFF, int(total * MAX_DF_RATIO))
+    return {
+        term: math.log((1 + total) / (1 + count)) + 1
+        for term, count in df.items()
+        if count <= max_df
+    }
+
+
+def weigh(terms, idf):
+    """L2-normalised TF-IDF vector for one book's term frequencies (empty if none are kept)."""
+    weights = {term: (1 + math.log(tf)) * idf[term] for term, tf in terms.items() if term in idf}
+    norm = math.sqrt(sum(w * w for w in weights.values()))
+    if not norm:
+        return {}
+    return {term: w / norm for term, w in weights.items()}
+
+
+def scores_for(book_id, vectors, postings):
+    """``{other_id: cosine}`` for every book sharing a kept term with ``book_id``."""
+    scores = defaultdict(float)
+    for term, weight in vectors.get(book_id, {}).items():
+        for other, other_weight in postings[term]:
+            if other != book_id:
+                scores[other] += weight * other_weight
+    return scores
+
+
+def best_neighbors(scores, k=TOP_K):
+    return [
+        (score, -negated) for score, negated in heapq.nlargest(
+            k, ((score, -other) for other, score in scores.items() if score >= MIN_SCORE),
+        )
+    ]
+
+
+def compute_neighbors(book_ids, vectors, postings, computed_at):
+    """Compute and store neighbours for ``book_ids``, one block at a time."""
+    book_ids = sorted(book_ids)
+    for start in range(0, len(book_ids), BLOCK_SIZE):
+        store_neighbors(BookNeighbor.KIND_SIMILAR, {
+            book_id: best_neighbors(scores_for(book_id, vectors, postings))
+            for book_id in book_ids[start:start + BLOCK_SIZE]
+        }, computed_at=computed_at)
+    return len(book_ids)
+
+
+def reverse_neighbors(changed_ids, vectors, postings):
+    """
+    Unchanged books whose stored list may gain, lose or re-score a changed
+    book: those that list one now, and those that would rank one above their
+    weakest stored neighbour (cosine is symmetric, so scoring the changed
+    books finds them).
+    """
+    stored = BookNeighbor.objects.filter(kind=BookNeighbor.KIND_SIMILAR).values_list(
+        'book_id', 'neighbor_id', 'score',
+    ).order_by()
+    affected, listed, weakest = set(), Counter(), {}
+    for book_id, neighbor_id, score in stored.iterator(chunk_size=READ_CHUNK_SIZE):
+        listed[book_id] += 1
+        weakest[book_id] = min(score, weakest.get(book_id, score))
+        if neighbor_id in changed_ids:
+            affected.add(book_id)
+    for book_id in changed_ids:
+        for other, score in scores_for(book_id, vectors, postings).items():
+            if score >= MIN_SCORE and (listed[other] < TOP_K or score > weakest[other]):
+                affected.add(other)
+    return affected - set(changed_ids)
+
+
+def last_run():
+    """Start time of the last run that stored similar books."""
+    return BookNeighbor.objects.filter(kind=BookNeighbor.KIND_SIMILAR).aggregate(
+        last=Max('computed_at')
+    )['last']
+
+
+def build(incremental=False):
+    """Vectorize and compute similar books. Returns (vectorized, computed) counts."""
+    started = timezone.now()
+    since = last_run() if incremental else None
+    if since is None:
+        changed = Book.objects.all()
+    else:
+        changed = Book.objects.filter(updated_at__gt=since)
+    vectorized = vectorize_books(changed)
+
+    vectors, postings = load_catalog()
+    if since is None:
+        targets = set(vectors)
+    else:
+        changed_ids = set(changed.values_list('pk', flat=True))
+        targets = changed_ids | reverse_neighbors(changed_ids, vectors, postings)
+    return vectorized, compute_neighbors(targets, vectors, postings, started)
@@ -0,0 +1,73 @@
+import datetime
+
+from django import template
+from django.utils import formats
+from django.utils.text import capfirst
+from django.utils.translation import gettext as _
+
+register = template.Library()
+
+
+@register.inclusion_tag('admin/date_hierarchy.html')
+def bucket_date_hierarchy(cl):
+    """``date_hierarchy`` drill-down built from ``model_admin.bucket_dates()``."""
+    field_name = cl.date_hierarchy
+    year_field = f'{field_name}__year'
+    month_field = f'{field_name}__month'
+    day_field = f'{field_name}__day'
+    year = cl.params.get(year_field)
+    month = cl.params.get(month_field)
+    day = cl.params.get(day_field)
+    dates = cl.model_admin.bucket_dates()
+
+    def link(filters):
+        return cl.get_query_string(filters, [f'{field_name}__'])
+
+    if not (year or month or day) and dates:
+        if dates[0].year == dates[-1].year:
+            year = dates[0].year
+            if dates[0].month == dates[-1].month:
+                month = dates[0].month
+
+    if year and month and day:
+        selected = datetime.date(int(year), int(month), int(day))
+        return {
+            'show': True,
+            'back': {
+                'link': link({year_field: year, month_field: month}),
+                'title': capfirst(formats.date_format(selected, 'YEAR_MONTH_FORMAT')),
+            },
+            'choices': [{'title': capfirst(formats.date_format(selected, 'MONTH_DAY_FORMAT'))}],
+        }
+    if year and month:
+        days = [d for d in dates if d.year == int(year) and d.month == int(month)]
+        return {
+            'show': True,
+            'back': {'link': link({year_field: year}), 'title': str(year)},
+            'choices': [
+                {
+                    'link': link({year_field: year, month_field: month, day_field: d.day}),
+                    'title': capfirst(formats.date_format(d, 'MONTH_DAY_FORMAT')),
+                }
+                for d in days
+            ],
+        }
+    if year:
+        months = sorted({d.replace(day=1) for d in dates if d.year == int(year)})
+        return {
+            'show': True,
+            'back': {'link': link({}), 'title': _('All dates')},
+            'choices': [
+                {
+                    'link': link({year_field: year, month_field: m.month}),
+                    'title': capfirst(formats.date_format(m, 'YEAR_MONTH_FORMAT')),
+                }
+                for m in months
+            ],
+        }
+    years = sorted({d.year for d in dates})
+    return {
+        'show': True,
+        'back': None,
+        'choices': [{'link': link({year_field: str(y)}), 'title': str(y)} for y in years],
+    }
@@ -1,3 +1,885 @@
-from django.test import TestCase
+import random
+import re
 
-# Create your tests here.
+from io import StringIO
+
+from datetime import datetime, timedelta
+from unittest import mock
+
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.http import QueryDict
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import StudentProfile
+from borrowing import services
+from borrowing.models import BorrowRecord
+from reviews.models import Review
+from . import (
+    autocomplete, catalog, dashboard, detail_cache, facets, fuzzy, recommendations, result_cache, search, similarity,
+    views,
+)
+from .fuzzy import MAX_WORD_MATCHES, TrigramIndex, trigrams
+from .admin_tools import EstimatedCountPaginator
+from .management.commands.queryplan_audit import FULL_SCAN, TEMP_SORT, plan_issues
+from .forms import AuthorForm, CategoryForm
+from .pagination import KeysetPaginator, encode_cursor
+from .models import Author, Book, BookNeighbor, CatalogVersion, Category
+
+SYLLABLES = ['ka', 'lo', 'mir', 'ten', 'dra', 'vos', 'pel', 'an', 'gor', 'shi', 'ru', 'bel', 'tov', 'ska', 'ne']
+
+
+def make_word(rng):
+    return ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+
+
+class FullTextSearchTests(TestCase):
+    def test_title_matches_rank_above_description_matches(self):
+        author = Author.objects.create(name='Frank Herbert')
+        mention = Book.objects.create(title='Essays', description='On reading Dune.')
+        dune = Book.objects.create(title='Dune', author=author)
+        response = self.client.get(reverse('book_list'), {'q': 'dune'})
+        self.assertEqual(list(response.context['books']), [dune, mention])
+
+    def test_filters_and_totals_see_every_match(self):
+        popular = Category.objects.create(name='Popular')
+        rare = Category.objects.create(name='Rare')
+        books = Book.objects.bulk_create(
+            Book(title=f'Dune {i}', isbn=str(i), category=popular) for i in range(1100)
+        )
+        books.append(Book.objects.create(title='Notes', description='dune', category=rare))
+        search.index_books(Book.objects.filter(pk__in=[book.pk for book in books]).select_related('category'))
+
+        response = self.client.get(reverse('book_list'), {'q': 'dune', 'category': rare.pk})
+        self.assertEqual(response.context['total_count'], 1)
+        self.assertEqual(list(response.context['books']), [books[-1]])
+        response = self.client.get(reverse('book_list'), {'q': 'dune', 'sort': 'oldest'})
+        self.assertEqual(response.context['total_count'], 1101)
+        counts = {category.pk: category.result_count for category in response.context['categories']}
+        self.assertEqual(counts, {popular.pk: 1100, rare.pk: 1})
+
+    def test_query_without_words_matches_nothing(self):
+        Book.objects.create(title='Dune')
+        for query in ('-', '!!!', '?', '"'):
+            response = self.client.get(reverse('book_list'), {'q': query})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(list(response.context['books']), [])
+
+    def test_rebuild_recreates_a_missing_index(self):
+        dune = Book.objects.create(title='Dune')
+        with connection.cursor() as cursor:
+            cursor.execute(search.DROP_SQL)
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(list(search.filter_books(Book.objects.all(), 'dune')), [dune])
+
+    def test_failed_rebuild_keeps_the_old_index(self):
+        dune = Book.objects.create(title='Dune')
+        Book.objects.create(title='Emma')
+        with mock.patch.object(search, 'index_books', side_effect=[None, RuntimeError]):
+            with self.assertRaises(RuntimeError):
+                call_command('rebuild_search_index', batch_size=1, stdout=StringIO())
+        self.assertEqual(list(search.filter_books(Book.objects.all(), 'dune')), [dune])
+
+
+class FacetCountTests(TestCase):
+    def setUp(self):
+        herbert = Author.objects.create(name='Frank Herbert')
+        self.fiction = Category.objects.create(name='Fiction')
+        self.essays = Category.objects.create(name='Essays')
+        for title, category, language in [
+            ('Dune', self.fiction, 'English'),
+            ('Dune Messiah', self.fiction, 'French'),
+            ('Children of Dune', self.fiction, 'French'),
+            ('Dune Essays', self.essays, 'English'),
+            ('Emma', self.fiction, 'English'),
+        ]:
+            Book.objects.create(title=title, author=herbert, category=category, language=language)
+
+    def facets(self, **params):
+        response = self.client.get(reverse('book_list'), {'q': 'dune', **params})
+        categories = {category.pk: category.result_count for category in response.context['categories']}
+        return categories, response.context['languages'], response.context['total_count']
+
+    def test_each_facet_honours_the_other_facets_filter(self):
+        self.assertEqual(self.facets(), (
+            {self.fiction.pk: 3, self.essays.pk: 1}, [('English', 2), ('French', 2)], 4,
+        ))
+        self.assertEqual(self.facets(language='French'), (
+            {self.fiction.pk: 2, self.essays.pk: 0}, [('English', 2), ('French', 2)], 2,
+        ))
+        self.assertEqual(self.facets(category=self.essays.pk), (
+            {self.fiction.pk: 3, self.essays.pk: 1}, [('English', 1)], 1,
+        ))
+        self.assertEqual(self.facets(category=self.essays.pk, language='French'), (
+            {self.fiction.pk: 2, self.essays.pk: 0}, [('English', 1), ('French', 0)], 0,
+        ))
+
+    def test_grid_is_grouped_once_per_query(self):
+        grid = facets.facet_grid('Dune', 'text', lambda: Book.objects.filter(title__icontains='dune'))
+        self.assertEqual(sorted(grid), sorted([
+            (self.fiction.pk, 'English', 1), (self.fiction.pk, 'French', 2), (self.essays.pk, 'English', 1),
+        ]))
+        with self.assertNumQueries(1):  # the catalog version only
+            self.assertEqual(facets.facet_grid(' dune ', 'text', Book.objects.none), grid)
+
+
+class CatalogVersionTests(TestCase):
+    def write_in_another_worker(self, book, title):
+        # Another process shares only the database: no signals or cache entries reach this one.
+        Book.objects.filter(pk=book.pk).update(title=title)
+        CatalogVersion.objects.update(version=F('version') + 1)
+
+    def test_write_elsewhere_invalidates_cached_facets(self):
+        book = Book.objects.create(title='Dune')
+
+        def grid():
+            return facets.facet_grid('', 'text', lambda: Book.objects.filter(title__startswith='Dune'))
+
+        self.assertEqual(grid(), [(None, 'English', 1)])
+        self.write_in_another_worker(book, 'Emma')
+        self.assertEqual(grid(), [])
+
+    def test_catalog_writes_bump_the_version(self):
+        before = catalog.catalog_version()
+        Author.objects.create(name='Jane Austen')
+        self.assertGreater(catalog.catalog_version(), before)
+
+    def test_version_is_read_once_per_request(self):
+        catalog.start_request()
+        try:
+            with self.assertNumQueries(1):
+                self.assertEqual(catalog.catalog_version(), catalog.catalog_version())
+            Category.objects.create(name='Classics')
+            with self.assertNumQueries(1):
+                catalog.catalog_version()
+        finally:
+            catalog.finish_request()
+
+
+class ResultCacheTests(TestCase):
+    def setUp(self):
+        result_cache.results.clear()
+        self.dune = Book.objects.create(title='Dune')
+
+    def titles(self):
+        return [book.title for book in self.client.get(reverse('book_list'), {'sort': 'oldest'}).context['books']]
+
+    def test_write_in_another_worker_invalidates_cached_pages(self):
+        self.assertEqual(self.titles(), ['Dune'])
+        hits = result_cache.results.hits
+        self.assertEqual(self.titles(), ['Dune'])
+        self.assertEqual(result_cache.results.hits, hits + 1)
+
+        # Another process: only the database is shared, no signal reaches this one.
+        Book.objects.filter(pk=self.dune.pk).update(title='Dune Messiah')
+        Book.objects.bulk_create([Book(title='Children of Dune')])
+        CatalogVersion.objects.update(version=F('version') + 1)
+        self.assertEqual(self.titles(), ['Dune Messiah', 'Children of Dune'])
+
+    def test_versions_read_from_different_databases_keep_their_entries(self):
+        cache = result_cache.ResultCache(max_entries=3)
+        key = result_cache.result_key('Dune', page='')
+        cache.set(key, 7, {'ids': [1]})
+        cache.set(key, 8, {'ids': [1, 2]})
+        self.assertEqual(cache.get(key, 7), {'ids': [1]})
+        self.assertEqual(cache.get(key, 8), {'ids': [1, 2]})
+        self.assertIsNone(cache.get(key, 9))
+
+        for page in range(3):
+            cache.set(result_cache.result_key('Dune', page=str(page)), 9, {'ids': []})
+        self.assertIsNone(cache.get(key, 7))
+        self.assertEqual(cache.stats()['evictions'], 2)
+
+
+class DashboardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.books = [
+            Book.objects.create(title=title, total_copies=2, available_copies=2) for title in ('Dune', 'Emma')
+        ]
+        self.readers = [User.objects.create_user(f'reader{i}') for i in range(2)]
+        services.borrow_book(self.readers[0], self.books[0])
+        self.client.force_login(User.objects.create_user('librarian', is_staff=True))
+
+    def dashboard(self, **params):
+        return self.client.get(reverse('dashboard'), params).context
+
+    def borrow(self, reader, book):
+        with self.captureOnCommitCallbacks(execute=True):
+            services.borrow_book(reader, book)
+
+    def test_counters(self):
+        BorrowRecord.objects.update(due_date=timezone.now().date() - timedelta(days=1))
+        context = self.dashboard()
+        counts = ('total_books', 'total_students', 'active_borrowings', 'overdue_borrowings')
+        self.assertEqual([context[name] for name in counts], [2, 2, 1, 1])
+
+    def test_cached_leaderboards_cost_no_queries(self):
+        built, hit = dashboard.get_leaderboards()
+        self.assertFalse(hit)
+        with self.assertNumQueries(0):
+            cached, hit = dashboard.get_leaderboards()
+        self.assertTrue(hit)
+        self.assertEqual(cached['top_books'], built['top_books'])
+
+    def test_writes_rebuild_only_after_the_staleness_window(self):
+        self.assertEqual(dashboard.get_leaderboards()[0]['top_books'][0], self.books[0])
+        for reader in self.readers:
+            self.borrow(reader, self.books[1])
+        leaderboards, hit = dashboard.get_leaderboards()
+        self.assertTrue(hit)
+        self.assertEqual(leaderboards['top_books'][0], self.books[0])
+
+        with override_settings(DASHBOARD_STALENESS_SECONDS=0):
+            leaderboards, hit = dashboard.get_leaderboards()
+            self.assertFalse(hit)
+            self.assertEqual(leaderboards['top_books'][0], self.books[1])
+            self.assertTrue(dashboard.get_leaderboards()[1])  # nothing changed since
+
+    def test_refresh_now_rebuilds(self):
+        self.assertFalse(self.dashboard()['leaderboards_hit'])
+        self.assertTrue(self.dashboard()['leaderboards_hit'])
+        self.assertFalse(self.dashboard(refresh='1')['leaderboards_hit'])
+
+    def test_timings_and_cache_counters(self):
+        self.dashboard()
+        response = self.client.get(reverse('dashboard'))
+        self.assertContains(response, 'cache hit,')
+        context = response.context
+        self.assertEqual(set(context['timings']), {'counters', 'leaderboards', 'recent'})
+        self.assertTrue(all(ms >= 0 for ms in context['timings'].values()))
+        self.assertEqual(context['result_cache'], result_cache.results.stats())
+
+    def test_students_cannot_open_the_dashboard(self):
+        self.client.force_login(self.readers[0])
+        self.assertEqual(self.client.get(reverse('dashboard')).status_code, 302)
+
+
+class AutocompleteTests(TestCase):
+    def setUp(self):
+        autocomplete.index.clear()
+        self.dune = Book.objects.create(title='Dune')
+
+    def labels(self, query):
+        return [entry['label'] for entry in autocomplete.suggest(query)]
+
+    def test_loaded_index_answers_without_queries(self):
+        self.assertEqual(self.labels('dun'), ['Dune'])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.labels('du'), ['Dune'])
+
+    def test_rename_is_picked_up_by_the_next_refresh(self):
+        self.assertEqual(self.labels('dun'), ['Dune'])
+        self.dune.title = 'Emma'
+        self.dune.save()
+        self.assertEqual(self.labels('dun'), ['Dune'])  # until the next check
+        autocomplete.index.refresh()
+        self.assertEqual((self.labels('dun'), self.labels('emm')), ([], ['Emma']))
+
+    def test_other_catalog_writes_keep_the_index(self):
+        autocomplete.suggest('dun')
+        version = catalog.names_version()
+        self.dune.description = 'Spice.'
+        self.dune.save()
+        Review.objects.create(student=User.objects.create_user('reader'), book=self.dune, rating=5)
+        Category.objects.create(name='Classics')
+        self.assertEqual(catalog.names_version(), version)
+        with mock.patch.object(autocomplete.index, 'build') as build:
+            autocomplete.index.refresh()
+        build.assert_not_called()
+
+    def test_checks_run_in_the_background(self):
+        autocomplete.suggest('dun')
+        with override_settings(SEARCH_INDEX_CHECK_SECONDS=0), mock.patch.object(catalog.threading, 'Thread') as thread:
+            with self.assertNumQueries(0):
+                autocomplete.suggest('dun')
+                autocomplete.suggest('dun')
+        thread.assert_called_once_with(target=autocomplete.index._refresh_in_background, daemon=True)
+        autocomplete.index.clear()
+
+    def test_popular_match_past_the_scan_limit_is_found(self):
+        entries = [(f'Dune {i:02d}', 'book', f'/books/{i}/', 0) for i in range(30)]
+        entries.append(('Dune Zenith', 'book', '/books/99/', 50))
+        with mock.patch.object(autocomplete, 'MAX_SCAN', 5):
+            index = autocomplete.PrefixIndex(entries)
+            for query in ('dun', 'dune', 'dune z'):
+                with self.subTest(query=query):
+                    self.assertEqual(index.search(query)[0]['label'], 'Dune Zenith')
+            self.assertEqual(len(index.search('dune 1', limit=20)), 10)
+
+    def test_word_starts_match(self):
+        index = autocomplete.PrefixIndex([
+            ('Harry Potter', 'book', '/books/1/', 3), ('Pottery', 'book', '/books/2/', 1),
+        ])
+        self.assertEqual([entry['label'] for entry in index.search('pot')], ['Harry Potter', 'Pottery'])
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.books = [Book.objects.create(title=f'Book {i}') for i in range(11)]
+        # Equal sort keys everywhere, so only the trailing pk tells rows apart.
+        Book.objects.update(created_at=timezone.now())
+        self.paginator = KeysetPaginator(Book.objects.all(), ('-created_at', '-id'), 3)
+
+    def test_cursors_walk_every_row_once_in_both_directions(self):
+        expected = list(Book.objects.order_by('-created_at', '-id'))
+        pages = [self.paginator.page()]
+        while pages[-1].has_next():
+            pages.append(self.paginator.page(pages[-1].next_cursor))
+        self.assertEqual([book for page in pages for book in page], expected)
+        self.assertEqual([len(page) for page in pages], [3, 3, 3, 2])
+
+        back = [pages[-1]]
+        while back[-1].has_previous():
+            back.append(self.paginator.page(back[-1].previous_cursor))
+        self.assertEqual([list(page) for page in back[1:]], [list(page) for page in pages[-2::-1]])
+
+    def test_tampered_cursor_falls_back_to_first_page(self):
+        first = list(self.paginator.page())
+        for cursor in ('garbage', encode_cursor(['x', 'y'], 'next'), encode_cursor([None, 1], 'prev'),
+                       encode_cursor([1], 'next'), encode_cursor([{'a': 1}, 2], 'sideways')):
+            with self.subTest(cursor=cursor):
+                self.assertEqual(list(self.paginator.get_page(cursor)), first)
+
+    @override_settings(BOOK_LIST_CURSOR_PAGINATION=True)
+    def test_book_list_follows_cursors(self):
+        response = self.client.get(reverse('book_list'), {'cursor': encode_cursor(['x', 'y'], 'next')})
+        self.assertEqual(response.status_code, 200)
+        first = list(response.context['books'])
+        response = self.client.get(reverse('book_list'), {'cursor': response.context['books'].next_cursor})
+        self.assertEqual(len(first) + len(response.context['books']), len(self.books))
+        self.assertFalse(set(first) & set(response.context['books']))
+
+
+class RecommendationTests(TestCase):
+    def setUp(self):
+        self.anna, self.emma, self.dune, self.popular = (
+            Book.objects.create(title=title) for title in ('Anna Karenina', 'Emma', 'Dune', 'Bestseller')
+        )
+        self.students = [User.objects.create_user(f'reader{i}') for i in range(10)]
+        for student, books in zip(self.students, (
+            [self.anna, self.emma], [self.anna, self.emma], [self.anna, self.dune],
+        )):
+            for book in books:
+                self.borrow(student, book)
+        for student in self.students:
+            self.borrow(student, self.popular)
+
+    def borrow(self, student, book):
+        BorrowRecord.objects.create(student=student, book=book, due_date=timezone.now().date())
+
+    def test_neighbours_are_normalised_by_reader_counts(self):
+        recommendations.build_all()
+        # Emma: 2 shared readers of 3 and 2; Dune: 1 of 3 and 1; Bestseller: 3 of 3 and 10.
+        self.assertEqual(recommendations.readers_also_borrowed(self.anna), [self.emma, self.dune, self.popular])
+        scores = BookNeighbor.objects.filter(book=self.anna, kind=BookNeighbor.KIND_BORROWED).values_list(
+            'score', flat=True,
+        )
+        for score, expected in zip(scores, (2 / 6 ** 0.5, 1 / 3 ** 0.5, 3 / 30 ** 0.5)):
+            self.assertAlmostEqual(score, expected)
+
+    def test_refresh_matches_full_build_for_changed_books(self):
+        recommendations.build_all()
+        self.borrow(self.students[3], self.dune)
+        self.borrow(self.students[3], self.anna)
+        recommendations.refresh_books(recommendations.books_affected_since(timezone.now().date()))
+        refreshed = list(BookNeighbor.objects.filter(book=self.anna).values_list('neighbor', 'rank', 'score'))
+
+        recommendations.build_all()
+        rebuilt = list(BookNeighbor.objects.filter(book=self.anna).values_list('neighbor', 'rank', 'score'))
+        self.assertEqual(refreshed, rebuilt)
+        # Dune now shares two of Anna Karenina's four readers.
+        self.assertAlmostEqual({pk: score for pk, _, score in refreshed}[self.dune.pk], 2 / 8 ** 0.5)
+
+
+class SimilarBooksTests(TestCase):
+    def setUp(self):
+        herbert = Author.objects.create(name='Frank Herbert')
+        scifi = Category.objects.create(name='Science Fiction')
+        self.dune = Book.objects.create(
+            title='Dune', author=herbert, category=scifi, description='Spice and sandworms on a desert planet.',
+        )
+        self.messiah = Book.objects.create(
+            title='Dune Messiah', author=herbert, category=scifi, description='The desert planet after the war.',
+        )
+        self.emma = Book.objects.create(title='Emma', description='Matchmaking in a quiet village.')
+
+    def neighbour_rows(self):
+        return sorted(BookNeighbor.objects.filter(kind=BookNeighbor.KIND_SIMILAR).values_list(
+            'book', 'neighbor', 'rank', 'score',
+        ))
+
+    def test_small_catalog_keeps_shared_terms(self):
+        self.assertEqual(similarity.build(), (3, 3))
+        self.assertEqual(recommendations.similar_books(self.dune), [self.messiah])
+        self.assertEqual(recommendations.similar_books(self.messiah), [self.dune])
+        self.assertEqual(recommendations.similar_books(self.emma), [])
+
+    def test_blocks_do_not_change_results(self):
+        similarity.build()
+        whole = self.neighbour_rows()
+        with mock.patch.object(similarity, 'BLOCK_SIZE', 1):
+            similarity.build()
+        self.assertEqual(self.neighbour_rows(), whole)
+
+    def test_incremental_build_recomputes_changed_books_and_their_reverse_neighbours(self):
+        similarity.build()
+        self.emma.description = 'A village far from any desert planet.'
+        self.emma.save()
+        self.assertEqual(similarity.build(incremental=True), (1, 3))
+        self.assertIn(self.dune, recommendations.similar_books(self.emma))
+        self.assertIn(self.emma, recommendations.similar_books(self.dune))
+
+        self.messiah.title = 'Children'
+        self.messiah.description = 'Matchmaking in a quiet village.'
+        self.messiah.author = self.messiah.category = None
+        self.messiah.save()
+        similarity.build(incremental=True)
+        self.assertNotIn(self.messiah, recommendations.similar_books(self.dune))
+
+    def test_books_changed_during_a_run_are_picked_up_by_the_next(self):
+        similarity.build()
+        load_catalog = similarity.load_catalog
+
+        def edit_meanwhile():
+            Book.objects.filter(pk=self.emma.pk).update(updated_at=timezone.now())
+            return load_catalog()
+
+        with mock.patch.object(similarity, 'load_catalog', edit_meanwhile):
+            similarity.build(incremental=True)
+        self.assertEqual(similarity.build(incremental=True)[0], 1)
+
+
+class TrigramIndexTests(TestCase):
+    ROWS = [
+        (1, 'Crime and Punishment', 'Fyodor Dostoyevsky'),
+        (2, 'The Brothers Karamazov', 'Fyodor Dostoyevsky'),
+        (3, 'War and Peace', 'Leo Tolstoy'),
+        (4, 'Pride and Prejudice', 'Jane Austen'),
+    ]
+
+    def test_misspelled_author_matches(self):
+        index = TrigramIndex(self.ROWS)
+        ids = [book_id for _, book_id in index.search('Dostoevsky')]
+        self.assertEqual(sorted(ids), [1, 2])
+
+    def test_results_are_ranked_by_similarity(self):
+        index = TrigramIndex(self.ROWS)
+        results = index.search('Pride Prejudce')
+        self.assertEqual(results[0][1], 4)
+        self.assertEqual(results, sorted(results, reverse=True))
+
+    def test_unrelated_query_finds_nothing(self):
+        self.assertEqual(TrigramIndex(self.ROWS).search('xqzw'), [])
+
+    def test_book_list_fuzzy_mode(self):
+        fuzzy.index.clear()
+        author = Author.objects.create(name='Fyodor Dostoyevsky')
+        book = Book.objects.create(title='The Idiot', author=author)
+        response = self.client.get(reverse('book_list'), {'q': 'dostoevsky', 'fuzzy': '1'})
+        self.assertEqual(list(response.context['books']), [book])
+
+    def test_only_name_changes_rebuild_the_index(self):
+        fuzzy.index.clear()
+        author = Author.objects.create(name='Fyodor Dostoyevsky')
+        book = Book.objects.create(title='The Idiot', author=author)
+        self.assertEqual(fuzzy.search('dostoevsky'), [book.pk])
+        book.available_copies = 0
+        book.save()
+        with mock.patch.object(fuzzy.index, 'build') as build:
+            fuzzy.index.refresh()
+        build.assert_not_called()
+
+        author.name = 'Fyodor Dostoevsky'
+        author.save()
+        fuzzy.index.refresh()
+        with self.assertNumQueries(0):
+            self.assertEqual(fuzzy.search('dostoevsky'), [book.pk])
+        self.assertEqual(fuzzy.search('dostoyevsky'), [book.pk])
+
+
+class TrigramIndexPerformanceTests(TestCase):
+    CATALOG_SIZE = 50000
+    QUERIES = 20
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        rng = random.Random(13)
+        cls.rows = [
+            (pk, ' '.join(make_word(rng) for _ in range(3)), f'{make_word(rng)} {make_word(rng)}')
+            for pk in range(1, cls.CATALOG_SIZE + 1)
+        ]
+        cls.index = TrigramIndex(cls.rows)
+        # Surnames with one letter dropped, paired with the book they came from.
+        cls.queries = []
+        while len(cls.queries) < cls.QUERIES:
+            pk, _, author_name = rng.choice(cls.rows)
+            word = author_name.split()[1]
+            if len(word) >= 8:
+                pos = rng.randrange(len(word))
+                cls.queries.append((word[:pos] + word[pos + 1:], pk))
+
+    def test_misspelled_surnames_find_their_book(self):
+        for query, pk in self.queries:
+            with self.subTest(query=query):
+                self.assertIn(pk, [book_id for _, book_id in self.index.search(query)])
+
+    def test_lookup_reads_only_the_query_trigram_postings(self):
+        for query, _ in self.queries:
+            with self.subTest(query=query):
+                grams = trigrams(query)
+                candidates = self.index.candidates(grams)
+                self.assertEqual(sum(candidates.values()), sum(len(self.index.postings.get(g, ())) for g in grams))
+                self.assertTrue(all(grams & trigrams(self.index.words[word_id]) for word_id in candidates))
+                self.assertLess(len(candidates), len(self.index.words))
+
+    def test_lookup_scores_only_books_of_the_matched_words(self):
+        # No per-book scan: the books scored are those of at most MAX_WORD_MATCHES words.
+        for query, _ in self.queries:
+            with self.subTest(query=query):
+                matched = self.index.match_words(query)
+                self.assertLessEqual(len(matched), MAX_WORD_MATCHES)
+                books = set().union(*(self.index.word_books[word_id] for _, word_id in matched))
+                self.assertLess(len(books), self.CATALOG_SIZE // 20)
+                self.assertLessEqual({book_id for _, book_id in self.index.search(query)}, books)
+
+
+class BookDetailTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.book = Book.objects.create(
+            title='Dune', author=Author.objects.create(name='Frank Herbert'), total_copies=2, available_copies=2,
+        )
+        self.url = reverse('book_detail', args=[self.book.pk])
+
+    def add_reviews(self, count):
+        for i in range(count):
+            student = User.objects.create_user(f'reviewer{Review.objects.count()}')
+            Review.objects.create(student=student, book=self.book, rating=i % 5 + 1, comment=f'Review {i}')
+
+    def test_anonymous_hit_runs_no_sql(self):
+        html = self.client.get(self.url).content
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.url).content, html)
+
+    def test_loans_and_reviews_drop_the_cached_page(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            services.borrow_book(User.objects.create_user('reader'), self.book)
+        self.assertIsNone(cache.get(detail_cache.anonymous_key(self.book.pk)))
+        self.assertContains(self.client.get(self.url), '<strong>1 / 2</strong>')
+
+        self.client.get(self.url)
+        self.add_reviews(1)
+        self.assertIsNone(cache.get(detail_cache.shared_key(self.book.pk)))
+        self.assertContains(self.client.get(self.url), 'Review 0')
+
+    def test_personal_slots_cost_one_query(self):
+        reader = User.objects.create_user('reader')
+        services.borrow_book(reader, self.book)
+        with self.assertNumQueries(1):
+            state = detail_cache.personal_state(reader, self.book.pk)
+        self.assertTrue(state['borrow'] and state['available'])
+        self.assertFalse(state['can_review'])
+
+    def test_query_count_does_not_grow_with_reviews(self):
+        self.client.force_login(User.objects.create_user('reader'))
+        counts = []
+        for reviews in (2, 30):
+            self.add_reviews(reviews - Review.objects.count())
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(self.url)
+            counts.append(len(queries))
+            self.assertEqual(response.content.count(b'class="review-card"'), min(reviews, detail_cache.REVIEWS_PER_PAGE))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_older_reviews_load_by_cursor(self):
+        self.add_reviews(25)
+        url = reverse('book_reviews', args=[self.book.pk])
+        first = detail_cache.review_page(self.book.pk)
+        seen = [review.student_id for review in first]
+        cursor = first.next_cursor
+        while cursor:
+            data = self.client.get(url, {'cursor': cursor}).json()
+            seen.extend(int(pk) for pk in re.findall(r'data-student="(\d+)"', data['html']))
+            cursor = data['next_cursor']
+        newest_first = Review.objects.order_by('-created_at', '-id').values_list('student_id', flat=True)
+        self.assertEqual(seen, list(newest_first))
+        self.assertEqual(self.client.get(url, {'cursor': 'tampered'}).status_code, 400)
+
+
+class PanelListTests(TestCase):
+    BRONTES = ['Anne Bronte', 'Charlotte Bronte', 'Emily Bronte']
+
+    def setUp(self):
+        for name in ('Leo Tolstoy', 'Emily Bronte', 'Jane Austen', 'Anne Bronte', 'Charlotte Bronte'):
+            Author.objects.create(name=name)
+        for name in ('Drama', 'Classics', 'Essays'):
+            Category.objects.create(name=name)
+        self.client.force_login(User.objects.create_user('librarian', is_staff=True))
+
+    def names(self, url_name, params):
+        response = self.client.get(reverse(url_name), params)
+        page = response.context['authors' if url_name == 'author_list' else 'categories']
+        next_link = re.search(r'href="\?(cursor=[^"#]+)"[^>]*>\s*Next', response.content.decode())
+        return [obj.name for obj in page], next_link and next_link.group(1).replace('&amp;', '&')
+
+    def walk(self, url_name, params):
+        """Names on every page, following the rendered Next links."""
+        names, link = self.names(url_name, params)
+        while link:
+            more, link = self.names(url_name, QueryDict(link))
+            names += more
+        return names
+
+    def test_search_filters_by_name(self):
+        self.assertEqual(self.names('author_list', {'q': ' BRONTE '})[0], self.BRONTES)
+        self.assertEqual(self.names('category_list', {'q': 'ss'})[0], ['Classics', 'Essays'])
+        response = self.client.get(reverse('author_list'), {'q': 'dickens'})
+        self.assertContains(response, 'No authors match')
+
+    def test_cursor_pages_keep_the_search(self):
+        with mock.patch.object(views, 'PANEL_LIST_PER_PAGE', 2):
+            self.assertEqual(self.walk('author_list', {'q': 'bronte'}), self.BRONTES)
+            self.assertEqual(self.walk('author_list', {}), list(Author.objects.values_list('name', flat=True)))
+            self.assertEqual(self.walk('category_list', {}), ['Classics', 'Drama', 'Essays'])
+            response = self.client.get(reverse('author_list'), {'q': 'bronte', 'cursor': 'x'})
+        self.assertEqual(response.context['filter_query'], 'q=bronte')
+
+    def test_students_cannot_open_the_panel_lists(self):
+        self.client.force_login(User.objects.create_user('reader'))
+        for url_name in ('author_list', 'category_list'):
+            self.assertEqual(self.client.get(reverse(url_name)).status_code, 302)
+
+
+class BookCounterTests(TestCase):
+    def setUp(self):
+        self.tolstoy = Author.objects.create(name='Leo Tolstoy')
+        self.austen = Author.objects.create(name='Jane Austen')
+        self.classics = Category.objects.create(name='Classics')
+        self.romance = Category.objects.create(name='Romance')
+
+    def assertCountersMatch(self):
+        for model in (Author, Category):
+            expected = model.objects.annotate(
+                total=Count('books'), available=Count('books', filter=Q(books__available_copies__gt=0)),
+            )
+            for obj in expected:
+                self.assertEqual((obj.book_count, obj.available_book_count), (obj.total, obj.available), obj)
+
+    def test_create_reassign_and_delete(self):
+        war = Book.objects.create(title='War and Peace', author=self.tolstoy, category=self.classics)
+        emma = Book.objects.create(title='Emma', author=self.austen, category=self.classics, available_copies=0)
+        self.assertCountersMatch()
+
+        emma.category = self.romance
+        emma.available_copies = 1
+        emma.save()
+        war.author = self.austen
+        war.save()
+        self.assertCountersMatch()
+
+        war.delete()
+        self.assertCountersMatch()
+
+    def test_deleting_author_or_category_leaves_other_side_counted(self):
+        Book.objects.create(title='Anna Karenina', author=self.tolstoy, category=self.classics)
+        self.tolstoy.delete()
+        self.assertCountersMatch()
+        self.classics.delete()
+        Book.objects.get().delete()
+        self.assertCountersMatch()
+
+    def test_circulation_moves_available_count(self):
+        book = Book.objects.create(title='Persuasion', author=self.austen, category=self.romance)
+        record = services.borrow_book(User.objects.create_user('reader'), book)
+        self.assertCountersMatch()
+        self.assertEqual(Author.objects.get(pk=self.austen.pk).available_book_count, 0)
+        services.return_records(BorrowRecord.objects.filter(pk=record.pk))
+        self.assertCountersMatch()
+        self.assertEqual(Category.objects.get(pk=self.romance.pk).available_book_count, 1)
+
+    def test_author_and_category_edits_keep_counts_changed_meanwhile(self):
+        author = Author.objects.get(pk=self.tolstoy.pk)
+        category = Category.objects.get(pk=self.classics.pk)
+        Book.objects.create(title='Hadji Murat', author=self.tolstoy, category=self.classics)
+
+        for form in (
+            AuthorForm({'name': 'Lev Tolstoy', 'bio': ''}, instance=author),
+            CategoryForm({'name': 'Russian Classics', 'description': ''}, instance=category),
+        ):
+            self.assertTrue(form.is_valid(), form.errors)
+            form.save()
+        self.assertEqual(Author.objects.get(pk=self.tolstoy.pk).name, 'Lev Tolstoy')
+        self.assertEqual(Category.objects.get(pk=self.classics.pk).name, 'Russian Classics')
+        self.assertCountersMatch()
+
+    def test_admin_edits_keep_counts_changed_meanwhile(self):
+        self.client.force_login(User.objects.create_superuser('admin'))
+        for model_admin, obj, data in (
+            (admin.site._registry[Author], self.tolstoy, {'name': 'Lev Tolstoy', 'bio': ''}),
+            (admin.site._registry[Category], self.classics, {'name': 'Russian Classics', 'description': ''}),
+        ):
+            save_form = model_admin.save_form
+
+            def book_added_meanwhile(request, form, change, save_form=save_form):
+                Book.objects.create(title=f'Book {Book.objects.count()}', author=self.tolstoy, category=self.classics)
+                return save_form(request, form, change)
+
+            url = reverse(f'admin:books_{obj._meta.model_name}_change', args=[obj.pk])
+            with mock.patch.object(model_admin, 'save_form', book_added_meanwhile):
+                self.assertEqual(self.client.post(url, data).status_code, 302)
+            self.assertEqual(type(obj).objects.get(pk=obj.pk).name, data['name'])
+        self.assertCountersMatch()
+
+    def test_reconcile_repairs_drift(self):
+        Book.objects.create(title='Resurrection', author=self.tolstoy, category=self.classics)
+        Book.objects.update(category=self.romance)
+        Author.objects.update(book_count=7)
+        call_command('reconcile_book_counts', stdout=StringIO())
+        self.assertCountersMatch()
+
+
+class QueryPlanAuditTests(TestCase):
+    feed = Review.objects.order_by('-created_at', '-id')
+
+    def test_view_queries_use_indexes(self):
+        # Without ANALYZE statistics SQLite plans as if every table were large.
+        call_command('queryplan_audit', min_rows=0, stdout=StringIO())
+
+    def test_limited_index_walk_passes_only_without_a_residual_filter(self):
+        plan = '5 0 0 SCAN reviews_review USING INDEX review_created_idx'
+        self.assertEqual(plan_issues(plan, self.feed[:21], 'sqlite'), [])
+        self.assertEqual(plan_issues(plan, self.feed.filter(rating=5)[:21], 'sqlite'), [(FULL_SCAN, 'reviews_review')])
+        self.assertEqual(plan_issues(plan, self.feed, 'sqlite'), [(FULL_SCAN, 'reviews_review')])
+
+        postgres = (
+            'Limit  (cost=0.29..1.83 rows=21 width=48)\n'
+            '  ->  Index Scan Backward using review_created_idx on reviews_review  (cost=0.29..73.29 rows=1000)\n'
+            '        Filter: (rating = 5)'
+        )
+        self.assertEqual(plan_issues(postgres, self.feed.filter(rating=5)[:21], 'postgresql'),
+                         [(FULL_SCAN, 'reviews_review')])
+
+    def test_temp_sort_counts_against_the_tables_it_sorts(self):
+        loans = BorrowRecord.objects.filter(book_id=OuterRef('pk')).order_by('-due_date')
+        queryset = Book.objects.filter(pk=1).annotate(due=Subquery(loans.values('due_date')[:1]))
+        plan = (
+            '3 0 0 SEARCH books_book USING INTEGER PRIMARY KEY (rowid=?)\n'
+            '8 0 0 CORRELATED SCALAR SUBQUERY 1\n'
+            '18 8 0 SEARCH U0 USING INDEX borrow_book_status_idx (book_id=?)\n'
+            '30 8 0 USE TEMP B-TREE FOR ORDER BY'
+        )
+        self.assertEqual(plan_issues(plan, queryset, 'sqlite'), [(TEMP_SORT, 'borrowing_borrowrecord')])
+
+        postgres = (
+            'Limit  (cost=16.60..16.61 rows=21 width=48)\n'
+            '  ->  Sort  (cost=16.60..16.62 rows=8 width=48)\n'
+            '        Sort Key: reviews_review.created_at DESC, reviews_review.id DESC\n'
+            '        ->  Nested Loop  (cost=0.57..16.48 rows=8 width=48)\n'
+            '              ->  Index Scan using books_book_author_id on books_book  (cost=0.29..8.30 rows=1 width=4)\n'
+            '                    Index Cond: (author_id = 1)\n'
+            '              ->  Index Scan using review_book_created_idx on reviews_review  (cost=0.29..8.10 rows=8)\n'
+            '                    Index Cond: (book_id = books_book.id)'
+        )
+        self.assertEqual(
+            plan_issues(postgres, self.feed.filter(book__author_id=1)[:21], 'postgresql'),
+            [(TEMP_SORT, 'books_book'), (TEMP_SORT, 'reviews_review')],
+        )
+
+
+class AdminChangelistQueryTests(TestCase):
+    ROWS = 12
+    MODELS = [Author, Category, Book, BorrowRecord, Review, User, StudentProfile]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin_user = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        due = timezone.now().date() + timedelta(days=14)
+        for i in range(cls.ROWS):
+            student = User.objects.create_user(f'student{i}', first_name='Stu', last_name=str(i))
+            author = Author.objects.create(name=f'Author {i}')
+            category = Category.objects.create(name=f'Category {i}')
+            book = Book.objects.create(title=f'Book {i}', author=author, category=category, isbn=str(i))
+            BorrowRecord.objects.create(student=student, book=book, due_date=due)
+            Review.objects.create(student=student, book=book, rating=i % 5 + 1)
+
+    def setUp(self):
+        self.client.force_login(self.admin_user)
+
+    def changelist_queries(self, model, per_page):
+        model_admin = admin.site._registry[model]
+        original = model_admin.list_per_page
+        model_admin.list_per_page = per_page
+        url = reverse(f'admin:{model._meta.app_label}_{model._meta.model_name}_changelist')
+        cache.clear()
+        try:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+        finally:
+            model_admin.list_per_page = original
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_page_size(self):
+        for model in self.MODELS:
+            with self.subTest(model=model.__name__):
+                self.assertEqual(
+                    self.changelist_queries(model, 2),
+                    self.changelist_queries(model, self.ROWS),
+                )
+
+
+class LargeTableAdminTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        book = Book.objects.create(title='Dune')
+        for i in range(6):
+            Review.objects.create(student=User.objects.create_user(f'reader{i}'), book=book, rating=i % 2 + 4)
+
+    def test_unfiltered_count_uses_the_planner_estimate(self):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        with self.assertNumQueries(2):  # the estimate and the highest id
+            self.assertEqual(EstimatedCountPaginator(Review.objects.all(), 5).count, 6)
+        Review.objects.earliest('pk').delete()
+        self.assertEqual(EstimatedCountPaginator(Review.objects.all(), 5).count, 6)  # an upper bound, never short
+
+    def test_rows_added_since_analyze_are_counted_exactly(self):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        book = Book.objects.get()
+        Review.objects.bulk_create([
+            Review(student=User.objects.create_user(f'late{i}'), book=book, rating=3) for i in range(5)
+        ])
+        paginator = EstimatedCountPaginator(Review.objects.all(), 5)
+        self.assertEqual((paginator.count, paginator.num_pages), (11, 3))
+
+    def test_filtered_count_is_exact_and_cached(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(EstimatedCountPaginator(Review.objects.filter(rating=5), 5).count, 3)
+        with self.assertNumQueries(0):
+            self.assertEqual(EstimatedCountPaginator(Review.objects.filter(rating=5), 5).count, 3)
+
+    def test_date_hierarchy_reads_cached_bucket_dates(self):
+        Review.objects.filter(rating=4).update(created_at=timezone.make_aware(datetime(2023, 3, 9)))
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        url = reverse('admin:reviews_review_changelist')
+        this_year = timezone.localdate().year
+        response = self.client.get(url)
+        self.assertContains(response, '?created_at__year=2023')
+        self.assertContains(response, f'?created_at__year={this_year}')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'created_at__year': 2023})
+        self.assertContains(response, '?created_at__month=3&amp;created_at__year=2023')
+        self.assertFalse([query for query in queries if 'DISTINCT' in query['sql']])
@@ -3,7 +3,9 @@ from . import views
 
 urlpatterns = [
     path('', views.book_list, name='book_list'),
+    path('autocomplete/', views.book_autocomplete, name='book_autocomplete'),
     path('<int:pk>/', views.book_detail, name='book_detail'),
+    path('<int:pk>/me/', views.book_personal_state, name='book_personal_state'),
     path('add/', views.book_create, name='book_create'),
     path('<int:pk>/edit/', views.book_edit, name='book_edit'),
     path('<int:pk>/delete/', views.book_delete, name='book_delete'),
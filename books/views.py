@@ -1,115 +1,242 @@
+import functools
+
+from django.conf import settings
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import user_passes_test
 from django.contrib import messages
-from django.core.paginator import Paginator
-from django.db.models import Avg, Count, Q
+from django.core.paginator import Page, Paginator
+from django.db import router
+from django.db.models import Case, IntegerField, Q, When
+from django.core.cache import cache
+from django.http import HttpResponse, JsonResponse
+from . import autocomplete, detail_cache, facets, fuzzy, recommendations, result_cache, search
+from .pagination import KeysetPage, KeysetPaginator, count_cache_key
 from .models import Book, Author, Category
 from .forms import BookForm, AuthorForm, CategoryForm
-from borrowing.models import BorrowRecord
 
 SORT_OPTIONS = {
     'newest': '-created_at',
     'oldest': 'created_at',
     'rating': None,   # handled separately via annotate
+    'relevance': None,  # full-text rank, only valid with a search query
+}
+
+# Sort keys for cursor pagination; the trailing pk makes each key unique.
+KEYSET_ORDERINGS = {
+    'newest': ('-created_at', '-id'),
+    'oldest': ('created_at', 'id'),
+    'rating': ('-avg_rating', '-id'),
 }
 
+BOOK_LIST_PER_PAGE = 9
+PANEL_LIST_PER_PAGE = 50
+
 
 def is_admin(user):
     return user.is_staff
 
 
-def book_list(request):
-    categories = Category.objects.all()
-    query = request.GET.get('q', '').strip()
-    category_id = request.GET.get('category', '')
-    sort = request.GET.get('sort', 'newest')
+def _panel_paginator(queryset, query):
+    """Keyset paginator over a panel listing, narrowed by name when searching."""
+    if query:
+        queryset = queryset.filter(name__icontains=query)
+    return KeysetPaginator(queryset, ('name', 'id'), PANEL_LIST_PER_PAGE)
 
-    books = Book.objects.select_related('author', 'category').annotate(
-        avg_rating=Avg('reviews__rating')
-    )
 
+def _panel_page(request, queryset):
+    """Search by name and cursor-paginate a panel listing. Returns (page, query, filter_query)."""
+    query = request.GET.get('q', '').strip()
+    page_obj = _panel_paginator(queryset, query).get_page(request.GET.get('cursor'))
+    params = request.GET.copy()
+    params.pop('cursor', None)
+    return page_obj, query, params.urlencode()
+
+
+def _matching_books(query, fuzzy_mode, using):
+    """Books matching the search text, plus their relevance ordering when ranked."""
+    books = Book.objects.using(using).select_related('author', 'category')
+    if query and fuzzy_mode:
+        ranked_ids = fuzzy.search(query)
+        return books.filter(pk__in=ranked_ids), (Case(
+            *[When(pk=pk, then=rank) for rank, pk in enumerate(ranked_ids)],
+            output_field=IntegerField(),
+        ),)
+    if query and search.is_enabled():
+        if not search.build_match_query(query):  # punctuation only: nothing to match or rank
+            return books.none(), None
+        return search.filter_books(books, query), ('search_rank', 'id')
     if query:
-        books = books.filter(Q(title__icontains=query) | Q(author__name__icontains=query))
+        return books.filter(Q(title__icontains=query) | Q(author__name__icontains=query)), None
+    return books, None
 
-    if category_id:
-        books = books.filter(category_id=category_id)
 
-    if sort == 'rating':
-        books = books.order_by('-avg_rating')
-    elif sort == 'oldest':
-        books = books.order_by('created_at')
-    else:
-        books = books.order_by('-created_at')
+def book_list(request):
+    query = request.GET.get('q', '').strip()
+    category_id = request.GET.get('category', '')
+    language = request.GET.get('language', '')
+    sort = request.GET.get('sort', 'relevance' if query else 'newest')
+    fuzzy_mode = request.GET.get('fuzzy') == '1'
+    if sort not in ('relevance', 'rating', 'oldest') or (sort == 'relevance' and not query):
         sort = 'newest'
+    cursor_paging = settings.BOOK_LIST_CURSOR_PAGINATION and sort in KEYSET_ORDERINGS
+    page_param = request.GET.get('cursor' if cursor_paging else 'page') or ''
+
+    # Facets and result pages are read from, and cached under the catalog
+    # version of, one database: a replica unless this session just wrote.
+    using = router.db_for_read(Book)
+    matching = functools.cache(functools.partial(_matching_books, query, fuzzy_mode, using))
+    grid = facets.facet_grid(query, 'fuzzy' if fuzzy_mode else 'text', lambda: matching()[0], using)
+    category_counts, language_counts = facets.facet_counts(grid, category_id, language)
+    categories = list(Category.objects.all())
+    for category in categories:
+        category.result_count = category_counts.get(category.pk, 0)
+    languages = sorted(
+        ((name, count) for name, count in language_counts.items() if name),
+        key=lambda item: (-item[1], item[0]),
+    )
+    if language and language not in language_counts:
+        languages.append((language, 0))
 
-    paginator = Paginator(books.distinct(), 9)
-    page_obj = paginator.get_page(request.GET.get('page'))
+    key = result_cache.result_key(
+        query, fuzzy=fuzzy_mode, category=category_id, language=language,
+        sort=sort, cursor_paging=cursor_paging, page=page_param,
+    )
+    entry, version = result_cache.lookup(key, using)
+    if entry is None:
+        page_obj, total_count = _book_page(
+            matching, version, query, fuzzy_mode, category_id, language, sort, cursor_paging, page_param,
+        )
+        store = {
+            'ids': [book.pk for book in page_obj],
+            'count': total_count,
+        }
+        if cursor_paging:
+            store.update(has_next=page_obj.has_next(), has_previous=page_obj.has_previous())
+        else:
+            store.update(number=page_obj.number)
+        result_cache.store(key, version, store)
+    else:
+        books = result_cache.hydrate(Book.objects.using(using).select_related('author', 'category'), entry['ids'])
+        total_count = entry['count']
+        if cursor_paging:
+            paginator = KeysetPaginator(Book.objects.none(), KEYSET_ORDERINGS[sort], BOOK_LIST_PER_PAGE)
+            page_obj = KeysetPage(books, paginator, entry['has_next'], entry['has_previous'])
+        else:
+            page_obj = Page(books, entry['number'], Paginator(range(total_count), BOOK_LIST_PER_PAGE))
 
     return render(request, 'books/book_list.html', {
         'books': page_obj,
         'categories': categories,
         'query': query,
+        'fuzzy': fuzzy_mode,
         'selected_category': category_id,
+        'languages': languages,
+        'selected_language': language,
         'sort': sort,
-        'total_count': paginator.count,
+        'total_count': total_count,
+        'cursor_paging': cursor_paging,
     })
 
 
+def _sorted_books(books, relevance, category_id, language, sort):
+    """Narrow the matching books by the facet filters and apply the chosen sort."""
+    if category_id:
+        books = books.filter(category_id=category_id)
+    if language:
+        books = books.filter(language=language)
+    if sort == 'relevance' and relevance:
+        return books.order_by(*relevance)
+    if sort == 'rating':
+        return books.order_by('-avg_rating', '-id')
+    if sort == 'oldest':
+        return books.order_by('created_at')
+    return books.order_by('-created_at')
+
+
+def _book_page(matching, version, query, fuzzy_mode, category_id, language, sort, cursor_paging, page_param):
+    """Run the catalog query for one page. Returns (page, total_count)."""
+    books = _sorted_books(*matching(), category_id, language, sort)
+
+    if cursor_paging:
+        paginator = KeysetPaginator(
+            books, KEYSET_ORDERINGS[sort], BOOK_LIST_PER_PAGE,
+            count_key=count_cache_key(
+                'book_list', q=query, category=category_id, language=language, fuzzy=fuzzy_mode, version=version,
+            ),
+            count_timeout=settings.BOOK_LIST_COUNT_CACHE_TIMEOUT,
+        )
+        page_obj = paginator.get_page(page_param or None)
+        total_count = paginator.count if settings.BOOK_LIST_EXACT_COUNT else None
+    else:
+        paginator = Paginator(books, BOOK_LIST_PER_PAGE)
+        page_obj = paginator.get_page(page_param or None)
+        page_obj.object_list = list(page_obj.object_list)
+        total_count = paginator.count
+    return page_obj, total_count
+
+
 def book_detail(request, pk):
-    book = get_object_or_404(
-        Book.objects.select_related('author', 'category').annotate(
-            avg_rating=Avg('reviews__rating')
-        ),
-        pk=pk,
-    )
-    reviews = book.reviews.select_related('student').order_by('-created_at')
-
-    user_borrow = None
-    user_review = None
-    can_review = False
-    has_returned = False
-
-    if request.user.is_authenticated and not request.user.is_staff:
-        user_borrow = BorrowRecord.objects.filter(
-            student=request.user, book=book, status='borrowed'
-        ).first()
-        user_review = reviews.filter(student=request.user).first()
-        has_returned = BorrowRecord.objects.filter(
-            student=request.user, book=book, status='returned'
-        ).exists()
-        can_review = not user_review and has_returned
-
-    return render(request, 'books/book_detail.html', {
-        'book': book,
-        'reviews': reviews,
-        'user_borrow': user_borrow,
-        'user_review': user_review,
-        'can_review': can_review,
-        'has_returned': has_returned,
+    cacheable = not request.user.is_authenticated and not len(messages.get_messages(request))
+    if cacheable:
+        html = cache.get(detail_cache.anonymous_key(pk))
+        if html is not None:
+            return HttpResponse(html)
+
+    shared = detail_cache.get_shared(pk)
+    state = detail_cache.personal_state(request.user, pk)
+    hero, body = detail_cache.fill_slots(shared, request, state)
+    response = render(request, 'books/book_detail.html', {
+        'book_title': shared['title'],
+        'hero': hero,
+        'body': body,
     })
+    if cacheable:
+        cache.set(detail_cache.anonymous_key(pk), response.content.decode(), settings.BOOK_DETAIL_CACHE_SECONDS)
+    return response
+
+
+def book_personal_state(request, pk):
+    state = detail_cache.personal_state(request.user, pk)
+    return JsonResponse({**state, 'authenticated': request.user.is_authenticated})
+
+
+def _author_books(author):
+    """An author's books, newest first, for the public author page."""
+    return Book.objects.filter(author=author).select_related('category').order_by('-created_at')
 
 
 def author_detail_public(request, pk):
     author = get_object_or_404(Author, pk=pk)
-    author_books = (
-        Book.objects.filter(author=author)
-        .select_related('category')
-        .annotate(avg_rating=Avg('reviews__rating'))
-        .order_by('-created_at')
-    )
     return render(request, 'books/author_detail.html', {
         'author': author,
-        'author_books': author_books,
+        'author_books': _author_books(author),
+        'similar_books': recommendations.similar_to_author(author),
+    })
+
+
+def book_autocomplete(request):
+    query = request.GET.get('q', '').strip()
+    try:
+        limit = min(max(int(request.GET.get('limit', autocomplete.DEFAULT_LIMIT)), 1), 20)
+    except ValueError:
+        limit = autocomplete.DEFAULT_LIMIT
+    results = autocomplete.suggest(query, limit) if query else []
+    return JsonResponse({
+        'query': query,
+        'results': [
+            {'label': entry['label'], 'kind': entry['kind'], 'url': entry['url']}
+            for entry in results
+        ],
     })
 
 
 def public_category_list(request):
-    categories = Category.objects.annotate(book_count=Count('books')).order_by('name')
+    categories = Category.objects.order_by('name')
     return render(request, 'books/public_category_list.html', {'categories': categories})
 
 
 def public_author_list(request):
-    authors = Author.objects.annotate(book_count=Count('books')).order_by('name')
+    authors = Author.objects.order_by('name')
     return render(request, 'books/public_author_list.html', {'authors': authors})
 
 
@@ -152,8 +279,12 @@ def book_delete(request, pk):
 
 @user_passes_test(is_admin)
 def author_list(request):
-    authors = Author.objects.all()
-    return render(request, 'books/author_list.html', {'authors': authors})
+    authors, query, filter_query = _panel_page(request, Author.objects.all())
+    return render(request, 'books/author_list.html', {
+        'authors': authors,
+        'query': query,
+        'filter_query': filter_query,
+    })
 
 
 @user_passes_test(is_admin)
@@ -195,8 +326,12 @@ def author_delete(request, pk):
 
 @user_passes_test(is_admin)
 def category_list(request):
-    categories = Category.objects.all()
-    return render(request, 'books/category_list.html', {'categories': categories})
+    categories, query, filter_query = _panel_page(request, Category.objects.all())
+    return render(request, 'books/category_list.html', {
+        'categories': categories,
+        'query': query,
+        'filter_query': filter_query,
+    })
 
 
 @user_passes_test(is_admin)
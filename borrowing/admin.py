@@ -1,11 +1,12 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.utils.html import format_html
-from django.utils import timezone
-from .models import BorrowRecord
+from books.admin_tools import LargeTableAdminMixin
+from . import services
+from .models import BorrowRecord, DailyCirculation
 
 
 @admin.register(BorrowRecord)
-class BorrowRecordAdmin(admin.ModelAdmin):
+class BorrowRecordAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display       = ('student', 'book_link', 'borrow_date', 'due_date',
                           'return_date', 'status_badge', 'overdue_tag')
     list_display_links = ('student',)
@@ -14,6 +15,7 @@ class BorrowRecordAdmin(admin.ModelAdmin):
                           'book__title', 'book__isbn')
     date_hierarchy     = 'borrow_date'
     readonly_fields    = ('borrow_date', 'overdue_tag')
+    list_select_related = ('student', 'book')
     list_per_page      = 25
     actions            = ('action_mark_returned',)
     fieldsets = (
@@ -28,13 +30,20 @@ class BorrowRecordAdmin(admin.ModelAdmin):
         }),
     )
 
+    def bucket_dates(self):
+        # Every loan adds to the library-wide rollup row of its borrow date.
+        return list(
+            DailyCirculation.objects.filter(scope=DailyCirculation.SCOPE_LIBRARY, object_id=0, borrowed__gt=0)
+            .order_by('date').values_list('date', flat=True)
+        )
+
     # ── Custom columns ────────────────────────────────────────────────────────
 
     @admin.display(description='Book')
     def book_link(self, obj):
         return format_html(
             '<a href="/admin/books/book/{}/change/" style="font-weight:600;">{}</a>',
-            obj.book.pk, obj.book.title,
+            obj.book_id, obj.book.title,
         )
 
     @admin.display(description='Status')
@@ -64,13 +73,9 @@ class BorrowRecordAdmin(admin.ModelAdmin):
 
     @admin.action(description='Mark selected records as Returned')
     def action_mark_returned(self, request, queryset):
-        today   = timezone.now().date()
-        updated = 0
-        for record in queryset.filter(status='borrowed'):
-            record.return_date = today
-            record.status      = 'returned'
-            record.save()
-            record.book.available_copies += 1
-            record.book.save()
-            updated += 1
+        try:
+            updated = services.return_records(queryset)
+        except services.BorrowError as exc:
+            self.message_user(request, str(exc), level=messages.ERROR)
+            return
         self.message_user(request, f'{updated} record(s) successfully marked as returned.')
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-18 02:28
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0004_book_rating_aggregates'),
+        ('borrowing', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='borrowrecord',
+            index=models.Index(fields=['borrow_date'], name='borrow_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='borrowrecord',
+            index=models.Index(fields=['status', 'borrow_date'], name='borrow_status_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='borrowrecord',
+            index=models.Index(fields=['status', 'due_date'], name='borrow_status_due_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.8 on 2026-10-18 02:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('borrowing', '0002_borrowrecord_list_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyCirculation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(choices=[('library', 'Library'), ('category', 'Category'), ('book', 'Book')], max_length=10)),
+                ('object_id', models.PositiveBigIntegerField(default=0)),
+                ('date', models.DateField()),
+                ('borrowed', models.PositiveIntegerField(default=0)),
+                ('returned', models.PositiveIntegerField(default=0)),
+                ('overdue', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'Daily circulation',
+                'ordering': ['date'],
+                'constraints': [models.UniqueConstraint(fields=('scope', 'object_id', 'date'), name='daily_circulation_unique')],
+            },
+        ),
+    ]
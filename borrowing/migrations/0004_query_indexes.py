@@ -0,0 +1,32 @@
+# Generated by Django 5.2.8 on 2026-10-18 03:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0010_query_indexes'),
+        ('borrowing', '0003_dailycirculation'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='borrowrecord',
+            index=models.Index(fields=['student', 'status', 'due_date'], name='borrow_student_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='borrowrecord',
+            index=models.Index(fields=['student', 'borrow_date'], name='borrow_student_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='borrowrecord',
+            index=models.Index(fields=['student', 'book', 'status'], name='borrow_student_book_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='borrowrecord',
+            index=models.Index(fields=['book', 'status'], name='borrow_book_status_idx'),
+        ),
+    ]
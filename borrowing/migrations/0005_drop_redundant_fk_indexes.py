@@ -0,0 +1,27 @@
+# Generated by Django 5.2.8 on 2026-10-18 04:03
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0011_catalog_version'),
+        ('borrowing', '0004_query_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='borrowrecord',
+            name='book',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='borrow_records', to='books.book'),
+        ),
+        migrations.AlterField(
+            model_name='borrowrecord',
+            name='student',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='borrow_records', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
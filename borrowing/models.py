@@ -11,8 +11,9 @@ class BorrowRecord(models.Model):
         ('returned', 'Returned'),
     ]
 
-    student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='borrow_records')
-    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='borrow_records')
+    # Lookups by student or book use the composite indexes in Meta, which lead with these columns.
+    student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='borrow_records', db_index=False)
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='borrow_records', db_index=False)
     borrow_date = models.DateField(auto_now_add=True)
     due_date = models.DateField()
     return_date = models.DateField(null=True, blank=True)
@@ -38,3 +39,49 @@ class BorrowRecord(models.Model):
 
     class Meta:
         ordering = ['-borrow_date']
+        indexes = [
+            models.Index(fields=['borrow_date'], name='borrow_date_idx'),
+            models.Index(fields=['status', 'borrow_date'], name='borrow_status_date_idx'),
+            models.Index(fields=['status', 'due_date'], name='borrow_status_due_idx'),
+            models.Index(fields=['student', 'status', 'due_date'], name='borrow_student_status_idx'),
+            models.Index(fields=['student', 'borrow_date'], name='borrow_student_date_idx'),
+            models.Index(fields=['student', 'book', 'status'], name='borrow_student_book_idx'),
+            models.Index(fields=['book', 'status'], name='borrow_book_status_idx'),
+        ]
+
+
+class DailyCirculation(models.Model):
+    """
+    Per-day circulation counts for one book, one category or the whole library.
+
+    ``overdue`` counts loans that became overdue on ``date`` (the day after
+    their due date, if still out by then), so rows may exist ahead of today.
+    """
+
+    SCOPE_LIBRARY = 'library'
+    SCOPE_CATEGORY = 'category'
+    SCOPE_BOOK = 'book'
+    SCOPE_CHOICES = [
+        (SCOPE_LIBRARY, 'Library'),
+        (SCOPE_CATEGORY, 'Category'),
+        (SCOPE_BOOK, 'Book'),
+    ]
+
+    scope = models.CharField(max_length=10, choices=SCOPE_CHOICES)
+    object_id = models.PositiveBigIntegerField(default=0)
+    date = models.DateField()
+    borrowed = models.PositiveIntegerField(default=0)
+    returned = models.PositiveIntegerField(default=0)
+    overdue = models.IntegerField(default=0)
+
+    def __str__(self):
+        if self.scope == self.SCOPE_LIBRARY:
+            return f'Library {self.date}'
+        return f'{self.get_scope_display()} #{self.object_id} {self.date}'
+
+    class Meta:
+        ordering = ['date']
+        verbose_name_plural = 'Daily circulation'
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'object_id', 'date'], name='daily_circulation_unique'),
+        ]
@@ -0,0 +1,86 @@
+"""
+Incremental maintenance of the DailyCirculation rollup table.
+
+Every circulation event is turned into per-day deltas for the book, its
+category and the whole library, then applied with F-expression upserts.
+A loan counts as overdue on the day after its due date; borrowing
+schedules that count up front and an on-time return cancels it.
+"""
+
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import DailyCirculation
+
+FIELDS = ('borrowed', 'returned', 'overdue')
+
+
+def _scopes(book_id, category_id):
+    yield DailyCirculation.SCOPE_LIBRARY, 0
+    yield DailyCirculation.SCOPE_BOOK, book_id
+    if category_id:
+        yield DailyCirculation.SCOPE_CATEGORY, category_id
+
+
+def overdue_date(due_date):
+    return due_date + timedelta(days=1)
+
+
+def loan_deltas(book_id, category_id, borrow_date, due_date, return_date=None, deltas=None):
+    """Add the full history of one loan to ``deltas`` (used by the backfill)."""
+    deltas = defaultdict(Counter) if deltas is None else deltas
+    for scope in _scopes(book_id, category_id):
+        deltas[scope + (borrow_date,)]['borrowed'] += 1
+        if return_date is not None:
+            deltas[scope + (return_date,)]['returned'] += 1
+        if return_date is None or return_date > due_date:
+            deltas[scope + (overdue_date(due_date),)]['overdue'] += 1
+    return deltas
+
+
+def borrow_deltas(book_id, category_id, borrow_date, due_date, deltas=None):
+    deltas = defaultdict(Counter) if deltas is None else deltas
+    for scope in _scopes(book_id, category_id):
+        deltas[scope + (borrow_date,)]['borrowed'] += 1
+        deltas[scope + (overdue_date(due_date),)]['overdue'] += 1
+    return deltas
+
+
+def return_deltas(book_id, category_id, due_date, return_date, deltas=None):
+    deltas = defaultdict(Counter) if deltas is None else deltas
+    for scope in _scopes(book_id, category_id):
+        deltas[scope + (return_date,)]['returned'] += 1
+        if return_date <= due_date:
+            deltas[scope + (overdue_date(due_date),)]['overdue'] -= 1
+    return deltas
+
+
+def apply(deltas):
+    """Add ``{(scope, object_id, date): Counter(field=n)}`` to the rollup rows."""
+    for (scope, object_id, date), counts in deltas.items():
+        counts = {field: n for field, n in counts.items() if n}
+        if not counts:
+            continue
+        rows = DailyCirculation.objects.filter(scope=scope, object_id=object_id, date=date)
+        increments = {field: F(field) + n for field, n in counts.items()}
+        if rows.update(**increments):
+            continue
+        try:
+            with transaction.atomic():
+                DailyCirculation.objects.create(
+                    scope=scope, object_id=object_id, date=date,
+                    **{field: max(n, 0) for field, n in counts.items()},
+                )
+        except IntegrityError:
+            rows.update(**increments)
+
+
+def record_borrow(record, category_id):
+    apply(borrow_deltas(record.book_id, category_id, record.borrow_date, record.due_date))
+
+
+def record_return(record, category_id):
+    apply(return_deltas(record.book_id, category_id, record.due_date, record.return_date))
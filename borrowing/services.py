@@ -0,0 +1,168 @@
+"""
+Circulation operations shared by the views and the admin.
+
+Every change to ``Book.available_copies`` goes through a conditional,
+F-expression UPDATE inside a transaction, so concurrent checkouts can never
+lose an update or oversell copies.
+"""
+
+from collections import Counter
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from books import dashboard, detail_cache
+from books.models import Book
+from elms import homepage
+from . import rollups
+from .models import BorrowRecord
+
+MAX_BORROW_LIMIT = 5
+LOAN_DAYS = 14
+BULK_CHUNK_SIZE = 500
+
+
+class BorrowError(Exception):
+    """A borrow or return that was refused; ``level`` is a messages level name."""
+
+    level = 'error'
+
+
+class BookUnavailable(BorrowError):
+    pass
+
+
+class AlreadyBorrowed(BorrowError):
+    level = 'warning'
+
+
+class BorrowLimitReached(BorrowError):
+    pass
+
+
+class NotBorrowed(BorrowError):
+    level = 'warning'
+
+
+class _ConcurrentReturn(Exception):
+    pass
+
+
+def _circulation_changed(*book_ids):
+    transaction.on_commit(homepage.mark_stale)
+    transaction.on_commit(dashboard.mark_stale)
+    transaction.on_commit(lambda: detail_cache.invalidate(*book_ids))
+
+
+def _count_restocked(returned):
+    """Credit the author and category of each book that ``returned`` brought back into stock."""
+    rows = Book.objects.filter(pk__in=returned).values_list('pk', 'author_id', 'category_id', 'available_copies')
+    for book_id, author_id, category_id, copies in rows:
+        if copies == returned[book_id]:
+            Book.adjust_book_counts(author_id, category_id, available=1)
+
+
+@transaction.atomic
+def borrow_book(student, book):
+    """Check ``book`` out to ``student`` and return the new BorrowRecord."""
+    # Claim a copy first: the conditional UPDATE takes the write lock, so the
+    # eligibility check below cannot race with another checkout.
+    claimed = Book.objects.filter(pk=book.pk, available_copies__gt=0).update(
+        available_copies=F('available_copies') - 1
+    )
+    if not claimed:
+        raise BookUnavailable('Sorry, no copies of this book are currently available.')
+
+    if connection.features.has_select_for_update:
+        type(student).objects.select_for_update().filter(pk=student.pk).exists()
+
+    loans = BorrowRecord.objects.filter(student=student, status='borrowed').aggregate(
+        active=Count('pk'),
+        this_book=Count('pk', filter=Q(book_id=book.pk)),
+    )
+    if loans['this_book']:
+        raise AlreadyBorrowed('You already have this book borrowed.')
+    if loans['active'] >= MAX_BORROW_LIMIT:
+        raise BorrowLimitReached(
+            f'You have reached the maximum limit of {MAX_BORROW_LIMIT} borrowed books. '
+            'Please return a book before borrowing another.'
+        )
+
+    due = timezone.now().date() + timedelta(days=LOAN_DAYS)
+    record = BorrowRecord.objects.create(student=student, book=book, due_date=due)
+    rollups.record_borrow(record, book.category_id)
+    if not Book.objects.filter(pk=book.pk, available_copies__gt=0).exists():
+        Book.adjust_book_counts(book.author_id, book.category_id, available=-1)
+    _circulation_changed(book.pk)
+    return record
+
+
+@transaction.atomic
+def return_book(record):
+    """Mark an active loan as returned and put the copy back on the shelf."""
+    today = timezone.now().date()
+    updated = BorrowRecord.objects.filter(pk=record.pk, status='borrowed').update(
+        status='returned', return_date=today,
+    )
+    if not updated:
+        raise NotBorrowed('This book has already been returned.')
+    Book.objects.filter(pk=record.book_id).update(available_copies=F('available_copies') + 1)
+    _count_restocked({record.book_id: 1})
+
+    record.status = 'returned'
+    record.return_date = today
+    rollups.record_return(record, record.book.category_id)
+    _circulation_changed(record.book_id)
+    return record
+
+
+def return_records(records, attempts=3):
+    """
+    Return every active loan in the ``records`` queryset in one transaction.
+
+    Records are flipped with one UPDATE per chunk of ids and each affected
+    book gets a single grouped F-expression increment. If another request
+    returns one of the loans in between, the transaction is retried.
+    Returns the number of records marked as returned.
+    """
+    for attempt in range(attempts):
+        try:
+            return _return_records(records)
+        except _ConcurrentReturn:
+            if attempt == attempts - 1:
+                raise BorrowError('Some records changed while they were being returned; please retry.')
+
+
+@transaction.atomic
+def _return_records(records):
+    today = timezone.now().date()
+    loans = list(
+        records.filter(status='borrowed').select_for_update()
+        .values_list('pk', 'book_id', 'book__category_id', 'due_date').order_by()
+    )
+    if not loans:
+        return 0
+
+    updated = 0
+    for start in range(0, len(loans), BULK_CHUNK_SIZE):
+        chunk = [loan[0] for loan in loans[start:start + BULK_CHUNK_SIZE]]
+        updated += BorrowRecord.objects.filter(pk__in=chunk, status='borrowed').update(
+            status='returned', return_date=today,
+        )
+    if updated != len(loans):
+        raise _ConcurrentReturn()
+
+    returned_copies = Counter(loan[1] for loan in loans)
+    for book_id, returned in returned_copies.items():
+        Book.objects.filter(pk=book_id).update(available_copies=F('available_copies') + returned)
+    _count_restocked(returned_copies)
+
+    deltas = None
+    for _, book_id, category_id, due_date in loans:
+        deltas = rollups.return_deltas(book_id, category_id, due_date, today, deltas)
+    rollups.apply(deltas)
+
+    _circulation_changed(*{loan[1] for loan in loans})
+    return updated
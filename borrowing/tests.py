@@ -1,3 +1,352 @@
-from django.test import TestCase
+import csv
+import json
+import random
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from books import dashboard_views
+from books.models import Book, Category
+from . import rollups, services, views
+from .models import BorrowRecord, DailyCirculation
+
+
+def run_in_threads(target, args_list):
+    """Run ``target(*args)`` for every entry in ``args_list``, all released at once."""
+    barrier = threading.Barrier(len(args_list))
+    results = [None] * len(args_list)
+
+    def worker(index, args):
+        try:
+            barrier.wait()
+            results[index] = target(*args)
+        except Exception as exc:
+            results[index] = exc
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker, args=(i, args)) for i, args in enumerate(args_list)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    errors = [result for result in results if isinstance(result, Exception)]
+    if errors:
+        raise errors[0]
+    return results
+
+
+def attempt(operation, *args):
+    """Run a circulation operation, retrying while SQLite reports a lock."""
+    delay = 0.001
+    while True:
+        try:
+            operation(*args)
+            return 'ok'
+        except services.BorrowError as exc:
+            return type(exc).__name__
+        except OperationalError as exc:
+            if 'locked' not in str(exc):
+                raise
+            time.sleep(random.uniform(0, delay))
+            delay = min(delay * 2, 0.1)
+
+
+class BorrowServiceTests(TestCase):
+    def setUp(self):
+        self.student = User.objects.create_user('reader', password='pw')
+        self.book = Book.objects.create(title='Dune', total_copies=2, available_copies=2)
+
+    def test_borrow_and_return_adjust_copies(self):
+        record = services.borrow_book(self.student, self.book)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_copies, 1)
+
+        services.return_book(record)
+        self.book.refresh_from_db()
+        record.refresh_from_db()
+        self.assertEqual(self.book.available_copies, 2)
+        self.assertEqual(record.status, 'returned')
+
+    def test_refused_borrow_rolls_back_claimed_copy(self):
+        services.borrow_book(self.student, self.book)
+        with self.assertRaises(services.AlreadyBorrowed):
+            services.borrow_book(self.student, self.book)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_copies, 1)
+
+    def test_borrow_limit(self):
+        for i in range(services.MAX_BORROW_LIMIT):
+            services.borrow_book(self.student, Book.objects.create(title=f'Book {i}'))
+        with self.assertRaises(services.BorrowLimitReached):
+            services.borrow_book(self.student, self.book)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_copies, 2)
+
+    def test_double_return_is_refused(self):
+        record = services.borrow_book(self.student, self.book)
+        services.return_book(record)
+        with self.assertRaises(services.NotBorrowed):
+            services.return_book(record)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_copies, 2)
+
+    def test_bulk_return_groups_increments_per_book(self):
+        other = Book.objects.create(title='Emma', total_copies=1, available_copies=1)
+        readers = [self.student] + [User.objects.create(username=f'r{i}') for i in range(2)]
+        for reader in readers[:2]:
+            services.borrow_book(reader, self.book)
+        services.borrow_book(readers[2], other)
+
+        # One UPDATE per chunk of loans, per book and per rollup row touched.
+        with self.assertNumQueries(13):
+            returned = services.return_records(BorrowRecord.objects.all())
+
+        self.assertEqual(returned, 3)
+        self.assertEqual(services.return_records(BorrowRecord.objects.all()), 0)
+        self.book.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((self.book.available_copies, other.available_copies), (2, 1))
+        self.assertFalse(BorrowRecord.objects.filter(status='borrowed').exists())
+
+
+class CirculationRollupTests(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name='Classics')
+        self.book = Book.objects.create(title='Emma', category=self.category, total_copies=3, available_copies=3)
+        self.readers = [User.objects.create_user(f'reader{i}') for i in range(3)]
+
+    def rollup_rows(self):
+        return sorted(
+            DailyCirculation.objects.exclude(borrowed=0, returned=0, overdue=0)
+            .values_list('scope', 'object_id', 'date', 'borrowed', 'returned', 'overdue')
+        )
+
+    def test_borrow_schedules_overdue_and_on_time_return_cancels_it(self):
+        record = services.borrow_book(self.readers[0], self.book)
+        today, overdue_day = record.borrow_date, rollups.overdue_date(record.due_date)
+        expected = []
+        for scope, object_id in (('book', self.book.pk), ('category', self.category.pk), ('library', 0)):
+            expected += [(scope, object_id, today, 1, 0, 0), (scope, object_id, overdue_day, 0, 0, 1)]
+        self.assertEqual(self.rollup_rows(), sorted(expected))
+
+        services.return_book(record)
+        self.assertEqual(self.rollup_rows(), sorted(
+            (scope, object_id, today, 1, 1, 0) for scope, object_id in
+            (('book', self.book.pk), ('category', self.category.pk), ('library', 0))
+        ))
+
+    def test_late_return_stays_overdue(self):
+        record = services.borrow_book(self.readers[0], self.book)
+        overdue_day = rollups.overdue_date(record.due_date)
+        # The loan was due three days ago.
+        BorrowRecord.objects.filter(pk=record.pk).update(due_date=record.borrow_date - timedelta(days=3))
+        services.return_records(BorrowRecord.objects.filter(pk=record.pk))
+        self.assertEqual(DailyCirculation.objects.get(scope='library', date=overdue_day).overdue, 1)
+
+    def test_backfill_matches_incremental_rollups(self):
+        records = [services.borrow_book(reader, self.book) for reader in self.readers]
+        services.return_book(records[0])
+        incremental = self.rollup_rows()
+        DailyCirculation.objects.update(borrowed=7)
+
+        call_command('backfill_circulation', chunk_size=2, stdout=StringIO())
+        self.assertEqual(self.rollup_rows(), incremental)
+
+    def test_failed_backfill_keeps_existing_rollups(self):
+        for reader in self.readers:
+            services.borrow_book(reader, self.book)
+        before = self.rollup_rows()
+        with mock.patch.object(rollups, 'apply', side_effect=[None, RuntimeError('boom')]):
+            with self.assertRaises(RuntimeError):
+                call_command('backfill_circulation', chunk_size=2, stdout=StringIO())
+        self.assertEqual(self.rollup_rows(), before)
+
+
+class CirculationSeriesTests(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name='Classics')
+        self.books = [Book.objects.create(title=title, category=self.category) for title in ('Emma', 'Persuasion')]
+        self.today = timezone.now().date()
+        DailyCirculation.objects.bulk_create([
+            DailyCirculation(scope='library', object_id=0, date=self.today, borrowed=3),
+            DailyCirculation(scope='library', object_id=0, date=self.today - timedelta(days=5), returned=2),
+            DailyCirculation(scope='library', object_id=0, date=self.today + timedelta(days=2), overdue=1),
+            DailyCirculation(scope='book', object_id=self.books[0].pk, date=self.today, borrowed=2),
+            DailyCirculation(scope='book', object_id=self.books[1].pk, date=self.today, borrowed=1, overdue=4),
+            DailyCirculation(scope='category', object_id=self.category.pk, date=self.today, borrowed=3),
+        ])
+        self.client.force_login(User.objects.create_user('librarian', is_staff=True))
+
+    def series(self, **params):
+        response = self.client.get(reverse('circulation_series'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_library_series_has_one_row_per_day_up_to_today(self):
+        data = self.series(days=7, id=self.books[0].pk)
+        self.assertEqual((data['scope'], data['id']), ('library', 0))
+        self.assertEqual([row['date'] for row in data['series']], [
+            str(self.today - timedelta(days=offset)) for offset in range(6, -1, -1)
+        ])
+        counts = [(row['borrowed'], row['returned'], row['overdue']) for row in data['series']]
+        self.assertEqual(counts, [(0, 0, 0), (0, 2, 0), (0, 0, 0), (0, 0, 0), (0, 0, 0), (0, 0, 0), (3, 0, 0)])
+        self.assertEqual(sum(row['returned'] for row in self.series(days=5)['series']), 0)
+
+    def test_book_and_category_scopes(self):
+        book = self.series(scope='book', id=self.books[1].pk, days=1)
+        self.assertEqual(book['series'], [{'date': str(self.today), 'borrowed': 1, 'returned': 0, 'overdue': 4}])
+        category = self.series(scope='category', id=self.category.pk, days=1)
+        self.assertEqual(category['series'][0]['borrowed'], 3)
+        self.assertEqual(self.series(scope='book', id=0, days=1)['series'][0]['borrowed'], 0)
+
+    def test_day_range_is_clamped(self):
+        self.assertEqual(len(self.series(days=0)['series']), 1)
+        self.assertEqual(len(self.series(days=100000)['series']), dashboard_views.MAX_SERIES_DAYS)
+        self.assertEqual(len(self.series()['series']), 90)
+
+    def test_bad_parameters_are_not_found(self):
+        url = reverse('circulation_series')
+        for params in ({'scope': 'shelf'}, {'days': 'week'}, {'scope': 'book', 'id': 'emma'}):
+            self.assertEqual(self.client.get(url, params).status_code, 404, params)
+
+    def test_students_cannot_read_the_series(self):
+        self.client.force_login(User.objects.create_user('reader'))
+        self.assertEqual(self.client.get(reverse('circulation_series')).status_code, 302)
+
+
+class AllBorrowingsTests(TestCase):
+    def setUp(self):
+        today = timezone.now().date()
+        self.admin = User.objects.create_user('librarian', password='pw', is_staff=True)
+        readers = [User.objects.create_user(f'reader{i}', email=f'r{i}@example.com') for i in range(3)]
+        book = Book.objects.create(title='Dune, Part One', total_copies=3, available_copies=3)
+        self.records = [
+            BorrowRecord.objects.create(student=reader, book=book, due_date=today + timedelta(days=14))
+            for reader in readers
+        ]
+        BorrowRecord.objects.filter(pk=self.records[0].pk).update(status='returned', return_date=today)
+        for days_ago, record in enumerate(self.records):
+            BorrowRecord.objects.filter(pk=record.pk).update(borrow_date=today - timedelta(days=days_ago))
+        self.client.login(username='librarian', password='pw')
+
+    def listing(self, **params):
+        response = self.client.get(reverse('all_borrowings'), params)
+        return response.context['records']
+
+    def test_list_pages_newest_first_by_cursor(self):
+        with mock.patch.object(views, 'ALL_BORROWINGS_PER_PAGE', 2):
+            first = self.listing()
+            self.assertEqual(list(first), self.records[:2])
+            self.assertTrue(first.has_next())
+            second = self.listing(cursor=first.next_cursor)
+        self.assertEqual(list(second), self.records[2:])
+        self.assertFalse(second.has_next())
+        self.assertTrue(second.has_previous())
+
+    def test_list_filters(self):
+        today = timezone.now().date()
+        yesterday = str(today - timedelta(days=1))
+        BorrowRecord.objects.filter(pk=self.records[2].pk).update(due_date=today - timedelta(days=1))
+        first, second, third = self.records
+        for params, expected in (
+            ({'status': 'borrowed'}, [second, third]),
+            ({'status': 'returned'}, [first]),
+            ({'overdue': '1'}, [third]),
+            ({'from': yesterday}, [first, second]),
+            ({'to': yesterday}, [second, third]),
+            ({'from': yesterday, 'to': yesterday}, [second]),
+            ({'status': 'lost', 'from': '2024-13-40'}, self.records),
+        ):
+            self.assertEqual(list(self.listing(**params)), expected, params)
+
+        response = self.client.get(reverse('all_borrowings'), {'status': 'borrowed', 'cursor': 'x'})
+        self.assertEqual(response.context['filter_query'], 'status=borrowed')
+
+    def test_only_unreturned_loans_past_due_are_late(self):
+        past = timezone.now().date() - timedelta(days=1)
+        BorrowRecord.objects.filter(pk__in=[self.records[0].pk, self.records[2].pk]).update(due_date=past)
+        records = self.listing()
+        self.assertEqual([record.is_late for record in records], [False, False, True])
+        response = self.client.get(reverse('all_borrowings'))
+        self.assertContains(response, 'Overdue!', count=1)
+
+    def test_students_cannot_list(self):
+        self.client.force_login(User.objects.get(username='reader0'))
+        self.assertEqual(self.client.get(reverse('all_borrowings')).status_code, 302)
+
+    def export(self, fmt, **params):
+        response = self.client.get(reverse('export_borrowings', args=[fmt]), params)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_has_every_filtered_row_newest_first(self):
+        rows = list(csv.reader(self.export('csv').splitlines()))
+        self.assertEqual(rows[0][:3], ['id', 'student', 'email'])
+        self.assertEqual([int(row[0]) for row in rows[1:]], [record.pk for record in self.records])
+        self.assertEqual(rows[1][1:5], ['reader0', 'r0@example.com', str(self.records[0].book_id), 'Dune, Part One'])
+        self.assertEqual(rows[1][-1], 'returned')
+
+        rows = list(csv.reader(self.export('csv', status='borrowed').splitlines()))
+        self.assertEqual([row[1] for row in rows[1:]], ['reader1', 'reader2'])
+
+    def test_jsonl_rows(self):
+        rows = [json.loads(line) for line in self.export('jsonl', status='returned').splitlines()]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual((rows[0]['student'], rows[0]['status']), ('reader0', 'returned'))
+        self.assertEqual(rows[0]['return_date'], str(timezone.now().date()))
+
+    def test_students_cannot_export(self):
+        self.client.force_login(User.objects.get(username='reader0'))
+        response = self.client.get(reverse('export_borrowings', args=['csv']))
+        self.assertEqual(response.status_code, 302)
+
+
+class ConcurrentBorrowTests(TransactionTestCase):
+    BORROWERS = 200
+    COPIES = 25
+
+    def setUp(self):
+        self.book = Book.objects.create(
+            title='Popular Title', total_copies=self.COPIES, available_copies=self.COPIES,
+        )
+        User.objects.bulk_create(User(username=f'student{i}') for i in range(self.BORROWERS))
+        self.students = list(User.objects.filter(username__startswith='student'))
+
+    def test_parallel_borrowers_never_oversell(self):
+        results = run_in_threads(
+            attempt, [(services.borrow_book, student, self.book) for student in self.students],
+        )
+
+        self.book.refresh_from_db()
+        self.assertEqual(results.count('ok'), self.COPIES)
+        self.assertEqual(results.count('BookUnavailable'), self.BORROWERS - self.COPIES)
+        self.assertEqual(self.book.available_copies, 0)
+        self.assertEqual(BorrowRecord.objects.filter(book=self.book, status='borrowed').count(), self.COPIES)
+
+    def test_parallel_borrow_and_return_keep_counts_consistent(self):
+        holders = self.students[:self.COPIES]
+        records = [services.borrow_book(student, self.book) for student in holders]
+        waiting = self.students[self.COPIES:]
+
+        results = run_in_threads(
+            attempt,
+            [(services.return_book, record) for record in records]
+            + [(services.borrow_book, student, self.book) for student in waiting]
+            + [(services.return_book, record) for record in records],  # duplicate returns
+        )
+
+        self.book.refresh_from_db()
+        active = BorrowRecord.objects.filter(book=self.book, status='borrowed').count()
+        self.assertEqual(results[:self.COPIES].count('ok') + results[-self.COPIES:].count('ok'), self.COPIES)
+        self.assertEqual(self.book.available_copies + active, self.COPIES)
+        self.assertGreaterEqual(self.book.available_copies, 0)
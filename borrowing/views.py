@@ -1,13 +1,23 @@
+import csv
+import itertools
+import json
+
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import BooleanField, ExpressionWrapper, Q
+from django.http import Http404, StreamingHttpResponse
 from django.utils import timezone
-from datetime import timedelta
+from django.utils.dateparse import parse_date
 from books.models import Book
+from books.pagination import KeysetPaginator
+from . import services
 from .models import BorrowRecord
+from .services import MAX_BORROW_LIMIT
 
-
-MAX_BORROW_LIMIT = 5
+ALL_BORROWINGS_PER_PAGE = 50
+EXPORT_CHUNK_SIZE = 2000
 
 
 def is_admin(user):
@@ -19,68 +29,59 @@ def borrow_book(request, pk):
     book = get_object_or_404(Book, pk=pk)
 
     if request.method == 'POST':
-        if book.available_copies <= 0:
-            messages.error(request, 'Sorry, no copies of this book are currently available.')
-            return redirect('book_detail', pk=pk)
-
-        already_borrowed = BorrowRecord.objects.filter(
-            student=request.user, book=book, status='borrowed'
-        ).exists()
-        if already_borrowed:
-            messages.warning(request, 'You already have this book borrowed.')
-            return redirect('book_detail', pk=pk)
-
-        active_count = BorrowRecord.objects.filter(
-            student=request.user, status='borrowed'
-        ).count()
-        if active_count >= MAX_BORROW_LIMIT:
-            messages.error(
-                request,
-                f'You have reached the maximum limit of {MAX_BORROW_LIMIT} borrowed books. '
-                'Please return a book before borrowing another.'
+        try:
+            record = services.borrow_book(request.user, book)
+        except services.BorrowError as exc:
+            getattr(messages, exc.level)(request, str(exc))
+        else:
+            messages.success(
+                request, f'You have borrowed "{book.title}". Please return it by {record.due_date}.'
             )
-            return redirect('book_detail', pk=pk)
-
-        due = timezone.now().date() + timedelta(days=14)
-        BorrowRecord.objects.create(student=request.user, book=book, due_date=due)
-        book.available_copies -= 1
-        book.save()
-        messages.success(request, f'You have borrowed "{book.title}". Please return it by {due}.')
 
     return redirect('book_detail', pk=pk)
 
 
 @login_required
 def return_book(request, pk):
-    record = get_object_or_404(BorrowRecord, pk=pk, student=request.user, status='borrowed')
+    record = get_object_or_404(
+        BorrowRecord.objects.select_related('book'), pk=pk, student=request.user, status='borrowed'
+    )
 
     if request.method == 'POST':
-        record.return_date = timezone.now().date()
-        record.status = 'returned'
-        record.save()
-        record.book.available_copies += 1
-        record.book.save()
-        messages.success(request, f'You have returned "{record.book.title}". Thank you!')
+        try:
+            services.return_book(record)
+        except services.BorrowError as exc:
+            getattr(messages, exc.level)(request, str(exc))
+        else:
+            messages.success(request, f'You have returned "{record.book.title}". Thank you!')
 
-    return redirect('book_detail', pk=record.book.pk)
+    return redirect('book_detail', pk=record.book_id)
 
 
-@login_required
-def my_borrowings(request):
+def _student_records(student, status=''):
     records = BorrowRecord.objects.filter(
-        student=request.user
+        student=student
     ).select_related('book__author').order_by('-borrow_date')
-    status_filter = request.GET.get('status', '')
-    if status_filter in ('borrowed', 'returned'):
-        records = records.filter(status=status_filter)
+    if status in ('borrowed', 'returned'):
+        records = records.filter(status=status)
+    return records
+
+
+def _active_loans(student):
+    return BorrowRecord.objects.filter(
+        student=student, status='borrowed'
+    ).select_related('book__author', 'book__category').order_by('due_date')
+
+
+@login_required
+def my_borrowings(request):
+    records = _student_records(request.user, request.GET.get('status', ''))
     return render(request, 'borrowing/my_borrowings.html', {'records': records})
 
 
 @login_required
 def my_books(request):
-    active = BorrowRecord.objects.filter(
-        student=request.user, status='borrowed'
-    ).select_related('book__author', 'book__category').order_by('due_date')
+    active = _active_loans(request.user)
     today = timezone.now().date()
     return render(request, 'borrowing/my_books.html', {
         'active': active,
@@ -89,15 +90,94 @@ def my_books(request):
     })
 
 
+def _filtered_records(request, today):
+    filters = {
+        'status': request.GET.get('status', ''),
+        'overdue': request.GET.get('overdue', '') == '1',
+        'date_from': _parse_date(request.GET.get('from', '')),
+        'date_to': _parse_date(request.GET.get('to', '')),
+    }
+    records = BorrowRecord.objects.all()
+    if filters['overdue']:
+        records = records.filter(status='borrowed', due_date__lt=today)
+    elif filters['status'] in ('borrowed', 'returned'):
+        records = records.filter(status=filters['status'])
+    else:
+        filters['status'] = ''
+    if filters['date_from']:
+        records = records.filter(borrow_date__gte=filters['date_from'])
+    if filters['date_to']:
+        records = records.filter(borrow_date__lte=filters['date_to'])
+    return records, filters
+
+
+def _parse_date(value):
+    try:
+        return parse_date(value)
+    except ValueError:
+        return None
+
+
+def _borrowings_paginator(records, today):
+    records = records.select_related('student', 'book').annotate(
+        is_late=ExpressionWrapper(Q(status='borrowed', due_date__lt=today), output_field=BooleanField()),
+    )
+    return KeysetPaginator(records, ('-borrow_date', '-id'), ALL_BORROWINGS_PER_PAGE)
+
+
 @user_passes_test(is_admin)
 def all_borrowings(request):
-    records = BorrowRecord.objects.select_related('student', 'book').order_by('-borrow_date')
-    status_filter = request.GET.get('status', '')
-    if status_filter in ('borrowed', 'returned'):
-        records = records.filter(status=status_filter)
     today = timezone.now().date()
+    records, filters = _filtered_records(request, today)
+    page_obj = _borrowings_paginator(records, today).get_page(request.GET.get('cursor'))
+
+    query = request.GET.copy()
+    query.pop('cursor', None)
     return render(request, 'borrowing/all_borrowings.html', {
-        'records': records,
-        'status_filter': status_filter,
+        'records': page_obj,
+        'status_filter': filters['status'],
+        'filters': filters,
+        'filter_query': query.urlencode(),
         'today': today,
     })
+
+
+class Echo:
+    """File-like object whose write() just hands the value back, for streaming."""
+
+    def write(self, value):
+        return value
+
+
+EXPORT_FIELDS = (
+    'id', 'student__username', 'student__email', 'book_id', 'book__title',
+    'borrow_date', 'due_date', 'return_date', 'status',
+)
+EXPORT_HEADERS = (
+    'id', 'student', 'email', 'book_id', 'book',
+    'borrow_date', 'due_date', 'return_date', 'status',
+)
+
+
+def _export_rows(records):
+    return records.order_by('-borrow_date', '-id').values_list(*EXPORT_FIELDS)
+
+
+@user_passes_test(is_admin)
+def export_borrowings(request, fmt):
+    if fmt not in ('csv', 'jsonl'):
+        raise Http404('Unknown export format.')
+    records, _ = _filtered_records(request, timezone.now().date())
+    rows = _export_rows(records).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+    if fmt == 'jsonl':
+        lines = (
+            json.dumps(dict(zip(EXPORT_HEADERS, row)), cls=DjangoJSONEncoder) + '\n' for row in rows
+        )
+        response = StreamingHttpResponse(lines, content_type='application/x-ndjson')
+    else:
+        writer = csv.writer(Echo())
+        lines = itertools.chain([writer.writerow(EXPORT_HEADERS)], (writer.writerow(row) for row in rows))
+        response = StreamingHttpResponse(lines, content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="borrowings.{fmt}"'
+    return response
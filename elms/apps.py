@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class ElmsConfig(AppConfig):
+    name = 'elms'
+
+    def ready(self):
+        import elms.database  # noqa: F401 — register signals
+        import elms.homepage  # noqa: F401 — register signals
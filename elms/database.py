@@ -0,0 +1,23 @@
+"""
+Per-connection SQLite setup.
+
+A database entry may carry a ``PRAGMAS`` mapping (see ``SQLITE_PRODUCTION``
+in settings); each pair is applied with ``PRAGMA name = value`` as soon as
+Django opens the connection, so persistent and fresh connections behave
+the same.
+"""
+
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+@receiver(connection_created)
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = connection.settings_dict.get('PRAGMAS')
+    if not pragmas:
+        return
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
@@ -0,0 +1,166 @@
+"""
+Management command: python manage.py benchmark_sqlite
+
+Measures mixed read/borrow throughput under the development and production
+SQLite profiles (see DB_PROFILE in settings), each on a fresh copy of the
+same scratch database so the real one is never touched.
+
+Worker processes behave like request handlers (e.g. gunicorn workers):
+connections are opened, reused or closed around every operation exactly as
+request_started and request_finished do. An operation either reads a
+student's state for a book (the book_detail personal-slots query) or
+borrows/returns a copy through the circulation services.
+"""
+
+import multiprocessing
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from io import StringIO
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, close_old_connections, connection, connections
+
+from books import detail_cache
+from books.models import Author, Book, Category
+from borrowing import services
+from borrowing.models import BorrowRecord
+
+DEVELOPMENT = {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False, 'OPTIONS': {}, 'PRAGMAS': {}}
+
+
+def percentile(samples, pct):
+    if len(samples) < 2:
+        return samples[0] if samples else 0.0
+    return statistics.quantiles(samples, n=100)[pct - 1]
+
+
+def circulate(rng, student, books):
+    record = BorrowRecord.objects.filter(student=student, status='borrowed').select_related('book').first()
+    if record is None:
+        services.borrow_book(student, rng.choice(books))
+    else:
+        services.return_book(record)
+
+
+def worker(index, start, seconds, write_ratio):
+    """One simulated request handler; returns its latencies and lock errors."""
+    rng = random.Random(index)
+    books = list(Book.objects.all())
+    students = list(User.objects.filter(is_staff=False))
+    connection.close()
+    stats = {'reads': [], 'writes': [], 'locked': 0}
+    time.sleep(max(start - time.time(), 0))
+    try:
+        while time.time() < start + seconds:
+            key = 'writes' if rng.random() < write_ratio else 'reads'
+            student = rng.choice(students)
+            close_old_connections()
+            started = time.perf_counter()
+            try:
+                if key == 'writes':
+                    circulate(rng, student, books)
+                else:
+                    detail_cache.personal_state(student, rng.choice(books).pk)
+            except services.BorrowError:
+                pass
+            except OperationalError:  # "database is locked"
+                stats['locked'] += 1
+                continue
+            finally:
+                close_old_connections()
+            stats[key].append(time.perf_counter() - started)
+    finally:
+        connection.close()
+    return stats
+
+
+class Command(BaseCommand):
+    help = 'Compare mixed read/borrow throughput under the development and production SQLite profiles.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8,
+                            help='Concurrent worker processes (default: 8).')
+        parser.add_argument('--seconds', type=float, default=5.0,
+                            help='Run time per profile (default: 5).')
+        parser.add_argument('--write-ratio', type=float, default=0.2,
+                            help='Share of operations that borrow or return (default: 0.2).')
+        parser.add_argument('--books', type=int, default=200,
+                            help='Books in the scratch catalog (default: 200).')
+        parser.add_argument('--students', type=int, default=200,
+                            help='Students in the scratch database (default: 200).')
+
+    def handle(self, *args, **options):
+        database = connections.settings['default']
+        if database['ENGINE'] != 'django.db.backends.sqlite3':
+            raise CommandError('benchmark_sqlite needs the default database to be SQLite.')
+        original = dict(database)
+        workdir = Path(tempfile.mkdtemp(prefix='elms-benchmark-'))
+        results = {}
+        try:
+            template = workdir / 'template.sqlite3'
+            self.use(database, template, DEVELOPMENT)
+            call_command('migrate', verbosity=0)
+            self.seed(options['books'], options['students'])
+            for name, profile in (('development', DEVELOPMENT), ('production', settings.SQLITE_PRODUCTION)):
+                path = workdir / f'{name}.sqlite3'
+                connections.close_all()
+                shutil.copy(template, path)
+                self.use(database, path, profile)
+                results[name] = self.run(options)
+        finally:
+            connections.close_all()
+            database.clear()
+            database.update(original)
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        self.report(results, options['seconds'])
+
+    def use(self, database, path, profile):
+        connections.close_all()
+        database.update(NAME=str(path), **{key: value for key, value in profile.items()})
+
+    def seed(self, book_count, student_count):
+        authors = Author.objects.bulk_create(Author(name=f'Author {i}') for i in range(20))
+        categories = Category.objects.bulk_create(Category(name=f'Category {i}') for i in range(10))
+        Book.objects.bulk_create(
+            Book(title=f'Book {i}', author=authors[i % len(authors)], category=categories[i % len(categories)],
+                 total_copies=3, available_copies=3)
+            for i in range(book_count)
+        )
+        User.objects.bulk_create(User(username=f'student{i}') for i in range(student_count))
+        call_command('reconcile_book_counts', stdout=StringIO())
+
+    def run(self, options):
+        connections.close_all()  # children must not share the parent's handle
+        start = time.time() + 1
+        args = [(i, start, options['seconds'], options['write_ratio']) for i in range(options['workers'])]
+        with multiprocessing.get_context('fork').Pool(options['workers']) as pool:
+            samples = pool.starmap(worker, args)
+        return {
+            key: [value for stats in samples for value in stats[key]] for key in ('reads', 'writes')
+        } | {'locked': sum(stats['locked'] for stats in samples)}
+
+    def report(self, results, seconds):
+        self.stdout.write(
+            f'{"profile":<12} {"ops/s":>8} {"reads/s":>8} {"writes/s":>9} '
+            f'{"read p95":>9} {"write p95":>10} {"locked":>7}'
+        )
+        for name, result in results.items():
+            reads, writes = result['reads'], result['writes']
+            self.stdout.write(
+                f'{name:<12} {(len(reads) + len(writes)) / seconds:>8.0f} {len(reads) / seconds:>8.0f} '
+                f'{len(writes) / seconds:>9.0f} {percentile(reads, 95) * 1000:>7.1f}ms '
+                f'{percentile(writes, 95) * 1000:>8.1f}ms {result["locked"]:>7}'
+            )
+        before, after = (len(results[name]['reads']) + len(results[name]['writes']) for name in results)
+        if before:
+            self.stdout.write(self.style.SUCCESS(
+                f'Production profile: {after / before:.2f}x the development throughput.'
+            ))
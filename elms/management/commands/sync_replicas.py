@@ -0,0 +1,58 @@
+"""
+Management command: python manage.py sync_replicas
+
+Copies the primary SQLite database onto every alias in DATABASE_REPLICAS
+with SQLite's online backup API, so the copy is consistent even while the
+site is writing. With --interval it keeps doing so every N seconds, which
+gives a local replica with roughly that much lag. The interval must be
+shorter than REPLICA_STICKY_SECONDS, or a session could leave its sticky
+window and read a replica that does not have its own write yet.
+"""
+
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = 'Refresh the SQLite read replicas from the primary database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Repeat every this many seconds until interrupted (default: once); '
+                                 'must be shorter than REPLICA_STICKY_SECONDS.')
+
+    def handle(self, *args, **options):
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError('No replicas configured; set ELMS_DB_REPLICA.')
+        aliases = [DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS]
+        if any(connections[alias].vendor != 'sqlite' for alias in aliases):
+            raise CommandError('sync_replicas only copies SQLite databases; use real replication elsewhere.')
+        if options['interval'] >= settings.REPLICA_STICKY_SECONDS:
+            raise CommandError(
+                f'--interval must be shorter than REPLICA_STICKY_SECONDS ({settings.REPLICA_STICKY_SECONDS}s), '
+                f'or sessions read replicas that miss their own writes.'
+            )
+
+        while True:
+            started = time.perf_counter()
+            self.sync()
+            self.stdout.write(self.style.SUCCESS(
+                f'Synced {len(settings.DATABASE_REPLICAS)} replica(s) in {time.perf_counter() - started:.2f}s.'
+            ))
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    def sync(self):
+        primary = connections[DEFAULT_DB_ALIAS]
+        primary.ensure_connection()
+        for alias in settings.DATABASE_REPLICAS:
+            target = sqlite3.connect(connections[alias].settings_dict['NAME'])
+            try:
+                primary.connection.backup(target)
+            finally:
+                target.close()
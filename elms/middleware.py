@@ -0,0 +1,29 @@
+import time
+
+from django.conf import settings
+
+from .routers import replica_reads, track_writes
+
+STICKY_SESSION_KEY = '_primary_db_until'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class ReplicaReadMiddleware:
+    """
+    Serve safe requests from the read replicas, except for
+    ``REPLICA_STICKY_SECONDS`` after the same session last wrote to the
+    primary, so users always see their own borrows, returns and reviews.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+        sticky = request.session.get(STICKY_SESSION_KEY, 0) > time.time()
+        with replica_reads(request.method in SAFE_METHODS and not sticky), track_writes() as state:
+            response = self.get_response(request)
+        if state['wrote']:
+            request.session[STICKY_SESSION_KEY] = time.time() + settings.REPLICA_STICKY_SECONDS
+        return response
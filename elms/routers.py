@@ -0,0 +1,86 @@
+"""
+Read/write split between the primary database and its read replicas.
+
+Reads of catalog and review models may go to a random alias from
+``DATABASE_REPLICAS``; every write, every other app and anything inside a
+transaction stays on ``default``. Replica reads are opt-in per context:
+``ReplicaReadMiddleware`` turns them on only for safe requests outside the
+session's sticky-after-write window, so management commands, POSTs and a
+user's own follow-up pages after a borrow, return or review all read the
+primary.
+
+A shared cache may be filled from a replica only if its key carries the
+catalog version of the database the fill read (``books.facets``,
+``books.result_cache``): an entry from a lagging replica then sits under
+that replica's older version and is never served to a request that has seen
+a newer one. Fills without such a key run under ``primary_reads()`` or
+check that the replica has caught up first (``elms.homepage``); otherwise
+a stale fill, made just after the invalidating write, would outlive the
+replica's lag.
+"""
+
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA_APPS = {'books', 'reviews'}
+
+_replica_reads = ContextVar('replica_reads', default=False)
+_wrote = ContextVar('wrote', default=False)
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    """Allow (or forbid) replica reads in the enclosed code; also usable as a decorator."""
+    token = _replica_reads.set(enabled)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def primary_reads():
+    return replica_reads(False)
+
+
+@contextmanager
+def track_writes():
+    """Yield a dict whose ``wrote`` key says whether the enclosed code wrote."""
+    token = _wrote.set(False)
+    state = {}
+    try:
+        yield state
+    finally:
+        state['wrote'] = _wrote.get()
+        _wrote.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if (
+            not settings.DATABASE_REPLICAS
+            or not _replica_reads.get()
+            or model._meta.app_label not in REPLICA_APPS
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        _wrote.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        pool = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in pool and obj2._state.db in pool:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Replicas are copies of the primary, never migrated on their own.
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -37,6 +38,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'elms',
     'accounts',
     'books',
     'borrowing',
@@ -49,6 +51,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'elms.middleware.ReplicaReadMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -76,13 +79,72 @@ WSGI_APPLICATION = 'elms.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# ELMS_DB_PROFILE=production selects the production SQLite profile: WAL and
+# the PRAGMAS below (applied per connection by elms/database.py), IMMEDIATE
+# write transactions, and persistent connections with health checks.
+
+DB_PROFILE = os.environ.get('ELMS_DB_PROFILE', 'development')
+
+SQLITE_PRODUCTION = {
+    'CONN_MAX_AGE': 600,
+    'CONN_HEALTH_CHECKS': True,
+    'OPTIONS': {'transaction_mode': 'IMMEDIATE'},
+    'PRAGMAS': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -64 * 1024,  # KiB
+        'busy_timeout': 5000,  # ms
+    },
+}
+
+# A replica is only read: its transactions stay deferred, since IMMEDIATE
+# would take the write lock sync_replicas needs, and journal_mode and
+# synchronous are left to whoever writes the file. query_only turns a stray
+# write into an error instead of a silent divergence from the primary.
+
+SQLITE_REPLICA = {
+    'PRAGMAS': {'query_only': 'ON'},
+}
+
+SQLITE_PRODUCTION_REPLICA = {
+    'CONN_MAX_AGE': 600,
+    'CONN_HEALTH_CHECKS': True,
+    'PRAGMAS': {
+        'query_only': 'ON',
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -64 * 1024,  # KiB
+        'busy_timeout': 5000,  # ms, while sync_replicas copies the primary in
+    },
+}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        **(SQLITE_PRODUCTION if DB_PROFILE == 'production' else {}),
     }
 }
 
+# Read replicas (see elms/routers.py). ELMS_DB_REPLICA=/path/to/copy.sqlite3
+# adds a 'replica' alias for catalog and review reads; refresh it from the
+# primary with ``python manage.py sync_replicas [--interval SECONDS]``.
+# After a write, a session reads only the primary for REPLICA_STICKY_SECONDS,
+# which must therefore exceed the sync interval (sync_replicas checks).
+
+DATABASE_ROUTERS = ['elms.routers.ReplicaRouter']
+DATABASE_REPLICAS = []
+REPLICA_STICKY_SECONDS = 15
+
+if os.environ.get('ELMS_DB_REPLICA'):
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ['ELMS_DB_REPLICA'],
+        **(SQLITE_PRODUCTION_REPLICA if DB_PROFILE == 'production' else SQLITE_REPLICA),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append('replica')
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -131,3 +193,38 @@ LOGIN_URL = '/accounts/login/'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Catalog listing
+# Cursor pagination skips OFFSET scans on deep pages; the exact result count
+# is then optional and cached per (query, category) for the given seconds.
+
+BOOK_LIST_CURSOR_PAGINATION = False
+BOOK_LIST_EXACT_COUNT = True
+BOOK_LIST_COUNT_CACHE_TIMEOUT = 300
+
+# Home page snapshot (see elms/homepage.py)
+
+HOMEPAGE_SNAPSHOT_TTL = 600
+HOMEPAGE_REBUILD_DEBOUNCE = 30
+
+# Staff dashboard (see books/dashboard.py)
+
+DASHBOARD_CACHE_SECONDS = 3600
+DASHBOARD_STALENESS_SECONDS = 60
+
+# In-process autocomplete and fuzzy indexes: how often a background check
+# for renamed books and authors may run (see books/catalog.py)
+
+SEARCH_INDEX_CHECK_SECONDS = 30
+
+# Result pages cached per process (see books/result_cache.py)
+
+BOOK_LIST_RESULT_CACHE_SIZE = 512
+
+# Book detail fragments (see books/detail_cache.py)
+
+BOOK_DETAIL_CACHE_SECONDS = 600
+
+# Large-table admin changelists (see books/admin_tools.py)
+
+ADMIN_COUNT_CACHE_SECONDS = 300
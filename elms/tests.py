@@ -0,0 +1,168 @@
+import sqlite3
+import tempfile
+from io import StringIO
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, connections
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from books import result_cache
+from books.models import Book
+from borrowing.models import BorrowRecord
+from reviews.models import Review
+from . import homepage
+from .middleware import STICKY_SESSION_KEY
+from .routers import ReplicaRouter, primary_reads, replica_reads
+
+
+class HomepageSnapshotTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        Book.objects.create(title='Dune')
+
+    def recent_titles(self):
+        return [book.title for book in self.client.get('/').context['recent_books']]
+
+    def test_steady_state_hit_costs_no_sql(self):
+        self.client.get('/')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/').status_code, 200)
+
+    def test_rebuild_waits_for_the_debounce(self):
+        self.assertEqual(self.recent_titles(), ['Dune'])
+        Book.objects.create(title='Emma')
+        with override_settings(HOMEPAGE_REBUILD_DEBOUNCE=3600):
+            self.assertEqual(self.recent_titles(), ['Dune'])
+        with override_settings(HOMEPAGE_REBUILD_DEBOUNCE=0):
+            self.assertEqual(self.recent_titles(), ['Emma', 'Dune'])
+
+    def test_login_does_not_mark_the_snapshot_stale(self):
+        User.objects.create_user('reader', password='pw')
+        homepage.build_snapshot()
+        self.assertTrue(self.client.login(username='reader', password='pw'))
+        self.assertIsNone(cache.get(homepage.STALE_KEY))
+        User.objects.create_user('another')
+        self.assertTrue(cache.get(homepage.STALE_KEY))
+
+
+class SqliteProfileTests(SimpleTestCase):
+    def open(self, profile):
+        """A connection to a scratch database file configured with ``profile``."""
+        workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(workdir.cleanup)
+        path = Path(workdir.name) / 'profile.sqlite3'
+        with sqlite3.connect(path) as setup:
+            setup.execute('CREATE TABLE shelf (title TEXT)')
+        setup.close()
+        wrapper = DatabaseWrapper(
+            {**connection.settings_dict, 'NAME': str(path), 'OPTIONS': {}, 'PRAGMAS': {}, **profile}, 'profile',
+        )
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def pragma(self, wrapper, name):
+        with wrapper.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_production_pragmas_are_applied(self):
+        primary = self.open(settings.SQLITE_PRODUCTION)
+        self.assertEqual(self.pragma(primary, 'journal_mode'), 'wal')
+        self.assertEqual(self.pragma(primary, 'busy_timeout'), 5000)
+        self.assertEqual(self.pragma(primary, 'synchronous'), 1)  # NORMAL
+        self.assertEqual(primary.transaction_mode, 'IMMEDIATE')
+
+    def test_replica_profile_only_reads(self):
+        replica = self.open(settings.SQLITE_PRODUCTION_REPLICA)
+        self.assertEqual(self.pragma(replica, 'journal_mode'), 'delete')
+        self.assertEqual(self.pragma(replica, 'busy_timeout'), 5000)
+        self.assertIsNone(replica.transaction_mode)
+        with replica.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM shelf')
+            with self.assertRaises(OperationalError):
+                cursor.execute("INSERT INTO shelf VALUES ('Dune')")
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRouterTests(SimpleTestCase):
+    def test_only_catalog_reads_in_replica_context_leave_the_primary(self):
+        router = ReplicaRouter()
+        self.assertEqual(router.db_for_read(Book), 'default')
+        with replica_reads():
+            self.assertEqual(router.db_for_read(Book), 'replica')
+            self.assertEqual(router.db_for_read(Review), 'replica')
+            self.assertEqual(router.db_for_read(BorrowRecord), 'default')
+            self.assertEqual(router.db_for_write(Book), 'default')
+            with primary_reads():
+                self.assertEqual(router.db_for_read(Book), 'default')
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaReadTests(TransactionTestCase):
+    """Requests through ReplicaReadMiddleware, with a replica file that sync_replicas fills."""
+
+    @classmethod
+    def setUpClass(cls):
+        workdir = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(workdir.cleanup)
+        connections.settings['replica'] = {
+            **connection.settings_dict, **settings.SQLITE_REPLICA,
+            'NAME': str(Path(workdir.name) / 'replica.sqlite3'),
+            'TEST': {**connection.settings_dict['TEST'], 'MIRROR': 'default'},  # never flushed
+        }
+        cls.addClassCleanup(cls.remove_replica)
+        cls.databases = {'default', 'replica'}  # the runner only sets up aliases in DATABASES
+        super().setUpClass()
+
+    @staticmethod
+    def remove_replica():
+        if hasattr(connections._connections, 'replica'):
+            connections['replica'].close()
+            del connections['replica']
+        del connections.settings['replica']
+
+    def setUp(self):
+        cache.clear()
+        result_cache.results.clear()
+        User.objects.create_user('reader', password='pw')
+        self.dune = Book.objects.create(title='Dune', total_copies=1, available_copies=1)
+        call_command('sync_replicas', stdout=StringIO())
+        Book.objects.create(title='Emma')  # not on the replica until the next sync
+
+    def titles(self):
+        with CaptureQueriesContext(connection) as primary:
+            response = self.client.get(reverse('book_list'))
+        self.assertFalse([query for query in primary if 'books_book' in query['sql']])
+        return [book.title for book in response.context['books']]
+
+    def test_get_reads_the_replica(self):
+        self.assertEqual(self.titles(), ['Dune'])
+        self.client.login(username='reader', password='pw')
+        response = self.client.get('/')  # the snapshot is built on the primary while the replica lags
+        self.assertEqual([book.title for book in response.context['recent_books']], ['Emma', 'Dune'])
+
+    def test_session_reads_the_primary_after_its_write(self):
+        self.client.force_login(User.objects.get(username='reader'))
+        self.assertEqual(self.titles(), ['Dune'])
+
+        self.client.post(reverse('borrow_book', args=[self.dune.pk]))
+        self.assertIn(STICKY_SESSION_KEY, self.client.session)
+        response = self.client.get(reverse('book_list'))
+        self.assertEqual([book.title for book in response.context['books']], ['Emma', 'Dune'])
+
+        call_command('sync_replicas', stdout=StringIO())
+        session = self.client.session
+        session[STICKY_SESSION_KEY] = 0
+        session.save()
+        self.assertEqual(self.titles(), ['Emma', 'Dune'])
+
+    def test_sync_interval_must_fit_in_the_sticky_window(self):
+        with self.assertRaisesMessage(CommandError, 'REPLICA_STICKY_SECONDS'):
+            call_command('sync_replicas', interval=settings.REPLICA_STICKY_SECONDS, stdout=StringIO())
@@ -1,9 +1,7 @@
 from django import forms
 from django.shortcuts import render, redirect
 from django.contrib import messages
-from django.db.models import Avg
-from django.contrib.auth.models import User
-from books.models import Book, Author
+from elms.homepage import get_snapshot
 
 
 class ContactForm(forms.Form):
@@ -14,22 +12,11 @@ class ContactForm(forms.Form):
 
 
 def home(request):
-    recent_books = Book.objects.select_related('author', 'category').order_by('-created_at')[:6]
-    top_rated = (
-        Book.objects.annotate(avg_rating=Avg('reviews__rating'))
-        .filter(avg_rating__isnull=False)
-        .select_related('author')
-        .order_by('-avg_rating')[:3]
-    )
-    stats = {
-        'total_books': Book.objects.count(),
-        'total_authors': Author.objects.count(),
-        'total_students': User.objects.filter(is_staff=False, is_superuser=False).count(),
-    }
+    snapshot = get_snapshot()
     return render(request, 'home.html', {
-        'recent_books': recent_books,
-        'top_rated': top_rated,
-        'stats': stats,
+        'recent_books': snapshot['recent_books'],
+        'top_rated': snapshot['top_rated'],
+        'stats': snapshot['stats'],
     })
 
 
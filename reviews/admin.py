@@ -1,16 +1,18 @@
 from django.contrib import admin
 from django.utils.html import format_html
+from books.admin_tools import LargeTableAdminMixin
 from .models import Review
 
 
 @admin.register(Review)
-class ReviewAdmin(admin.ModelAdmin):
+class ReviewAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display       = ('student', 'book', 'star_display', 'comment_preview', 'created_at')
     list_display_links = ('student', 'book')
     list_filter        = ('rating', 'created_at')
     search_fields      = ('student__username', 'student__email',
                           'book__title', 'comment')
     readonly_fields    = ('created_at', 'star_display')
+    list_select_related = ('student', 'book')
     list_per_page      = 25
     date_hierarchy     = 'created_at'
     fieldsets = (
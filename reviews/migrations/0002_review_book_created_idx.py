@@ -0,0 +1,20 @@
+# Generated by Django 5.2.8 on 2026-10-18 02:46
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0007_book_rating_histogram'),
+        ('reviews', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['book', '-created_at', '-id'], name='review_book_created_idx'),
+        ),
+    ]
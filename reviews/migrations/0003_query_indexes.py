@@ -0,0 +1,20 @@
+# Generated by Django 5.2.8 on 2026-10-18 03:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0010_query_indexes'),
+        ('reviews', '0002_review_book_created_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['created_at'], name='review_created_idx'),
+        ),
+    ]
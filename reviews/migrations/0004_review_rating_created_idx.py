@@ -0,0 +1,20 @@
+# Generated by Django 5.2.8 on 2026-10-18 04:03
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0011_catalog_version'),
+        ('reviews', '0003_query_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['rating', '-created_at', '-id'], name='review_rating_created_idx'),
+        ),
+    ]
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from books.models import Book
 
@@ -15,6 +15,17 @@ class Review(models.Model):
     def __str__(self):
         return f'{self.student.username} - {self.book.title} ({self.rating}/5)'
 
+    def save(self, *args, **kwargs):
+        # The rating signals read the old row and adjust the book's aggregates;
+        # both must happen in the same transaction as the write itself.
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+
     class Meta:
         unique_together = ('student', 'book')
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['book', '-created_at', '-id'], name='review_book_created_idx'),
+            models.Index(fields=['created_at'], name='review_created_idx'),
+            models.Index(fields=['rating', '-created_at', '-id'], name='review_rating_created_idx'),
+        ]
@@ -0,0 +1,39 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from books.models import Book
+from .models import Review
+
+
+# ── Keep Book rating aggregates in sync ───────────────────────────────────────
+
+@receiver(pre_save, sender=Review)
+def remember_previous_rating(sender, instance, raw=False, using=None, **kwargs):
+    instance._previous_rating = None
+    if instance.pk and not raw:
+        # Locked until the save commits, so concurrent edits apply one after the other.
+        instance._previous_rating = (
+            Review.objects.using(using).select_for_update()
+            .filter(pk=instance.pk).values_list('book_id', 'rating').first()
+        )
+
+
+@receiver(post_save, sender=Review)
+def apply_rating(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous_rating', None)
+    if previous is None:
+        Book.adjust_rating(instance.book_id, added=instance.rating)
+        return
+    old_book_id, old_rating = previous
+    if old_book_id != instance.book_id:
+        Book.adjust_rating(old_book_id, removed=old_rating)
+        Book.adjust_rating(instance.book_id, added=instance.rating)
+    elif old_rating != instance.rating:
+        Book.adjust_rating(instance.book_id, added=instance.rating, removed=old_rating)
+
+
+@receiver(post_delete, sender=Review)
+def remove_rating(sender, instance, **kwargs):
+    Book.adjust_rating(instance.book_id, removed=instance.rating)
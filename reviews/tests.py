@@ -1,3 +1,116 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.forms import model_to_dict
 from django.test import TestCase
+from django.urls import reverse
+
+from books.admin import BookAdmin
+from books.forms import BookForm
+from books.models import Author, Book, Category
+from .models import Review
+
+
+class RatingAggregateTests(TestCase):
+    def setUp(self):
+        self.dune = Book.objects.create(
+            title='Dune', author=Author.objects.create(name='Frank Herbert'),
+            category=Category.objects.create(name='Science Fiction'),
+        )
+        self.emma = Book.objects.create(title='Emma')
+        self.readers = [User.objects.create_user(f'reader{i}') for i in range(3)]
+
+    def assertAggregates(self, book, count, average, histogram):
+        book = Book.objects.get(pk=book.pk)
+        self.assertEqual((book.rating_count, book.avg_rating), (count, average))
+        self.assertEqual([count for _, count, _ in book.rating_histogram], histogram)
+
+    def test_create_edit_move_and_delete(self):
+        first = Review.objects.create(student=self.readers[0], book=self.dune, rating=5)
+        Review.objects.create(student=self.readers[1], book=self.dune, rating=2)
+        self.assertAggregates(self.dune, 2, 3.5, [1, 0, 0, 1, 0])
+
+        first.rating = 4
+        first.save()
+        self.assertAggregates(self.dune, 2, 3.0, [0, 1, 0, 1, 0])
+
+        first.book = self.emma
+        first.save()
+        self.assertAggregates(self.dune, 1, 2.0, [0, 0, 0, 1, 0])
+        self.assertAggregates(self.emma, 1, 4.0, [0, 1, 0, 0, 0])
+
+        first.delete()
+        Review.objects.get().delete()
+        self.assertAggregates(self.dune, 0, 0.0, [0, 0, 0, 0, 0])
+        self.assertAggregates(self.emma, 0, 0.0, [0, 0, 0, 0, 0])
+
+    def test_book_edit_keeps_ratings_added_meanwhile(self):
+        loaded = Book.objects.get(pk=self.dune.pk)
+        Review.objects.create(student=self.readers[2], book=self.dune, rating=3)
+
+        data = {key: value for key, value in model_to_dict(loaded, BookForm._meta.fields).items() if value}
+        form = BookForm({**data, 'title': 'Dune Messiah'}, instance=loaded)
+        self.assertTrue(form.is_valid(), form.errors)
+        form.save()
+
+        self.assertEqual(Book.objects.get(pk=self.dune.pk).title, 'Dune Messiah')
+        self.assertAggregates(self.dune, 1, 3.0, [0, 0, 1, 0, 0])
+
+    def test_admin_edit_keeps_ratings_added_meanwhile(self):
+        self.client.force_login(User.objects.create_superuser('admin'))
+        save_form = BookAdmin.save_form
+
+        def review_meanwhile(model_admin, request, form, change):
+            Review.objects.create(student=self.readers[0], book=self.dune, rating=4)
+            return save_form(model_admin, request, form, change)
+
+        data = {
+            'title': 'Dune Messiah', 'author': self.dune.author_id, 'category': self.dune.category_id,
+            'language': 'English', 'total_copies': 1, 'available_copies': 1,
+        }
+        with mock.patch.object(BookAdmin, 'save_form', review_meanwhile):
+            response = self.client.post(reverse('admin:books_book_change', args=[self.dune.pk]), data)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Book.objects.get(pk=self.dune.pk).title, 'Dune Messiah')
+        self.assertAggregates(self.dune, 1, 4.0, [0, 1, 0, 0, 0])
+
+
+class ReviewFeedTests(TestCase):
+    def setUp(self):
+        book = Book.objects.create(title='Dune')
+        self.reviews = [
+            Review.objects.create(student=User.objects.create_user(f'reader{i}'), book=book, rating=5, comment=f'#{i}')
+            for i in range(3)
+        ]
+        self.url = reverse('review_feed')
+
+    def revalidate(self, response, **params):
+        return self.client.get(self.url, params, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_unchanged_feed_is_a_304_without_scanning_reviews(self):
+        response = self.client.get(self.url, {'rating': 5})
+        self.assertEqual(len(response.json()['results']), 3)
+        self.assertIn('Last-Modified', response)
+        with self.assertNumQueries(1):  # the catalog version
+            self.assertEqual(self.revalidate(response, rating=5).status_code, 304)
+        self.assertEqual(self.revalidate(response, rating=4).status_code, 200)
+
+    def test_edits_and_deletes_change_the_validators(self):
+        response = self.client.get(self.url)
+        review = self.reviews[0]
+        review.comment = 'Edited'
+        review.save()
+        edited = self.revalidate(response)
+        self.assertEqual(edited.status_code, 200)
+        self.assertIn('Edited', [row['comment'] for row in edited.json()['results']])
+        self.assertEqual(self.revalidate(edited).status_code, 304)
+
+        review.delete()
+        deleted = self.revalidate(edited)
+        self.assertEqual(deleted.status_code, 200)
+        self.assertEqual(len(deleted.json()['results']), 2)
 
-# Create your tests here.
+    def test_malformed_filter_has_no_validators(self):
+        response = self.client.get(self.url, {'rating': 'five'})
+        self.assertEqual(response.status_code, 400)
+        self.assertNotIn('ETag', response)
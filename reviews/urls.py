@@ -3,5 +3,7 @@ from . import views
 
 urlpatterns = [
     path('', views.public_reviews, name='public_reviews'),
+    path('feed.json', views.review_feed, name='review_feed'),
     path('books/<int:pk>/review/', views.add_review, name='add_review'),
+    path('books/<int:pk>/reviews/', views.book_reviews, name='book_reviews'),
 ]
@@ -1,16 +1,31 @@
+import hashlib
+
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.core.paginator import Paginator
+from django.db.models import F
+from django.http import JsonResponse
+from django.template.loader import render_to_string
+from django.views.decorators.http import condition, require_GET
+from books import detail_cache
+from books.catalog import catalog_version, version_timestamp
 from books.models import Book
+from books.pagination import InvalidCursor, KeysetPaginator
 from borrowing.models import BorrowRecord
 from .models import Review
 from .forms import ReviewForm
 
 
+PUBLIC_REVIEWS_PER_PAGE = 12
+
+
+def _public_reviews():
+    return Review.objects.select_related('student', 'book').order_by('-created_at')
+
+
 def public_reviews(request):
-    reviews = Review.objects.select_related('student', 'book').order_by('-created_at')
-    paginator = Paginator(reviews, 12)
+    paginator = Paginator(_public_reviews(), PUBLIC_REVIEWS_PER_PAGE)
     page_obj = paginator.get_page(request.GET.get('page'))
     return render(request, 'reviews/public_reviews.html', {
         'reviews': page_obj,
@@ -18,6 +33,93 @@ def public_reviews(request):
     })
 
 
+def book_reviews(request, pk):
+    """The next page of a book's reviews as an HTML fragment, for "load more"."""
+    try:
+        page = detail_cache.review_page(pk, request.GET.get('cursor') or None)
+    except InvalidCursor:
+        return JsonResponse({'error': 'Invalid cursor.'}, status=400)
+    return JsonResponse({
+        'html': render_to_string('books/detail/review_list.html', {'reviews': page}),
+        'next_cursor': page.next_cursor,
+    })
+
+
+FEED_ORDERING = ('-created_at', '-id')
+FEED_PAGE_SIZE = 20
+FEED_MAX_PAGE_SIZE = 100
+FEED_FILTERS = {'book': 'book_id', 'author': 'book__author_id', 'rating': 'rating'}
+
+
+def _feed_queryset(request):
+    """Reviews matching the feed filters, or None if a filter is malformed."""
+    reviews = Review.objects.all()
+    for param, lookup in FEED_FILTERS.items():
+        value = request.GET.get(param)
+        if value:
+            if not value.isdigit():
+                return None
+            reviews = reviews.filter(**{lookup: int(value)})
+    return reviews
+
+
+def _feed_rows(reviews):
+    """The columns each feed entry shows, joined in from the book, author and reviewer."""
+    return reviews.values(
+        'id', 'rating', 'comment', 'created_at', 'book_id',
+        book_title=F('book__title'),
+        author_id=F('book__author_id'),
+        author_name=F('book__author__name'),
+        reviewer=F('student__username'),
+    )
+
+
+def _feed_state(request):
+    """
+    Last-Modified and ETag for the feed, from the catalog version alone.
+
+    Every review create, edit and delete (and every book, author or category
+    write, whose names the feed shows) bumps the version, so the validators
+    need no query over the reviews themselves and a 304 costs one primary-key
+    read. Filtered feeds share the version: any catalog write revalidates all
+    of them.
+    """
+    if not hasattr(request, '_review_feed_state'):
+        if _feed_queryset(request) is None:
+            request._review_feed_state = (None, None)
+        else:
+            version = catalog_version()
+            tag = hashlib.md5(f'{version}:{request.GET.urlencode()}'.encode()).hexdigest()
+            request._review_feed_state = (version_timestamp(version), tag)
+    return request._review_feed_state
+
+
+@require_GET
+@condition(
+    etag_func=lambda request: _feed_state(request)[1],
+    last_modified_func=lambda request: _feed_state(request)[0],
+)
+def review_feed(request):
+    """Newest-first JSON review feed with keyset cursors on (created_at, id)."""
+    reviews = _feed_queryset(request)
+    if reviews is None:
+        return JsonResponse({'error': 'book, author and rating must be integers.'}, status=400)
+    try:
+        per_page = min(int(request.GET.get('limit', FEED_PAGE_SIZE)), FEED_MAX_PAGE_SIZE)
+    except ValueError:
+        per_page = FEED_PAGE_SIZE
+    paginator = KeysetPaginator(_feed_rows(reviews), FEED_ORDERING, max(per_page, 1))
+    try:
+        page = paginator.page(request.GET.get('cursor') or None)
+    except InvalidCursor:
+        return JsonResponse({'error': 'Invalid cursor.'}, status=400)
+    return JsonResponse({
+        'results': list(page),
+        'next_cursor': page.next_cursor,
+        'previous_cursor': page.previous_cursor,
+    })
+
+
 @login_required
 def add_review(request, pk):
     book = get_object_or_404(Book, pk=pk)